@@ -0,0 +1,7 @@
+"""
+Benchmarks for drf_paytm.
+
+Every benchmark is a module runnable from the repository root, e.g.
+``python -m benchmarks.bench_listing``, and prints one JSON object per
+measurement so that results can be compared across releases.
+"""
@@ -0,0 +1,97 @@
+"""
+Load test of sync and async callback views under ASGI against a stub
+gateway that takes `delay` seconds per status call. Callbacks are sent
+`concurrency` at a time via Django's in-process ASGI client.
+
+Usage: python -m benchmarks.bench_async [--callbacks 200] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from urllib.parse import urlencode
+
+from .django_setup import Timer, create_configuration, report, setup
+
+
+def seed(user, config, prefix, count):
+    from drf_paytm.models import TransactionRequest
+    from drf_paytm.utils import generate_checksum
+
+    TransactionRequest.objects.bulk_create([
+        TransactionRequest(mid=config.mid, oid='%s%d' % (prefix, i),
+                           amount='1.00', checksum='-', created_by=user,
+                           callback_url='https://example.com/')
+        for i in range(count)])
+
+    callbacks = []
+    for i in range(count):
+        oid = '%s%d' % (prefix, i)
+        callback = {'MID': config.mid, 'TXNID': 'T' + oid, 'ORDERID': oid,
+                    'BANKTXNID': '', 'TXNAMOUNT': '1.00',
+                    'STATUS': 'TXN_SUCCESS', 'RESPCODE': '01',
+                    'RESPMSG': 'Txn Success'}
+        callback['CHECKSUMHASH'] = generate_checksum(callback, config.mkey)
+        callbacks.append(urlencode(callback))
+    return callbacks
+
+
+async def load(url, callbacks, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, codes = [], []
+
+    async def post(body):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(
+                url, body, content_type='application/x-www-form-urlencoded')
+            latencies.append(time.perf_counter() - start)
+            codes.append(response.status_code)
+
+    await asyncio.gather(*(post(body) for body in callbacks))
+    return latencies, codes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--callbacks', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.1)
+    args = parser.parse_args()
+
+    from .stub_gateway import StubGateway
+
+    gateway = StubGateway(delay=args.delay)
+    setup(os.path.join(tempfile.mkdtemp(), 'bench_async.sqlite3'),
+          PAYTM_SETTINGS={'STATUS_RETRIES': 0,
+                          'STATUS_POOL_SIZE': args.concurrency})
+
+    from django.urls import reverse
+
+    user, config = create_configuration(status_url=gateway.url)
+    for name in ('list-add-transaction-response',
+                 'async-add-transaction-response'):
+        callbacks = seed(user, config, name[:5].upper(), args.callbacks)
+        with Timer() as timer:
+            latencies, codes = asyncio.run(load(
+                reverse('drf_paytm:' + name), callbacks, args.concurrency))
+        latencies.sort()
+        report('async', view=name, callbacks=args.callbacks,
+               concurrency=args.concurrency, delay=args.delay,
+               redirects=codes.count(302),
+               rps=round(args.callbacks / timer.elapsed, 1),
+               p50_ms=round(statistics.median(latencies) * 1000, 1),
+               p99_ms=round(latencies[int(len(latencies) * 0.99) - 1]
+                            * 1000, 1))
+    gateway.stop()
+
+
+if __name__ == '__main__':
+    main()
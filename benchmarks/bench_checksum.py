@@ -0,0 +1,119 @@
+"""
+Checksums per second on request (generate) and callback (verify) paths,
+comparing ChecksumEngine with the previous implementation which created
+an AES cipher per call (via pycryptodome) and verified by encrypting
+again, and with the batch API.
+
+Usage: python -m benchmarks.bench_checksum [--number 20000] [--processes 4]
+"""
+
+import argparse
+
+from .django_setup import Timer, report
+
+KEY = 'kbzk1DSbJiV_O3p5'
+
+REQUEST = {
+    'MID': 'BENCHMARK0001', 'INDUSTRY_TYPE_ID': 'Retail',
+    'ORDER_ID': 'ORDER0000001', 'WEBSITE': 'WEBSTAGING',
+    'TXN_AMOUNT': '100.00', 'CHANNEL_ID': 'WEB', 'CUST_ID': '1',
+    'CALLBACK_URL': 'https://example.com/api/paytm/response/',
+    'MOBILE_NO': '7777777777', 'EMAIL': 'customer@example.com',
+}
+
+CALLBACK = {
+    'MID': 'BENCHMARK0001', 'TXNID': '20190613111212800110168',
+    'ORDERID': 'ORDER0000001', 'BANKTXNID': '777001', 'TXNAMOUNT': '100.00',
+    'CURRENCY': 'INR', 'STATUS': 'TXN_SUCCESS', 'RESPCODE': '01',
+    'RESPMSG': 'Txn Success', 'TXNDATE': '2019-06-13 16:43:12.0',
+    'GATEWAYNAME': 'WALLET', 'BANKNAME': 'WALLET', 'PAYMENTMODE': 'PPI',
+}
+
+
+def legacy_generate(params, key, salt=None):
+    import base64
+    import hashlib
+    import random
+
+    from Crypto.Cipher import AES
+
+    from drf_paytm import utils
+
+    salt = salt if salt else ''.join(random.choice(utils.SALT_CHARS)
+                                     for _ in range(4))
+    final_string = '%s|%s' % (utils.__get_param_string__(params), salt)
+    hash_string = hashlib.sha256(final_string.encode()).hexdigest() + salt
+    length = 16 - len(hash_string) % 16
+    hash_string += length * chr(length)
+    cipher = AES.new(key.encode(), AES.MODE_CBC, utils.IV.encode())
+    return base64.b64encode(cipher.encrypt(hash_string.encode())).decode()
+
+
+def legacy_verify(params, key, checksum):
+    import base64
+
+    from Crypto.Cipher import AES
+
+    from drf_paytm import utils
+
+    cipher = AES.new(key.encode(), AES.MODE_CBC, utils.IV.encode())
+    decrypted = cipher.decrypt(base64.b64decode(checksum)).decode()
+    salt = decrypted[:-ord(decrypted[-1])][-4:]
+    return legacy_generate(params, key, salt=salt) == checksum
+
+
+def rate(function, number):
+    with Timer() as timer:
+        for _ in range(number):
+            function()
+    return number / timer.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    from django.conf import settings
+
+    settings.configure()
+
+    from drf_paytm.utils import generate_checksum, generate_checksums
+    from drf_paytm.utils import verify_checksum, verify_checksums
+
+    request_checksum = generate_checksum(REQUEST, KEY)
+    callback_checksum = generate_checksum(CALLBACK, KEY)
+
+    cases = (
+        ('request', 'legacy', lambda: legacy_generate(REQUEST, KEY)),
+        ('request', 'engine', lambda: generate_checksum(REQUEST, KEY)),
+        ('callback', 'legacy',
+         lambda: legacy_verify(CALLBACK, KEY, callback_checksum)),
+        ('callback', 'engine',
+         lambda: verify_checksum(dict(CALLBACK), KEY, callback_checksum)),
+    )
+    assert legacy_verify(REQUEST, KEY, request_checksum)
+    for path, implementation, function in cases:
+        report('checksum', path=path, implementation=implementation,
+               checksums_per_second=round(rate(function, args.number)))
+
+    requests = [dict(REQUEST, ORDER_ID='ORDER%d' % i)
+                for i in range(args.number)]
+    for processes in (None, args.processes):
+        with Timer() as timer:
+            checksums = generate_checksums(requests, KEY,
+                                           processes=processes)
+        report('checksum', path='request', implementation='batch',
+               processes=processes or 1,
+               checksums_per_second=round(args.number / timer.elapsed))
+        with Timer() as timer:
+            assert all(verify_checksums(zip(requests, checksums), KEY,
+                                        processes=processes))
+        report('checksum', path='callback', implementation='batch',
+               processes=processes or 1,
+               checksums_per_second=round(args.number / timer.elapsed))
+
+
+if __name__ == '__main__':
+    main()
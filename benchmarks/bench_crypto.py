@@ -0,0 +1,45 @@
+"""
+Checksums per second of every available crypto backend on request
+(generate) and callback (verify) workloads.
+
+Usage: python -m benchmarks.bench_crypto [--number 20000]
+"""
+
+import argparse
+
+from .bench_checksum import CALLBACK, KEY, REQUEST, rate
+from .django_setup import report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    from django.conf import settings
+
+    settings.configure()
+
+    from drf_paytm.crypto import AVAILABLE_BACKENDS, get_backend_class
+    from drf_paytm.utils import ChecksumEngine
+
+    for backend in AVAILABLE_BACKENDS:
+        engine = ChecksumEngine(KEY, backend=backend)
+        checksum = engine.generate(CALLBACK)
+        cases = (
+            ('request', lambda: engine.generate(REQUEST)),
+            ('callback', lambda: engine.verify(CALLBACK, checksum)),
+            ('batch', lambda: engine.generate_many(['|'.join(REQUEST)] * 100)),
+        )
+        for path, function in cases:
+            number = args.number // 100 if path == 'batch' else args.number
+            per_second = rate(function, number)
+            if path == 'batch':
+                per_second *= 100
+            report('crypto', backend=backend.name, path=path,
+                   default=backend is get_backend_class(),
+                   checksums_per_second=round(per_second))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Throughput of request/, now/, response/ and order/<oid>/ endpoints,
+driven in-process at configurable concurrency against a stub PayTM
+status server. Every scenario reports requests per second, p50 & p99
+latency, queries per request and unexpected status codes.
+
+Results are printed as JSON lines. --output also writes them, with the
+versions they were measured on, to a JSON file that a later run can be
+checked against with --compare: it exits with status 1 if throughput
+dropped or p99 latency rose beyond --tolerance, or if queries per
+request grew.
+
+Threads share a file SQLite database, as every thread has its own
+connection and an in-memory database is private to a connection.
+Clients are authenticated with force_authenticate(), so session or
+token lookups are not measured.
+
+Usage: python -m benchmarks.bench_endpoints [--requests 500]
+    [--concurrency 1 8] [--scenarios request now response order]
+    [--delay 0.01] [--metrics] [--output results.json]
+    [--compare baseline.json] [--tolerance 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .django_setup import Timer, create_configuration, report, setup
+
+SCENARIOS = ('request', 'now', 'response', 'order')
+
+
+class Driver(object):
+    """
+    Sends requests of a scenario from a pool of threads, each with its
+    own API client and database connection.
+    """
+
+    def __init__(self, user, concurrency: int):
+        self.user = user
+        self.concurrency = concurrency
+        self.local = threading.local()
+
+    @property
+    def client(self):
+        from rest_framework.test import APIClient
+
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = APIClient()
+            client.force_authenticate(user=self.user)
+        return client
+
+    def call(self, send):
+        """
+        Sends one request in a worker thread.
+
+        Returns
+        -------
+        tuple: (status code, latency in seconds, number of queries)
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = send(self.client)
+            latency = time.perf_counter() - start
+        return response.status_code, latency, len(queries)
+
+    def run(self, sends):
+        from django.db import connection
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            with Timer() as timer:
+                results = list(pool.map(self.call, sends))
+            # Connections are per thread, close them before threads end
+            list(pool.map(lambda _: connection.close(),
+                          range(self.concurrency)))
+        return results, timer.elapsed
+
+
+def sends(scenario, user, config, count, run):
+    """
+    Provides `count` callables, each sending one request of a scenario
+    with a test client. Data they need is seeded beforehand.
+    """
+    from django.urls import reverse
+
+    from .bench_async import seed
+
+    prefix = '%s%d_' % (scenario.upper(), run)
+    if scenario in ('request', 'now'):
+        url = reverse('drf_paytm:list-add-transaction-request'
+                      if scenario == 'request' else 'drf_paytm:pay-now')
+        return [lambda client, oid='%s%d' % (prefix, i): client.post(
+            url, {'oid': oid, 'amount': '100.00',
+                  'callback_url': 'https://example.com/done/'},
+            format='json') for i in range(count)]
+
+    callbacks = seed(user, config, prefix, count)
+    if scenario == 'response':
+        url = reverse('drf_paytm:list-add-transaction-response')
+        return [lambda client, body=body: client.post(
+            url, body, content_type='application/x-www-form-urlencoded')
+            for body in callbacks]
+    return [lambda client, oid='%s%d' % (prefix, i): client.get(reverse(
+        'drf_paytm:retrieve-transaction-request', kwargs={'oid': oid}))
+        for i in range(count)]
+
+
+EXPECTED = {'request': 201, 'now': 201, 'response': 302, 'order': 200}
+
+
+def summarize(scenario, concurrency, results, elapsed, breakdown=None):
+    latencies = [latency for _, latency, _ in results]
+    result = dict(
+        scenario=scenario, concurrency=concurrency, requests=len(results),
+        errors=sum(code != EXPECTED[scenario] for code, _, _ in results),
+        rps=round(len(results) / elapsed, 1),
+        p50_ms=round(statistics.median(latencies) * 1000, 2),
+        p99_ms=round(statistics.quantiles(latencies, n=100)[98] * 1000, 2),
+        queries=round(statistics.mean(q for _, _, q in results), 2))
+    if breakdown is not None:
+        result['breakdown_ms'] = {
+            name: round(timing['mean'] * 1000, 3)
+            for name, timing in sorted(breakdown.items())}
+    return result
+
+
+def environment() -> dict:
+    import sqlite3
+
+    import django
+    import rest_framework
+
+    import drf_paytm
+
+    return dict(drf_paytm=drf_paytm.__version__, django=django.__version__,
+                rest_framework=rest_framework.__version__,
+                python=platform.python_version(),
+                sqlite=sqlite3.sqlite_version, machine=platform.machine())
+
+
+def compare(results, baseline, tolerance: float) -> list:
+    """
+    Provides regressions of results against baseline results of the
+    same scenario & concurrency.
+    """
+    previous = {(result['scenario'], result['concurrency']): result
+                for result in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result['scenario'], result['concurrency']))
+        if base is None:
+            continue
+        checks = (
+            ('rps', result['rps'] < base['rps'] * (1 - tolerance)),
+            ('p99_ms', result['p99_ms'] > base['p99_ms'] * (1 + tolerance)),
+            # Queries once per thread, e.g. of caches, are not regressions
+            ('queries', result['queries'] > base['queries'] + 0.5),
+        )
+        regressions.extend(dict(scenario=result['scenario'],
+                                concurrency=result['concurrency'],
+                                metric=metric, baseline=base[metric],
+                                current=result[metric])
+                           for metric, failed in checks if failed)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500,
+                        help="Requests per scenario and concurrency.")
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument('--delay', type=float, default=0.01,
+                        help="Seconds the stub takes per status call.")
+    parser.add_argument('--metrics', action='store_true',
+                        help="Report mean time of instrumented steps.")
+    parser.add_argument('--output', help="Write results to a JSON file.")
+    parser.add_argument('--compare',
+                        help="JSON file of results to check against.")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    from .stub_gateway import StubGateway
+
+    gateway = StubGateway(delay=args.delay)
+    database = os.path.join(tempfile.mkdtemp(), 'bench_endpoints.sqlite3')
+    setup(database, DATABASES={'default': {
+        'ENGINE': 'django.db.backends.sqlite3', 'NAME': database,
+        # Writers wait for each other instead of failing
+        'OPTIONS': {'timeout': 60}}},
+        PAYTM_SETTINGS={
+            'STATUS_RETRIES': 0,
+            'STATUS_POOL_SIZE': max(args.concurrency),
+            'METRICS_SINK': ('drf_paytm.metrics.MemorySink' if args.metrics
+                             else None)})
+
+    from drf_paytm import metrics
+
+    user, config = create_configuration(status_url=gateway.url)
+    results = []
+    for run, concurrency in enumerate(args.concurrency):
+        driver = Driver(user, concurrency)
+        for scenario in args.scenarios:
+            calls = sends(scenario, user, config, args.requests, run)
+            sink = metrics.get_sink()
+            if sink is not None:
+                sink.reset()
+            outcome, elapsed = driver.run(calls)
+            result = summarize(scenario, concurrency, outcome, elapsed,
+                               sink and sink.summary())
+            report('endpoints', **result)
+            results.append(result)
+    gateway.stop()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'environment': environment(), 'args': vars(args),
+                       'results': results}, output, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline)['results'],
+                                  args.tolerance)
+        for regression in regressions:
+            report('regression', **regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Latency of hot Transaction Response lookups, with database schema of
+migration 0003 (no indexes on oid, status & tid) and of the latest
+migration, on the same seeded rows.
+
+Usage: python -m benchmarks.bench_indexes [--rows 1000000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+
+from .django_setup import Timer, create_configuration, report, setup
+
+
+MIGRATION = ('drf_paytm', '0003_transactionresponse_is_verified')
+
+
+def historical_model(name):
+    """
+    Provides model as of MIGRATION, as columns added later do not exist
+    yet when rows are seeded.
+    """
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+
+    state = MigrationExecutor(connection).loader.project_state(MIGRATION)
+    return state.apps.get_model('drf_paytm', name)
+
+
+def seed(config, rows, batch_size=10000):
+    from drf_paytm.variables import FAILED, SUCCESS
+
+    TransactionResponse = historical_model('TransactionResponse')
+
+    for start in range(0, rows, batch_size):
+        TransactionResponse.objects.bulk_create([
+            TransactionResponse(mid=config.mid, oid='ORDER%d' % (i // 2),
+                                tid='TXN%d' % i, amount='1.00',
+                                status=SUCCESS if i % 2 else FAILED,
+                                code='01', message='-', checksum='-',
+                                raw_response='{}')
+            for i in range(start, min(start + batch_size, rows))])
+
+
+def lookups(rows):
+    """
+    Provides (name, callable of a random row) of every hot lookup.
+    """
+    from drf_paytm.models import TransactionResponse
+    from drf_paytm.variables import SUCCESS
+
+    responses = TransactionResponse.objects
+
+    def oid():
+        return 'ORDER%d' % random.randrange(rows // 2)
+
+    return (
+        ('is_completed', lambda: responses.filter(
+            oid=oid(), status=SUCCESS).exists()),
+        ('last_payment_status', lambda: responses.filter(
+            oid=oid()).order_by('-id').values_list('status').first()),
+        ('duplicate_tid', lambda: responses.filter(
+            tid='TXN%d' % random.randrange(rows)).exists()),
+    )
+
+
+def measure(rows, repeat, schema):
+    for name, lookup in lookups(rows):
+        timings = []
+        for _ in range(repeat):
+            with Timer() as timer:
+                lookup()
+            timings.append(timer.elapsed)
+        timings.sort()
+        report('indexes', lookup=name, schema=schema, rows=rows,
+               p50_ms=round(statistics.median(timings) * 1000, 4),
+               p99_ms=round(timings[int(len(timings) * 0.99) - 1] * 1000, 4))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(), 'bench_indexes.sqlite3')
+    setup(database)
+
+    from django.core.management import call_command
+
+    _, config = create_configuration()
+    call_command('migrate', *MIGRATION, verbosity=0)
+    seed(config, args.rows)
+    measure(args.rows, args.repeat, schema='0003')
+
+    with Timer() as timer:
+        call_command('migrate', 'drf_paytm', verbosity=0)
+    report('indexes', migration_s=round(timer.elapsed, 3), rows=args.rows)
+    measure(args.rows, args.repeat, schema='latest')
+    os.remove(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Query count and latency of transaction request listing per number of
+rows, with and without TransactionRequest.objects.with_payment_summary()
+that joins created_by. Payment state is read from stored fields.
+
+Usage: python -m benchmarks.bench_listing [--sizes 10 100 500]
+"""
+
+import argparse
+import statistics
+
+from .django_setup import Timer, create_configuration, report, setup
+
+
+def seed(user, config, size):
+    from drf_paytm.models import TransactionRequest, TransactionResponse
+    from drf_paytm.variables import FAILED, SUCCESS
+
+    requests = TransactionRequest.objects.bulk_create([
+        TransactionRequest(mid=config.mid, oid='%s-%d' % (user.username, i),
+                           amount='1.00', checksum='-', created_by=user,
+                           callback_url='https://example.com/')
+        for i in range(size)])
+    TransactionResponse.objects.bulk_create([
+        TransactionResponse(mid=config.mid, oid=request.oid,
+                            tid='%s-%s' % (status, request.oid),
+                            amount='1.00', status=status, code='01',
+                            message='-', checksum='-', raw_response='{}')
+        for request in requests for status in (FAILED, SUCCESS)])
+    TransactionRequest.objects.filter(
+        created_by=user).refresh_payment_state()
+
+
+def measure(queryset, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from drf_paytm.serializers import TransactionRequestSerializer
+
+    timings, queries = [], 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured, Timer() as timer:
+            TransactionRequestSerializer(queryset.all(), many=True).data
+        timings.append(timer.elapsed)
+        queries = len(captured)
+    return queries, statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.contrib.auth import get_user_model
+
+    from drf_paytm.models import TransactionRequest
+
+    owner, config = create_configuration()
+    for size in args.sizes:
+        user = get_user_model().objects.create_user(username='user%d' % size)
+        seed(user, config, size)
+        for name, queryset in (
+                ('plain', TransactionRequest.objects.all()),
+                ('with_payment_summary',
+                 TransactionRequest.objects.with_payment_summary())):
+            queries, latency = measure(queryset.filter(created_by=user),
+                                       args.repeat)
+            report('listing', queryset=name, rows=size, queries=queries,
+                   latency_ms=round(latency, 3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Overhead of instrumentation per timed block and per counter, with
+metrics disabled and with in-memory, StatsD & logging sinks.
+
+Usage: python -m benchmarks.bench_metrics [--iterations 1000000]
+"""
+
+import argparse
+import logging
+
+from .django_setup import Timer, report, setup
+
+SINKS = (
+    (None, {}),
+    ('drf_paytm.metrics.MemorySink', {}),
+    ('drf_paytm.metrics.StatsDSink', {'port': 9}),
+    ('drf_paytm.metrics.LoggingSink', {'level': 'DEBUG'}),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=1000000)
+    args = parser.parse_args()
+
+    setup()
+    # Logging sink formats nothing below INFO, as in production
+    logging.getLogger('drf_paytm.metrics').setLevel(logging.INFO)
+
+    from django.test import override_settings
+
+    from drf_paytm import metrics
+
+    for path, options in SINKS:
+        with override_settings(PAYTM_SETTINGS={
+                'METRICS_SINK': path, 'METRICS_SINK_OPTIONS': options}):
+            with Timer() as timer:
+                for _ in range(args.iterations):
+                    with metrics.timer('gateway.request') as t:
+                        t.tag(http_status=200)
+            with Timer() as counter:
+                for _ in range(args.iterations):
+                    metrics.increment('response.callback',
+                                      status='TXN_SUCCESS', respcode='01')
+        report('metrics', sink=path or 'disabled',
+               timer_ns=round(timer.elapsed / args.iterations * 1e9),
+               increment_ns=round(counter.elapsed / args.iterations * 1e9))
+
+
+if __name__ == '__main__':
+    main()
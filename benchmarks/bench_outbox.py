@@ -0,0 +1,101 @@
+"""
+Cost of the transactional outbox: time to save a Transaction Response
+with and without its payment event, then throughput of a relay draining
+the outbox to a file sink per batch size.
+
+Usage: python -m benchmarks.bench_outbox [--events 100000]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+
+from .django_setup import Timer, create_configuration, report, setup
+
+
+def create_responses(config, prefix, count):
+    """
+    Saves responses one by one, each in its own transaction as callback
+    view does, and provides latency of every save in milliseconds.
+    """
+    from django.db import transaction
+
+    from drf_paytm.models import TransactionResponse
+    from drf_paytm.variables import SUCCESS
+
+    latencies = []
+    for i in range(count):
+        with Timer() as timer, transaction.atomic():
+            TransactionResponse.objects.create(
+                mid=config.mid, oid='%s%d' % (prefix, i),
+                tid='%s%d' % (prefix, i), amount='1.00', status=SUCCESS,
+                code='01', message='-', checksum='-', raw_response='{}')
+        latencies.append(timer.elapsed * 1000)
+    return latencies
+
+
+def seed(config, events, batch_size=10000):
+    from drf_paytm.models import TransactionResponse
+    from drf_paytm.outbox import record
+    from drf_paytm.variables import FAILED, SUCCESS
+
+    for start in range(0, events, batch_size):
+        TransactionResponse.objects.bulk_create([
+            TransactionResponse(mid=config.mid, oid='ORDER%d' % i,
+                                tid='TXN%d' % i, amount='1.00',
+                                status=SUCCESS if i % 2 else FAILED,
+                                code='01', message='-', checksum='-',
+                                raw_response='{}')
+            for i in range(start, min(start + batch_size, events))])
+        record(TransactionResponse.objects.filter(
+            tid__in=['TXN%d' % i for i in range(
+                start, min(start + batch_size, events))]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--saves', type=int, default=2000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+',
+                        default=[50, 500, 2000])
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    setup(os.path.join(directory, 'bench_outbox.sqlite3'),
+          PAYTM_SETTINGS={'OUTBOX_ENABLED': True})
+
+    from django.test import override_settings
+
+    from drf_paytm.models import PaymentEvent, TransactionResponse
+    from drf_paytm.outbox import Relay
+    from drf_paytm.sinks import FileSink
+
+    _, config = create_configuration()
+    for enabled in (False, True):
+        with override_settings(PAYTM_SETTINGS={'OUTBOX_ENABLED': enabled}):
+            latencies = create_responses(config, 'SAVE%d_' % enabled,
+                                         args.saves)
+        report('outbox_write', outbox=enabled, saves=args.saves,
+               p50_ms=round(statistics.median(latencies), 3),
+               p99_ms=round(statistics.quantiles(latencies, n=100)[98], 3))
+
+    PaymentEvent.objects.all().delete()
+    for batch_size in args.batch_sizes:
+        seed(config, args.events)
+        path = os.path.join(directory, 'events%d.ndjson' % batch_size)
+        relay = Relay(sink=FileSink(path), batch_size=batch_size)
+        with Timer() as timer:
+            stats = relay.run(once=True)
+        relay.close()
+        report('outbox_relay', batch_size=batch_size,
+               events=stats['published'], batches=stats['batches'],
+               seconds=round(timer.elapsed, 3),
+               events_per_s=round(stats['published'] / timer.elapsed))
+        os.remove(path)
+        PaymentEvent.objects.all().delete()
+        TransactionResponse.objects.filter(tid__startswith='TXN').delete()
+
+
+if __name__ == '__main__':
+    main()
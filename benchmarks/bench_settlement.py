@@ -0,0 +1,85 @@
+"""
+Throughput of settlement report reconciliation per report size, on a
+generated database and report with injected mismatches. Throughput
+should stay flat as size grows.
+
+Usage: python -m benchmarks.bench_settlement [--sizes 10000 100000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+
+from .django_setup import Timer, create_configuration, report, setup
+
+
+def seed(config, start, size, batch_size=10000):
+    from drf_paytm.models import TransactionResponse
+    from drf_paytm.variables import SUCCESS
+
+    for offset in range(start, start + size, batch_size):
+        TransactionResponse.objects.bulk_create([
+            TransactionResponse(mid=config.mid, oid='ORDER%d' % i,
+                                tid='TXN%d' % i, bnkid='BANK%d' % i,
+                                amount='%d.00' % (i % 1000 + 1),
+                                status=SUCCESS, code='01', message='-',
+                                checksum='-', raw_response='{}')
+            for i in range(offset, min(offset + batch_size,
+                                       start + size))])
+
+
+def write_report(path, start, size):
+    """
+    Writes report of rows [start, start + size), 1% each with a wrong
+    amount, an unknown ID, a duplicate or only an order ID.
+    """
+    with open(path, 'w') as output:
+        output.write('Order_ID,Transaction ID,Bank Transaction ID,Amount\n')
+        for i in range(start, start + size):
+            row = ['ORDER%d' % i, 'TXN%d' % i, 'BANK%d' % i,
+                   '%d.00' % (i % 1000 + 1)]
+            kind = random.randrange(100)
+            if kind == 0:
+                row[3] = '0.50'
+            elif kind == 1:
+                row[:3] = ['UNKNOWN%d' % i] * 3
+            elif kind == 2:
+                output.write(','.join(row) + '\n')
+            elif kind == 3:
+                row[1] = ''
+            output.write(','.join(row) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    setup(os.path.join(directory, 'bench_settlement.sqlite3'))
+
+    from drf_paytm.settlement import SettlementReconciler
+
+    _, config = create_configuration()
+    start = 0
+    for size in args.sizes:
+        seed(config, start, size)
+        path = os.path.join(directory, 'report%d.csv' % size)
+        write_report(path, start, size)
+
+        reconciler = SettlementReconciler(chunk_size=args.chunk_size)
+        with open(path, newline='') as settlement, Timer() as timer:
+            mismatches = sum(1 for _ in reconciler.reconcile(settlement))
+        report('settlement', rows=reconciler.stats['rows'],
+               mismatches=mismatches, queries=reconciler.stats['queries'],
+               seconds=round(timer.elapsed, 3),
+               rows_per_s=round(reconciler.stats['rows'] / timer.elapsed))
+        os.remove(path)
+        start += size
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Status lookups with and without the status cache: `repeats` lookups of
+each of `orders` orders are made `concurrency` at a time, as retried
+callbacks would, against a stub gateway taking `delay` seconds per call.
+Reports calls that reached the gateway and lookups per second.
+
+Usage: python -m benchmarks.bench_status_cache [--orders 200]
+    [--repeats 5] [--concurrency 32] [--delay 0.05]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .django_setup import Timer, report, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    from .stub_gateway import StubGateway
+
+    gateway = StubGateway(delay=args.delay)
+    setup(os.path.join(tempfile.mkdtemp(), 'bench_status_cache.sqlite3'))
+
+    from drf_paytm.models import PayTMConfiguration
+    from drf_paytm.paytmapi import StatusClient
+
+    config = PayTMConfiguration(mid='BENCH0001', mkey='kbzk1DSbJiV_O3p5',
+                                status_url=gateway.url)
+    for cache in (False, True):
+        client = StatusClient(retries=0, pool_size=args.concurrency,
+                              cache=cache)
+        oids = ['ORDER%d_%d' % (cache, i) for i in range(args.orders)]
+        lookups = [oid for oid in oids for _ in range(args.repeats)]
+        # Retries of a callback arrive close together, not in order
+        random.Random(0).shuffle(lookups)
+        gateway.calls = 0
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool, \
+                Timer() as timer:
+            list(pool.map(lambda oid: client.get_status(config, oid),
+                          lookups))
+        client.close()
+        report('status_cache', cache=cache, lookups=len(lookups),
+               gateway_calls=gateway.calls, seconds=round(timer.elapsed, 3),
+               lookups_per_s=round(len(lookups) / timer.elapsed))
+    gateway.stop()
+
+
+if __name__ == '__main__':
+    main()
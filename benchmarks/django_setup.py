@@ -0,0 +1,80 @@
+"""
+Minimal Django project used by benchmarks: SQLite database, drf_paytm
+and its dependencies installed and urls mounted at /api/paytm/.
+"""
+
+import json
+import time
+
+
+def setup(database=':memory:', **overrides):
+    """
+    Configures Django settings, sets up apps and migrates database.
+
+    Parameters
+    ----------
+    database: str | SQLite database name
+    overrides: extra Django settings
+    """
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    options = dict(
+        DEBUG=False,
+        SECRET_KEY='benchmark',
+        ALLOWED_HOSTS=['*'],
+        USE_TZ=True,
+        ROOT_URLCONF='benchmarks.urls',
+        DEFAULT_AUTO_FIELD='django.db.models.AutoField',
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3',
+                               'NAME': database}},
+        INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes',
+                        'rest_framework', 'django_filters', 'drfaddons',
+                        'drf_paytm'],
+    )
+    options.update(overrides)
+    settings.configure(**options)
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def create_configuration(mid='BENCHMARK0001', key='kbzk1DSbJiV_O3p5',
+                         **fields):
+    """
+    Creates a user and an active PayTM Configuration.
+
+    Returns
+    -------
+    tuple: (user, PayTMConfiguration)
+    """
+    from django.contrib.auth import get_user_model
+
+    from drf_paytm.models import PayTMConfiguration
+
+    user = get_user_model().objects.create_user(username='benchmark')
+    config = PayTMConfiguration.objects.create(
+        mid=mid, mkey=key, is_active=True, company_name='Benchmark',
+        created_by=user, **fields)
+    return user, config
+
+
+def report(name: str, **values):
+    """
+    Prints one measurement as a JSON line.
+    """
+    values['benchmark'] = name
+    print(json.dumps(values, sort_keys=True), flush=True)
+
+
+class Timer(object):
+    """
+    Context manager measuring wall clock time in seconds.
+    """
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,53 @@
+"""
+Local stand-in for PayTM Transaction Status API used by benchmarks.
+Every status call is answered with a successful transaction after
+`delay` seconds, like a remote gateway would.
+"""
+
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(
+            int(self.headers.get('Content-Length', 0))))
+        time.sleep(self.server.delay)
+        body = json.dumps({'ORDERID': payload['ORDERID'],
+                           'TXNID': 'T' + payload['ORDERID'],
+                           'STATUS': 'TXN_SUCCESS'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.calls += 1
+
+    def log_message(self, *args):
+        pass
+
+
+class StubGateway(ThreadingHTTPServer):
+    daemon_threads = True
+    # Connections beyond the default backlog of 5 would be reset
+    request_queue_size = 128
+
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.calls = 0
+        super(StubGateway, self).__init__(('127.0.0.1', 0),
+                                          StubGatewayHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/status' % self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -5,20 +5,28 @@ Author: Himanshu Shankar (https://himanshus.com)
 """
 
 from django.contrib import admin
+from django.utils.text import gettext_lazy as _
 
 from drfaddons.admin import CreateUpdateAdmin
 
-from .models import PayTMConfiguration, TransactionRequest, TransactionResponse
+from .models import PaymentEvent, PayTMConfiguration, TransactionRequest
+from .models import TransactionResponse, WebhookDelivery, WebhookSubscription
+from .pagination import EstimatedCountPaginator
 
 
 class PayTMConfigurationAdmin(CreateUpdateAdmin):
-    list_display = ('id', 'mid', 'is_active')
+    list_display = ('id', 'mid', 'is_active', 'weight')
     list_display_links = list_display
 
 
 class TransactionRequestAdmin(CreateUpdateAdmin):
     list_display = ('oid', 'amount', 'mobile', 'email', 'completed',
                     'create_date', 'created_by')
+    list_select_related = ('created_by', )
+    list_filter = ('payment_status', 'create_date')
+    # Counting all rows of large tables takes seconds
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
     def has_change_permission(self, request, obj=None):
         return False
@@ -29,6 +37,69 @@ class TransactionRequestAdmin(CreateUpdateAdmin):
 
 class TransactionResponseAdmin(admin.ModelAdmin):
     list_display = ('tid', 'cid', 't_request', 'amount', 'status', 'timestamp')
+    list_select_related = ('t_request', )
+    list_filter = ('status', 'timestamp')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    actions = ('export_csv', 'export_ndjson')
+
+    def export_csv(self, request, queryset):
+        from .export import streaming_response
+
+        return streaming_response(queryset, fmt='csv')
+    export_csv.short_description = _("Export selected as CSV")
+    export_csv.allowed_permissions = ('view', )
+
+    def export_ndjson(self, request, queryset):
+        from .export import streaming_response
+
+        return streaming_response(queryset, fmt='ndjson')
+    export_ndjson.short_description = _("Export selected as NDJSON")
+    export_ndjson.allowed_permissions = ('view', )
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_add_permission(self, request):
+        return False
+
+
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'response', 'created_at',
+                    'published_at', 'attempts')
+    list_select_related = ('response', )
+    list_filter = ('event_type', )
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_add_permission(self, request):
+        return False
+
+
+class WebhookSubscriptionAdmin(CreateUpdateAdmin):
+    list_display = ('id', 'url', 'event_types', 'max_concurrency',
+                    'is_active')
+    list_display_links = ('id', 'url')
+
+
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subscription', 'event', 'status', 'attempts',
+                    'next_attempt_at', 'response_code', 'latency')
+    list_select_related = ('subscription', 'event')
+    list_filter = ('status', )
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    actions = ('retry', )
+
+    def retry(self, request, queryset):
+        from .webhooks import retry
+
+        self.message_user(request, _("%d deliveries requeued.")
+                          % retry(queryset))
+    retry.short_description = _("Retry selected deliveries")
 
     def has_change_permission(self, request, obj=None):
         return False
@@ -40,3 +111,6 @@ class TransactionResponseAdmin(admin.ModelAdmin):
 admin.site.register(PayTMConfiguration, PayTMConfigurationAdmin)
 admin.site.register(TransactionRequest, TransactionRequestAdmin)
 admin.site.register(TransactionResponse, TransactionResponseAdmin)
+admin.site.register(PaymentEvent, PaymentEventAdmin)
+admin.site.register(WebhookSubscription, WebhookSubscriptionAdmin)
+admin.site.register(WebhookDelivery, WebhookDeliveryAdmin)
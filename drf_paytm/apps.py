@@ -6,4 +6,5 @@ class DrfPaytmConfig(AppConfig):
     verbose_name = "PayTM | Django REST Framework"
 
     def ready(self):
-        from .signals.handlers import transaction_response_handler
+        from .signals.handlers import (transaction_response_handler,
+                                       configuration_handler)
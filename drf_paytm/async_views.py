@@ -0,0 +1,209 @@
+"""
+Async variants of callback, pay now & order retrieve views, to be served
+under ASGI. Callback awaits PayTM Transaction Status API with
+AsyncStatusClient, so one worker keeps serving other requests while
+PayTM responds. Database queries, authentication, permissions &
+throttles are synchronous in Django and DRF and run via sync_to_async.
+
+Django 3.x can not dispatch to async handlers of class based views,
+hence AsyncAPIView.as_view() provides a coroutine function.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView that dispatches to async handler of the method. Request is
+    authenticated, permitted, throttled & negotiated as by APIView and
+    errors are handled by handle_exception, so EXCEPTION_HANDLER applies.
+    Both run in a thread as they may query database.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        import functools
+
+        view = super(AsyncAPIView, cls).as_view(**initkwargs)
+
+        # APIView's view returns the coroutine of dispatch()
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        return async_view
+
+    def prepare(self, request, *args, **kwargs):
+        """
+        Authenticates request, checks permissions & throttles and parses
+        data, as APIView does before calling the handler.
+        """
+        self.initial(request, *args, **kwargs)
+        request.data
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.prepare)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(),
+                                  self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = await sync_to_async(self.handle_exception)(exc)
+
+        self.response = await sync_to_async(self.finalize_response)(
+            request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncAddTransactionResponseView(AsyncAPIView):
+    """
+    POST: Creates a Transaction Response record, awaiting PayTM
+    Transaction Status API. Same as AddTransactionResponseView.
+    """
+    from rest_framework.parsers import FormParser
+    from rest_framework.permissions import AllowAny
+
+    permission_classes = (AllowAny, )
+    parser_classes = (FormParser, )
+
+    def validate(self, request):
+        from .serializers import TransactionResponseSerializer
+
+        # Status is verified below, without blocking
+        serializer = TransactionResponseSerializer(
+            data=request.data, context={'request': request,
+                                        'defer_verification': True})
+        serializer.is_valid(raise_exception=True)
+        return serializer
+
+    def save(self, serializer, **kwargs):
+        from .views import AddTransactionResponseView
+
+        instance = AddTransactionResponseView.save_response(serializer,
+                                                            **kwargs)
+        if instance.t_request:
+            return instance.t_request.callback_url, None
+        return None, serializer.data
+
+    async def post(self, request, *args, **kwargs):
+        from django.http import HttpResponseRedirect
+        from django.utils.text import gettext_lazy as _
+
+        from rest_framework.exceptions import ValidationError
+        from rest_framework.response import Response
+        from rest_framework.settings import api_settings
+
+        from .breaker import CircuitOpen
+        from .conf import paytm_settings
+        from .paytmapi import StatusAPIError, get_async_status_client
+
+        serializer = await sync_to_async(self.validate)(request)
+        data, extra = serializer.validated_data, {}
+        if not (serializer.context.get('duplicate')
+                or paytm_settings('DEFER_STATUS_VERIFICATION')):
+            try:
+                verified = await get_async_status_client().verify(
+                    config=serializer.context['paytm_config'],
+                    orderid=data.get('oid'), status=data.get('status'),
+                    txnid=data.get('tid', ''))
+            except CircuitOpen:
+                if paytm_settings('STATUS_BREAKER_FALLBACK') == 'defer':
+                    # Saved unverified, as if verification was deferred
+                    verified = None
+                else:
+                    verified = False
+            except StatusAPIError:
+                verified = False
+            if verified is False:
+                raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                    _("Could not verify transaction.")]})
+            if verified:
+                extra['is_verified'] = True
+
+        url, data = await sync_to_async(self.save)(serializer, **extra)
+        if url:
+            return HttpResponseRedirect(url)
+        return Response(data, status=201)
+
+
+class AsyncPayNowTransaction(AsyncAPIView):
+    """
+    POST: Creates a Transaction Request and provides payment page that
+    posts it to PayTM. Same as PayNowTransaction.
+    """
+    from drfaddons.permissions import IsOwner
+
+    from rest_framework.parsers import FormParser, JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    permission_classes = (IsOwner, )
+    renderer_classes = (JSONRenderer, )
+    parser_classes = (JSONParser, FormParser)
+
+    def create(self, request):
+        from .serializers import TransactionRequestSerializer
+        from .views import PayNowTransaction
+
+        serializer = TransactionRequestSerializer(data=request.data,
+                                                  context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save(created_by=request.user)
+        return PayNowTransaction.page_data(serializer.data)
+
+    async def post(self, request, *args, **kwargs):
+        from .conf import paytm_settings
+        from .pages import renderer_for
+        from .registry import registry
+
+        data = await sync_to_async(self.create)(request)
+        config = await sync_to_async(registry.get_by_mid)(data['MID'])
+        return renderer_for(config).response(
+            data, stream=paytm_settings('STREAM_PAYMENT_PAGE'), status=201)
+
+
+class AsyncRetrieveTransactionRequestView(AsyncAPIView):
+    """
+    GET: Provides a Transaction Request created by logged in user.
+    Same as RetrieveTransactionRequestView.
+    """
+    from drfaddons.permissions import IsOwner
+
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    permission_classes = (IsOwner, )
+    renderer_classes = (JSONRenderer, )
+    parser_classes = (JSONParser, )
+
+    def retrieve(self, request, oid):
+        from django.shortcuts import get_object_or_404
+
+        from .models import TransactionRequest
+        from .serializers import TransactionRequestSerializer
+
+        instance = get_object_or_404(
+            TransactionRequest.objects.with_payment_summary(), oid=oid,
+            created_by=request.user)
+        self.check_object_permissions(request, instance)
+        return TransactionRequestSerializer(
+            instance, context={'request': request}).data
+
+    async def get(self, request, oid, *args, **kwargs):
+        from rest_framework.response import Response
+
+        return Response(await sync_to_async(self.retrieve)(request, oid))
@@ -0,0 +1,191 @@
+"""
+Circuit breaker of PayTM Transaction Status API.
+
+Calls are counted per gateway host in a rolling window. Once at least
+STATUS_BREAKER_MIN_CALLS calls were made in the window and
+STATUS_BREAKER_FAILURE_RATE of them failed, the circuit opens: calls
+fail at once with CircuitOpen for STATUS_BREAKER_RESET_TIMEOUT seconds,
+instead of waiting for timeouts & retries. The circuit is then half
+open: a single probe call is let through at a time, closing the circuit
+if it succeeds and opening it again otherwise.
+
+State is kept in Django's cache, so a cache shared by worker processes
+(Redis, Memcached) lets all of them see the circuit open and close. With
+a process local cache every process keeps its own circuit.
+"""
+
+import logging
+import time
+
+from .conf import paytm_settings
+from .paytmapi import StatusAPIError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(StatusAPIError):
+    """
+    Raised instead of calling PayTM Transaction Status API while its
+    circuit is open.
+    """
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker with state shared through Django's cache.
+    Arguments not provided are read from PAYTM_SETTINGS.
+
+    Parameters
+    ----------
+    name: str | circuit, usually host of status_url
+    window: int | seconds of rolling window failures are counted in
+    min_calls: int | calls in window before circuit can open
+    failure_rate: float | share of failed calls that opens circuit
+    reset_timeout: float | seconds circuit stays open before a probe
+    """
+
+    BUCKETS = 10
+
+    def __init__(self, name: str, window: int = None, min_calls: int = None,
+                 failure_rate: float = None, reset_timeout: float = None):
+        def setting(value, setting_name):
+            return paytm_settings(setting_name) if value is None else value
+
+        self.name = name
+        self.window = setting(window, 'STATUS_BREAKER_WINDOW')
+        self.min_calls = setting(min_calls, 'STATUS_BREAKER_MIN_CALLS')
+        self.failure_rate = setting(failure_rate,
+                                    'STATUS_BREAKER_FAILURE_RATE')
+        self.reset_timeout = setting(reset_timeout,
+                                     'STATUS_BREAKER_RESET_TIMEOUT')
+        self.prefix = '%s:%s' % (paytm_settings('STATUS_BREAKER_KEY'), name)
+        self.bucket_size = max(self.window / self.BUCKETS, 1)
+
+    @property
+    def cache(self):
+        from django.core.cache import cache
+
+        return cache
+
+    def bucket_keys(self, now: float) -> list:
+        """
+        Provides (calls, failures) cache keys of every bucket of the
+        window, current bucket first.
+        """
+        current = int(now // self.bucket_size)
+        return [('%s:calls:%d' % (self.prefix, bucket),
+                 '%s:failures:%d' % (self.prefix, bucket))
+                for bucket in range(current, current - self.BUCKETS, -1)]
+
+    def counts(self, now: float = None) -> tuple:
+        """
+        Provides (calls, failures) made in the window.
+        """
+        keys = self.bucket_keys(time.time() if now is None else now)
+        values = self.cache.get_many([key for pair in keys for key in pair])
+        return (sum(values.get(calls, 0) for calls, _ in keys),
+                sum(values.get(failures, 0) for _, failures in keys))
+
+    def incr(self, key: str):
+        # incr() fails on missing keys, add() fails on existing ones
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, timeout=self.window * 2):
+                self.cache.incr(key)
+
+    def state(self) -> str:
+        opened_until = self.cache.get(self.prefix + ':open')
+        if opened_until is None:
+            return CLOSED
+        return OPEN if time.time() < opened_until else HALF_OPEN
+
+    def before(self) -> bool:
+        """
+        Checks that a call may be made, before making it.
+
+        Returns
+        -------
+        bool: True if the call is the probe of a half open circuit
+
+        Raises
+        ------
+        CircuitOpen: if circuit is open, or half open with a probe
+        already in flight.
+        """
+        opened_until = self.cache.get(self.prefix + ':open')
+        if opened_until is None:
+            return False
+        # Only one worker wins add() and probes, others fail fast
+        if time.time() < opened_until or not self.cache.add(
+                self.prefix + ':probe', 1, timeout=self.reset_timeout):
+            raise CircuitOpen("Circuit of PayTM Status API at %s is open."
+                              % self.name)
+        return True
+
+    def record(self, success: bool, probe: bool = False):
+        """
+        Counts outcome of a call, opening or closing the circuit.
+
+        Parameters
+        ----------
+        success: bool | False if gateway could not be reached or failed
+        probe: bool | as returned by before()
+        """
+        now = time.time()
+        if probe:
+            if success:
+                self.close()
+            else:
+                self.open(now)
+            return
+
+        calls, failures = self.bucket_keys(now)[0]
+        self.incr(calls)
+        if success:
+            return
+        self.incr(failures)
+        total, failed = self.counts(now)
+        if total >= self.min_calls and failed >= total * self.failure_rate:
+            self.open(now)
+
+    def open(self, now: float = None):
+        from . import metrics
+
+        now = time.time() if now is None else now
+        # Kept past reset_timeout, so that the circuit is half open then
+        self.cache.set(self.prefix + ':open', now + self.reset_timeout,
+                       timeout=None)
+        self.cache.delete(self.prefix + ':probe')
+        metrics.increment('gateway.circuit', state=OPEN)
+        logger.warning("Circuit of PayTM Status API at %s opened for %ss.",
+                       self.name, self.reset_timeout)
+
+    def close(self):
+        from . import metrics
+
+        self.reset()
+        metrics.increment('gateway.circuit', state=CLOSED)
+        logger.info("Circuit of PayTM Status API at %s closed.", self.name)
+
+    def reset(self):
+        """
+        Closes the circuit and forgets calls made in the window.
+        """
+        keys = [key for pair in self.bucket_keys(time.time())
+                for key in pair]
+        self.cache.delete_many(keys + [self.prefix + ':open',
+                                       self.prefix + ':probe'])
+
+
+def get_breaker(url: str) -> CircuitBreaker:
+    """
+    Provides circuit breaker of host of a status_url.
+    """
+    from urllib.parse import urlsplit
+
+    return CircuitBreaker(urlsplit(url).netloc or url)
@@ -0,0 +1,108 @@
+"""
+Settings for PayTM app.
+Every setting is read from the PAYTM_SETTINGS dict of Django settings
+and falls back to the default listed in DEFAULTS.
+"""
+
+DEFAULTS = {
+    # Dotted path of strategy routing new Transaction Requests across
+    # active PayTM Configurations, and its keyword arguments
+    'ROUTING_STRATEGY': 'drf_paytm.routing.WeightedRoundRobinStrategy',
+    'ROUTING_STRATEGY_OPTIONS': {},
+
+    # Share configuration cache invalidation across worker processes
+    # via Django's cache framework.
+    'SHARED_CONFIG_CACHE': False,
+    'CONFIG_CACHE_KEY': 'drf_paytm:configuration:version',
+
+    # PayTM Transaction Status API client
+    'STATUS_CONNECT_TIMEOUT': 3.05,
+    'STATUS_READ_TIMEOUT': 10,
+    'STATUS_RETRIES': 2,
+    'STATUS_BACKOFF': 0.2,
+    'STATUS_BACKOFF_MAX': 2,
+    'STATUS_POOL_SIZE': 10,
+
+    # Circuit breaker of Transaction Status API, state is kept in
+    # Django's cache. While it is open callbacks are 'reject'ed or
+    # saved unverified to 'defer' verification.
+    'STATUS_BREAKER_ENABLED': False,
+    'STATUS_BREAKER_KEY': 'drf_paytm:breaker',
+    'STATUS_BREAKER_WINDOW': 60,
+    'STATUS_BREAKER_MIN_CALLS': 20,
+    'STATUS_BREAKER_FAILURE_RATE': 0.5,
+    'STATUS_BREAKER_RESET_TIMEOUT': 30,
+    'STATUS_BREAKER_FALLBACK': 'reject',
+
+    # Cache of Transaction Status API responses by (mid, orderid), in
+    # seconds for pending and for TXN_SUCCESS & TXN_FAILURE statuses
+    'STATUS_CACHE_ENABLED': False,
+    'STATUS_CACHE_KEY': 'drf_paytm:status',
+    'STATUS_CACHE_TTL': 5,
+    'STATUS_CACHE_TERMINAL_TTL': 300,
+
+    # Save callbacks as unverified and check status in background
+    'DEFER_STATUS_VERIFICATION': False,
+    'BACKGROUND_EXECUTOR': 'drf_paytm.executors.ThreadPoolExecutor',
+    'EXECUTOR_WORKERS': 4,
+    'EXECUTOR_QUEUE': 'default',
+
+    # payment_done is sent after commit, 'inline' or via 'executor'
+    'PAYMENT_DONE_DISPATCH': 'inline',
+    'DISPATCH_BATCH_SIZE': 100,
+    'DISPATCH_LINGER': 0.05,
+    'DISPATCH_RETRIES': 2,
+    'DISPATCH_BACKOFF': 0.5,
+    'DISPATCH_BACKOFF_MAX': 5,
+
+    # Transactional outbox of payment events & its relays
+    'OUTBOX_ENABLED': False,
+    'OUTBOX_SINK': None,
+    'OUTBOX_SINK_OPTIONS': {},
+    'OUTBOX_BATCH_SIZE': 500,
+    'OUTBOX_MAX_ATTEMPTS': 10,
+
+    # Delivery of webhooks to Webhook Subscriptions
+    'WEBHOOK_WORKERS': 16,
+    'WEBHOOK_BATCH_SIZE': 200,
+    'WEBHOOK_TIMEOUT': 5,
+    'WEBHOOK_MAX_ATTEMPTS': 8,
+    'WEBHOOK_BACKOFF': 30,
+    'WEBHOOK_BACKOFF_MAX': 3600,
+    'WEBHOOK_LEASE': 300,
+
+    # Dotted path of metrics sink, metrics are disabled if not set
+    'METRICS_SINK': None,
+    'METRICS_SINK_OPTIONS': {},
+
+    # Send payment page of now/ as StreamingHttpResponse
+    'STREAM_PAYMENT_PAGE': False,
+
+    # Dotted path of crypto backend, fastest available one if not set
+    'CRYPTO_BACKEND': None,
+
+    # URL name of view PayTM posts callbacks to, set it to
+    # 'drf_paytm:async-add-transaction-response' under ASGI
+    'CALLBACK_URL_NAME': 'drf_paytm:list-add-transaction-response',
+
+    # Cursor pagination of listing endpoints
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 500,
+}
+
+
+def paytm_settings(name: str):
+    """
+    Provides value of a PayTM setting.
+
+    Parameters
+    ----------
+    name: str | key of setting
+
+    Returns
+    -------
+    Value set in PAYTM_SETTINGS, default value otherwise.
+    """
+    from django.conf import settings
+
+    return getattr(settings, 'PAYTM_SETTINGS', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,191 @@
+"""
+AES-CBC backends used by ChecksumEngine.
+
+Backend is chosen via CRYPTO_BACKEND setting. If it is not set, the
+fastest backend available at import time is used, in this order:
+1. CryptographyBackend: `cryptography` (OpenSSL)
+2. PyCryptodomeBackend: `pycryptodome`/`pycryptodomex`, also works with
+   the legacy `pycrypto`
+"""
+
+import threading
+
+from importlib.util import find_spec
+
+BLOCK_SIZE = 16
+
+
+class BaseCryptoBackend(object):
+    """
+    Base class for all crypto backends.
+
+    One backend object is created per key and keeps a persistent CBC
+    encryption context. As a CBC context carries its chain over to the
+    next message, the first block of every message is XORed with
+    IV ^ previous ciphertext block so that every message is encrypted
+    as if the chain started from IV. Decryption runs one ECB pass over
+    the whole message and applies CBC chaining with a single XOR.
+
+    Subclasses implement is_available(), _cbc_encrypt() & _ecb_decrypt().
+    """
+
+    name = None
+
+    def __init__(self, key: bytes, iv: bytes):
+        self.key = key
+        self.iv = iv
+        self._iv = int.from_bytes(iv, 'big')
+        self._chain = self._iv
+        self._lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        raise NotImplementedError
+
+    def _cbc_encrypt(self, data: bytes) -> bytes:
+        """
+        Encrypts data with persistent CBC context. Called under lock.
+        """
+        raise NotImplementedError
+
+    def _ecb_decrypt(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def encrypt_many(self, messages) -> list:
+        """
+        Encrypts many padded messages holding the lock once.
+
+        Parameters
+        ----------
+        messages: iterable of bytes | padded to BLOCK_SIZE
+
+        Returns
+        -------
+        list: encrypted bytes of every message
+        """
+        encrypted = []
+        with self._lock:
+            chain = self._chain
+            for data in messages:
+                first = int.from_bytes(data[:BLOCK_SIZE], 'big') ^ self._iv
+                first = (first ^ chain).to_bytes(BLOCK_SIZE, 'big')
+                message = self._cbc_encrypt(first + data[BLOCK_SIZE:])
+                chain = int.from_bytes(message[-BLOCK_SIZE:], 'big')
+                encrypted.append(message)
+            self._chain = chain
+        return encrypted
+
+    def encrypt(self, data: bytes) -> bytes:
+        return self.encrypt_many((data, ))[0]
+
+    def decrypt(self, data: bytes) -> bytes:
+        """
+        Decrypts AES-CBC encrypted data. Padding is not removed.
+
+        Raises
+        ------
+        ValueError: if data is not a multiple of BLOCK_SIZE.
+        """
+        if not data or len(data) % BLOCK_SIZE:
+            raise ValueError("Invalid encrypted data length.")
+        # P[i] = D(C[i]) ^ C[i - 1], with C[-1] = IV
+        decrypted = int.from_bytes(self._ecb_decrypt(data), 'big')
+        chain = int.from_bytes(self.iv + data[:-BLOCK_SIZE], 'big')
+        return (decrypted ^ chain).to_bytes(len(data), 'big')
+
+
+class CryptographyBackend(BaseCryptoBackend):
+    """
+    AES-CBC via `cryptography`, backed by OpenSSL.
+    """
+
+    name = 'cryptography'
+
+    def __init__(self, key: bytes, iv: bytes):
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives.ciphers import Cipher
+        from cryptography.hazmat.primitives.ciphers import algorithms, modes
+
+        super(CryptographyBackend, self).__init__(key, iv)
+        algorithm = algorithms.AES(key)
+        self._encryptor = Cipher(algorithm, modes.CBC(iv),
+                                 backend=default_backend()).encryptor()
+        self._decryptor = Cipher(algorithm, modes.ECB(),
+                                 backend=default_backend()).decryptor()
+        self._decrypt_lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return find_spec('cryptography') is not None
+
+    def _cbc_encrypt(self, data: bytes) -> bytes:
+        return self._encryptor.update(data)
+
+    def _ecb_decrypt(self, data: bytes) -> bytes:
+        # Cipher contexts are not thread safe
+        with self._decrypt_lock:
+            return self._decryptor.update(data)
+
+
+class PyCryptodomeBackend(BaseCryptoBackend):
+    """
+    AES-CBC via `pycryptodomex`, `pycryptodome` or legacy `pycrypto`.
+    """
+
+    name = 'pycryptodome'
+
+    def __init__(self, key: bytes, iv: bytes):
+        AES = self.aes_module()
+
+        super(PyCryptodomeBackend, self).__init__(key, iv)
+        self._cbc = AES.new(key, AES.MODE_CBC, iv)
+        self._ecb = AES.new(key, AES.MODE_ECB)
+
+    @staticmethod
+    def aes_module():
+        try:
+            from Cryptodome.Cipher import AES
+        except ImportError:
+            from Crypto.Cipher import AES
+        return AES
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return (find_spec('Cryptodome') is not None
+                or find_spec('Crypto') is not None)
+
+    def _cbc_encrypt(self, data: bytes) -> bytes:
+        return self._cbc.encrypt(data)
+
+    def _ecb_decrypt(self, data: bytes) -> bytes:
+        return self._ecb.decrypt(data)
+
+
+# Fastest first
+BACKENDS = (CryptographyBackend, PyCryptodomeBackend)
+
+AVAILABLE_BACKENDS = tuple(backend for backend in BACKENDS
+                           if backend.is_available())
+
+
+def get_backend_class():
+    """
+    Provides backend class set in CRYPTO_BACKEND setting, the fastest
+    available one otherwise.
+
+    Raises
+    ------
+    ImproperlyConfigured: if no backend is available.
+    """
+    from django.core.exceptions import ImproperlyConfigured
+    from django.utils.module_loading import import_string
+
+    from .conf import paytm_settings
+
+    backend = paytm_settings('CRYPTO_BACKEND')
+    if backend:
+        return import_string(backend)
+    if not AVAILABLE_BACKENDS:
+        raise ImproperlyConfigured("drf_paytm requires either cryptography "
+                                   "or pycryptodome to be installed.")
+    return AVAILABLE_BACKENDS[0]
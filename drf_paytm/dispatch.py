@@ -0,0 +1,361 @@
+"""
+Dispatch of payment_done signal.
+
+payment_done is never sent inside the transaction that saves a
+Transaction Response: it is scheduled with transaction.on_commit and
+delivered, depending on PAYMENT_DONE_DISPATCH setting:
+- 'inline' (default): right after commit, in the committing thread,
+  i.e. before the callback responds, as payment_done always was.
+  Receivers that fail are retried in background via BACKGROUND_EXECUTOR,
+  so that the committing thread never sleeps between retries.
+- 'executor': in background, via BACKGROUND_EXECUTOR, in batches of up
+  to DISPATCH_BATCH_SIZE responses collected for DISPATCH_LINGER seconds.
+  Batches are collected in memory by a daemon thread of the process:
+  responses committed but not yet submitted are lost if the process
+  crashes, they are only submitted on normal exit. With
+  DISPATCH_BATCH_SIZE of 1, every response is handed to the executor
+  right after commit instead.
+
+Every receiver is called on its own: a failing receiver is retried with
+jittered exponential backoff without calling the other receivers again,
+and never breaks the callback. Time spent in every receiver is recorded
+and provided by receiver_stats().
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from .conf import paytm_settings
+
+logger = logging.getLogger(__name__)
+
+
+def receiver_name(receiver) -> str:
+    return '%s.%s' % (getattr(receiver, '__module__', ''),
+                      getattr(receiver, '__qualname__', repr(receiver)))
+
+
+def receiver_key(receiver, receivers) -> str:
+    """
+    Provides key a retry finds a receiver by in another thread or
+    process: module & qualified name, followed by position among
+    receivers of the same name, e.g. bound methods of two instances.
+    """
+    name = receiver_name(receiver)
+    same = [other for other in receivers if receiver_name(other) == name]
+    if len(same) < 2:
+        return name
+    return '%s#%d' % (name, same.index(receiver))
+
+
+class ReceiverStats(object):
+    """
+    Thread safe calls, errors & time spent per receiver.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, elapsed: float, error: bool):
+        with self._lock:
+            stats = self._stats.setdefault(name, dict(
+                calls=0, errors=0, total=0.0, max=0.0))
+            stats['calls'] += 1
+            stats['errors'] += error
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: dict(stats, mean=stats['total'] / stats['calls'])
+                    for name, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+stats = ReceiverStats()
+
+
+def receiver_stats() -> dict:
+    """
+    Provides {receiver: {calls, errors, total, max, mean}}, times in
+    seconds, recorded by this process.
+    """
+    return stats.snapshot()
+
+
+def live_receivers(sender) -> list:
+    from .signals import payment_done
+
+    return payment_done.live_receivers(sender)
+
+
+def call(receiver, instance) -> bool:
+    """
+    Calls a receiver of payment_done for a Transaction Response, the way
+    Signal.send() does, and records its time.
+
+    Returns
+    -------
+    bool: True if receiver did not raise
+    """
+    from .models import TransactionResponse
+    from .signals import payment_done
+
+    start = time.perf_counter()
+    error = False
+    try:
+        receiver(signal=payment_done, sender=TransactionResponse,
+                 instance=instance)
+    except Exception:
+        error = True
+        logger.exception("payment_done receiver %s failed for Transaction "
+                         "Response %s.", receiver_name(receiver), instance.pk)
+    stats.record(receiver_name(receiver), time.perf_counter() - start, error)
+    return not error
+
+
+def dispatch(instances, retries: int = None):
+    """
+    Calls every receiver of payment_done for every Transaction Response,
+    retrying failed calls.
+
+    Parameters
+    ----------
+    instances: iterable of TransactionResponse
+    retries: int | DISPATCH_RETRIES if not provided
+
+    Returns
+    -------
+    list: (receiver, instance) that failed every attempt
+    """
+    from .models import TransactionResponse
+    from .paytmapi import backoff_delay
+
+    if retries is None:
+        retries = paytm_settings('DISPATCH_RETRIES')
+    receivers = live_receivers(TransactionResponse)
+    failed = [(receiver, instance) for instance in instances
+              for receiver in receivers if not call(receiver, instance)]
+    for attempt in range(retries):
+        if not failed:
+            break
+        time.sleep(backoff_delay(attempt, paytm_settings('DISPATCH_BACKOFF'),
+                                 paytm_settings('DISPATCH_BACKOFF_MAX')))
+        failed = [(receiver, instance) for receiver, instance in failed
+                  if not call(receiver, instance)]
+    for receiver, instance in failed:
+        logger.error("Gave up calling payment_done receiver %s for "
+                     "Transaction Response %s.", receiver_name(receiver),
+                     instance.pk)
+    return failed
+
+
+def dispatch_inline(instances):
+    """
+    Calls every receiver of payment_done once for every Transaction
+    Response and hands failed calls to background executor to be
+    retried, if DISPATCH_RETRIES allows.
+
+    Returns
+    -------
+    list: (receiver, instance) that failed
+    """
+    from .models import TransactionResponse
+
+    receivers = live_receivers(TransactionResponse)
+    failed = [(receiver, instance) for instance in instances
+              for receiver in receivers if not call(receiver, instance)]
+    for receiver, instance in failed:
+        submit_retry(receiver_key(receiver, receivers), instance.pk, 0)
+    return failed
+
+
+def submit_retry(key: str, response_id: int, attempt: int):
+    """
+    Schedules retry of a failed receiver in background, giving up once
+    DISPATCH_RETRIES attempts were made.
+
+    Parameters
+    ----------
+    key: str | receiver of payment_done that failed, see receiver_key()
+    response_id: int | primary key of TransactionResponse
+    attempt: int | number of retries already made
+    """
+    from .executors import get_executor
+
+    if attempt >= paytm_settings('DISPATCH_RETRIES'):
+        logger.error("Gave up calling payment_done receiver %s for "
+                     "Transaction Response %s.", key, response_id)
+        return
+    try:
+        get_executor().submit('drf_paytm.tasks.retry_payment_done', key,
+                              response_id, attempt)
+    except Exception:
+        logger.exception("Could not submit retry of payment_done receiver "
+                         "%s for Transaction Response %s.", key, response_id)
+
+
+def retry(key: str, response_id: int, attempt: int) -> bool:
+    """
+    Calls a receiver of payment_done again, after backoff, scheduling
+    one more retry if it fails. Run by background executors.
+
+    Parameters
+    ----------
+    key: str | receiver, as given by receiver_key()
+    response_id: int | primary key of TransactionResponse
+    attempt: int | number of retries already made
+
+    Returns
+    -------
+    bool: True if receiver did not raise
+    """
+    from .models import TransactionResponse
+    from .paytmapi import backoff_delay
+
+    receivers = live_receivers(TransactionResponse)
+    receiver = next((receiver for receiver in receivers
+                     if receiver_key(receiver, receivers) == key), None)
+    if receiver is None:
+        logger.warning("payment_done receiver %s is not connected anymore.",
+                       key)
+        return False
+    instance = TransactionResponse.objects.filter(pk=response_id).first()
+    if instance is None:
+        return False
+
+    time.sleep(backoff_delay(attempt, paytm_settings('DISPATCH_BACKOFF'),
+                             paytm_settings('DISPATCH_BACKOFF_MAX')))
+    if call(receiver, instance):
+        return True
+    submit_retry(key, response_id, attempt + 1)
+    return False
+
+
+def deliver(response_ids):
+    """
+    Loads Transaction Responses in one query and dispatches payment_done
+    for them. Run by background executors.
+    """
+    from .models import TransactionResponse
+
+    responses = TransactionResponse.objects.in_bulk(response_ids)
+    return dispatch(responses[pk] for pk in response_ids if pk in responses)
+
+
+class Batcher(object):
+    """
+    Collects response IDs from any thread and submits them to background
+    executor in batches of up to `batch_size`, waiting at most `linger`
+    seconds for a batch to fill.
+    """
+
+    def __init__(self, batch_size: int, linger: float):
+        self.batch_size = batch_size
+        self.linger = linger
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def add(self, response_ids):
+        for pk in response_ids:
+            self.queue.put(pk)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self.run, name='drf_paytm_dispatch',
+                        daemon=True)
+                    self._thread.start()
+
+    def take(self, block: bool = True) -> list:
+        """
+        Takes next batch off the queue, empty list if there is none.
+        """
+        try:
+            batch = [self.queue.get(block=block)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(block=block and remaining > 0,
+                                            timeout=max(remaining, 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def submit(batch):
+        from .executors import get_executor
+
+        try:
+            get_executor().submit('drf_paytm.tasks.deliver_payment_done',
+                                  batch)
+        except Exception:
+            logger.exception("Could not submit payment_done for Transaction "
+                             "Responses %s.", batch)
+
+    def run(self):
+        while True:
+            self.submit(self.take())
+
+    def flush(self):
+        """
+        Submits whatever is queued right away, in current thread.
+        """
+        batch = self.take(block=False)
+        while batch:
+            self.submit(batch)
+            batch = self.take(block=False)
+
+
+_batcher = None
+_lock = threading.Lock()
+
+
+def get_batcher() -> Batcher:
+    global _batcher
+
+    if _batcher is None:
+        with _lock:
+            if _batcher is None:
+                import atexit
+
+                _batcher = Batcher(paytm_settings('DISPATCH_BATCH_SIZE'),
+                                   paytm_settings('DISPATCH_LINGER'))
+                atexit.register(_batcher.flush)
+    return _batcher
+
+
+def schedule(instances, using: str = None):
+    """
+    Schedules payment_done for Transaction Responses once current
+    transaction commits, immediately if there is none.
+
+    Parameters
+    ----------
+    instances: list of TransactionResponse
+    using: str | database alias
+    """
+    from django.db import transaction
+
+    instances = list(instances)
+    if not instances:
+        return
+    if paytm_settings('PAYMENT_DONE_DISPATCH') != 'executor':
+        transaction.on_commit(lambda: dispatch_inline(instances),
+                              using=using)
+    elif paytm_settings('DISPATCH_BATCH_SIZE') > 1:
+        transaction.on_commit(lambda: get_batcher().add(
+            [instance.pk for instance in instances]), using=using)
+    else:
+        transaction.on_commit(lambda: Batcher.submit(
+            [instance.pk for instance in instances]), using=using)
@@ -0,0 +1,108 @@
+"""
+Background executors used to run PayTM tasks outside of the request
+cycle. Tasks are referred by dotted path and receive only JSON
+serializable arguments, so that they can be handed to a task queue.
+
+Executor is chosen via BACKGROUND_EXECUTOR setting:
+- drf_paytm.executors.ThreadPoolExecutor (default)
+- drf_paytm.executors.CeleryExecutor
+- drf_paytm.executors.RQExecutor
+- drf_paytm.executors.SyncExecutor
+"""
+
+import threading
+
+from .conf import paytm_settings
+
+
+class BaseExecutor(object):
+    """
+    Base class for all executors.
+    """
+
+    def submit(self, task: str, *args):
+        """
+        Schedules a task to be run in background.
+
+        Parameters
+        ----------
+        task: str | dotted path of task function
+        args: JSON serializable arguments of task
+        """
+        raise NotImplementedError
+
+
+class SyncExecutor(BaseExecutor):
+    """
+    Runs task immediately in current thread. Useful in tests.
+    """
+
+    def submit(self, task: str, *args):
+        from .tasks import run_task
+
+        return run_task(task, *args)
+
+
+class ThreadPoolExecutor(BaseExecutor):
+    """
+    Runs tasks on a process local thread pool of EXECUTOR_WORKERS
+    threads.
+    """
+
+    def __init__(self, max_workers: int = None):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers or paytm_settings('EXECUTOR_WORKERS'),
+            thread_name_prefix='drf_paytm')
+
+    def submit(self, task: str, *args):
+        from .tasks import run_task_in_thread
+
+        return self.pool.submit(run_task_in_thread, task, *args)
+
+
+class CeleryExecutor(BaseExecutor):
+    """
+    Sends tasks to Celery. Requires celery to be installed and
+    drf_paytm.tasks to be discovered by the Celery app.
+    """
+
+    def submit(self, task: str, *args):
+        from .tasks import run_task_celery
+
+        return run_task_celery.apply_async(
+            args=[task] + list(args), queue=paytm_settings('EXECUTOR_QUEUE'))
+
+
+class RQExecutor(BaseExecutor):
+    """
+    Sends tasks to RQ via django_rq.
+    """
+
+    def submit(self, task: str, *args):
+        import django_rq
+
+        queue = django_rq.get_queue(paytm_settings('EXECUTOR_QUEUE'))
+        return queue.enqueue('drf_paytm.tasks.run_task', task, *args)
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor() -> BaseExecutor:
+    """
+    Provides executor configured by BACKGROUND_EXECUTOR setting, created
+    once per process.
+    """
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                from django.utils.module_loading import import_string
+
+                _executor = import_string(
+                    paytm_settings('BACKGROUND_EXECUTOR'))()
+    return _executor
@@ -0,0 +1,140 @@
+"""
+Streaming export of Transaction Responses as CSV or NDJSON.
+
+Rows are read with values_list() over a chunked iterator, so no model
+instance is created and memory stays constant however many rows are
+exported. Output is produced by generators, to be written to a file or
+sent as StreamingHttpResponse.
+"""
+
+import csv
+
+# Raw response & checksum are left out, settlement does not need them
+FIELDS = ('id', 'mid', 'tid', 'oid', 'cid', 'bnkid', 'amount', 'currency',
+          'status', 'code', 'message', 'timestamp', 'gateway', 'bank', 'mode',
+          'is_verified', 't_request_id')
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo(object):
+    """
+    File-like object that returns what is written, used to get lines
+    out of csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def rows(queryset=None, fields=FIELDS, chunk_size: int = 2000):
+    """
+    Provides a tuple per Transaction Response, in order of primary key.
+
+    Parameters
+    ----------
+    queryset: QuerySet | Transaction Responses, all if not provided
+    fields: tuple | fields to export
+    chunk_size: int | number of rows fetched from database at once
+    """
+    from .models import TransactionResponse
+
+    if queryset is None:
+        queryset = TransactionResponse.objects.all()
+    return queryset.order_by('pk').values_list(*fields).iterator(
+        chunk_size=chunk_size)
+
+
+def escape_formula(value):
+    """
+    Prefixes a string that a spreadsheet would evaluate as formula with
+    a quote, so that it is shown as text.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(rows, fields=FIELDS, batch: int = 500):
+    """
+    Yields header and rows as CSV, `batch` rows per string. Strings are
+    escaped with escape_formula(), as values such as message come from
+    payers & PayTM.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow([escape_formula(value)
+                                      for value in row]))
+        if len(lines) == batch:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def ndjson_lines(rows, fields=FIELDS, batch: int = 500):
+    """
+    Yields rows as JSON objects, one per line, `batch` rows per string.
+    """
+    from django.core.serializers.json import DjangoJSONEncoder
+
+    encode = DjangoJSONEncoder(separators=(',', ':')).encode
+    lines = []
+    for row in rows:
+        lines.append(encode(dict(zip(fields, row))) + '\n')
+        if len(lines) == batch:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+WRITERS = {
+    'csv': csv_lines,
+    'ndjson': ndjson_lines,
+}
+
+
+def export(queryset=None, fmt: str = 'csv', chunk_size: int = 2000):
+    """
+    Provides a generator of exported Transaction Responses.
+
+    Parameters
+    ----------
+    queryset: QuerySet | Transaction Responses, all if not provided
+    fmt: str | `csv` or `ndjson`
+    chunk_size: int | number of rows fetched from database at once
+
+    Returns
+    -------
+    generator of str
+
+    Raises
+    ------
+    ValueError: if format is not supported.
+    """
+    if fmt not in WRITERS:
+        raise ValueError("Unsupported export format: %s" % fmt)
+    return WRITERS[fmt](rows(queryset, chunk_size=chunk_size))
+
+
+def streaming_response(queryset=None, fmt: str = 'csv',
+                       filename: str = 'transaction_responses'):
+    """
+    Provides export as a StreamingHttpResponse downloaded as attachment.
+    """
+    from django.http import StreamingHttpResponse
+
+    response = StreamingHttpResponse(export(queryset, fmt),
+                                     content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+        filename, fmt)
+    return response
@@ -0,0 +1,56 @@
+"""
+Filters of listing endpoints. Filters narrow rows of the logged in user
+that are read through composite indexes led by the owner column.
+"""
+
+from django_filters import rest_framework as filters
+
+
+class TransactionRequestFilter(filters.FilterSet):
+    """
+    Filters Transaction Requests on payment status, completion, creation
+    date range and amount range.
+    """
+    from .variables import STATUS_CHOICES
+
+    status = filters.ChoiceFilter(field_name='payment_status',
+                                  choices=STATUS_CHOICES)
+    completed = filters.BooleanFilter(field_name='completed_at',
+                                      lookup_expr='isnull', exclude=True)
+    created_after = filters.IsoDateTimeFilter(field_name='create_date',
+                                              lookup_expr='gte')
+    created_before = filters.IsoDateTimeFilter(field_name='create_date',
+                                               lookup_expr='lt')
+    min_amount = filters.NumberFilter(field_name='amount', lookup_expr='gte')
+    max_amount = filters.NumberFilter(field_name='amount', lookup_expr='lte')
+
+    class Meta:
+        from .models import TransactionRequest
+
+        model = TransactionRequest
+        fields = ('status', 'completed', 'created_after', 'created_before',
+                  'min_amount', 'max_amount')
+
+
+class TransactionResponseFilter(filters.FilterSet):
+    """
+    Filters Transaction Responses on status, order, transaction date
+    range and amount range.
+    """
+    from .variables import STATUS_CHOICES
+
+    status = filters.ChoiceFilter(field_name='status', choices=STATUS_CHOICES)
+    oid = filters.CharFilter(field_name='oid')
+    after = filters.IsoDateTimeFilter(field_name='timestamp',
+                                      lookup_expr='gte')
+    before = filters.IsoDateTimeFilter(field_name='timestamp',
+                                       lookup_expr='lt')
+    min_amount = filters.NumberFilter(field_name='amount', lookup_expr='gte')
+    max_amount = filters.NumberFilter(field_name='amount', lookup_expr='lte')
+
+    class Meta:
+        from .models import TransactionResponse
+
+        model = TransactionResponse
+        fields = ('status', 'oid', 'after', 'before', 'min_amount',
+                  'max_amount')
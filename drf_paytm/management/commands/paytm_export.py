@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Exports Transaction Responses as CSV or NDJSON in constant "
+            "memory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=('csv', 'ndjson'),
+                            default='csv', help="Output format.")
+        parser.add_argument('--output', default='-',
+                            help="File to write to, - for stdout.")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Number of rows read from database at "
+                                 "once.")
+        parser.add_argument('--status', help="Only responses with this "
+                                             "status.")
+        parser.add_argument('--after', help="Only responses with TXNDATE "
+                                            "on or after this ISO date.")
+        parser.add_argument('--before', help="Only responses with TXNDATE "
+                                             "before this ISO date.")
+
+    def handle(self, *args, **options):
+        from django.core.management.base import CommandError
+
+        from drf_paytm.export import export
+        from drf_paytm.filters import TransactionResponseFilter
+        from drf_paytm.models import TransactionResponse
+
+        filterset = TransactionResponseFilter(
+            data={key: options[key] for key in ('status', 'after', 'before')
+                  if options[key]},
+            queryset=TransactionResponse.objects.all())
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+
+        lines = export(filterset.qs, fmt=options['format'],
+                       chunk_size=options['chunk_size'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='') as output:
+            output.writelines(lines)
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Publishes payment events of the outbox to OUTBOX_SINK in "
+            "batches. Run as many relays as needed, side by side.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', action='append', default=None,
+                            help="Dotted path of sink, OUTBOX_SINK if not "
+                                 "provided. Repeat to publish to several "
+                                 "sinks.")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Number of events published at once.")
+        parser.add_argument('--once', action='store_true',
+                            help="Stop once the outbox is drained.")
+        parser.add_argument('--idle', type=float, default=1.0,
+                            help="Seconds to wait when the outbox is empty.")
+        parser.add_argument('--purge-days', type=int, default=None,
+                            help="Delete events published more than these "
+                                 "many days ago, then exit.")
+
+    def handle(self, *args, **options):
+        from django.core.exceptions import ImproperlyConfigured
+        from django.core.management.base import CommandError
+
+        from drf_paytm.outbox import Relay, purge
+        from drf_paytm.sinks import get_sink
+
+        if options['purge_days'] is not None:
+            self.stdout.write("Deleted %d published events."
+                              % purge(options['purge_days']))
+            return
+
+        try:
+            sinks = options['sink'] or []
+            sink = get_sink(sinks[0] if len(sinks) == 1 else sinks)
+        except ImproperlyConfigured as e:
+            raise CommandError(e)
+        relay = Relay(sink=sink, batch_size=options['batch_size'])
+        try:
+            stats = relay.run(once=options['once'], idle=options['idle'])
+        except KeyboardInterrupt:
+            stats = relay.stats
+        finally:
+            relay.close()
+        self.stdout.write(
+            "Published {published} events in {batches} batches in "
+            "{elapsed:.2f}s ({throughput:.1f}/s), {failed} failed.".format(
+                throughput=relay.throughput, **stats))
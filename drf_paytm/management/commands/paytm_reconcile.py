@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Reconciles Transaction Requests that have no verified successful "
+            "Transaction Response with PayTM Transaction Status API.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16,
+                            help="Number of concurrent status calls.")
+        parser.add_argument('--rate', type=float, default=50,
+                            help="Maximum status calls per second, 0 for no "
+                                 "limit.")
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Number of requests read & written at once.")
+        parser.add_argument('--min-age', type=int, default=30,
+                            help="Skip requests younger than these many "
+                                 "minutes.")
+        parser.add_argument('--days', type=int, default=3,
+                            help="Only requests created within these many "
+                                 "days.")
+
+    def handle(self, *args, **options):
+        from drf_paytm.reconcile import Reconciler, pending_requests
+
+        self.stdout.write(
+            "Reconciling requests created within the last {days} days, at "
+            "least {min_age} minutes ago.".format(**options))
+        reconciler = Reconciler(workers=options['workers'],
+                                rate=options['rate'],
+                                chunk_size=options['chunk_size'])
+        stats = reconciler.reconcile(pending_requests(
+            min_age=options['min_age'], days=options['days']))
+        self.stdout.write(
+            "Checked {checked} requests in {elapsed:.2f}s ({throughput:.1f}/s):"
+            " {created} created, {updated} updated, {unchanged} unchanged, "
+            "{skipped} skipped, {errors} errors.".format(
+                throughput=reconciler.throughput, **stats))
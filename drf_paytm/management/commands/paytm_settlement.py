@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+
+
+def date(value):
+    import argparse
+    import datetime
+
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid date: %s" % value)
+
+
+class Command(BaseCommand):
+    help = ("Matches a PayTM settlement report (CSV) with Transaction "
+            "Responses and writes rows that could not be settled.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('report', help="Settlement report CSV file.")
+        parser.add_argument('--output', default='-',
+                            help="File to write mismatches to, - for stdout.")
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help="Number of report rows matched at once.")
+        parser.add_argument('--from', dest='date_from', type=date,
+                            help="First ISO date of report, earliest row "
+                                 "date if not set.")
+        parser.add_argument('--to', dest='date_to', type=date,
+                            help="Last ISO date of report, latest row date "
+                                 "if not set.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report mismatches, do not mark "
+                                 "responses as settled.")
+
+    def handle(self, *args, **options):
+        from django.core.management.base import CommandError
+
+        from drf_paytm.settlement import SettlementReconciler
+        from drf_paytm.settlement import write_mismatches
+
+        reconciler = SettlementReconciler(chunk_size=options['chunk_size'],
+                                          date_from=options['date_from'],
+                                          date_to=options['date_to'],
+                                          dry_run=options['dry_run'])
+        try:
+            with open(options['report'], newline='') as report:
+                mismatches = reconciler.reconcile(report)
+                if options['output'] == '-':
+                    write_mismatches(mismatches, self.stdout)
+                else:
+                    with open(options['output'], 'w', newline='') as output:
+                        write_mismatches(mismatches, output)
+        except ValueError as e:
+            raise CommandError(e)
+
+        self.stderr.write(
+            "Matched {matched} of {rows} rows in {elapsed:.2f}s "
+            "({throughput:.1f}/s): {missing} missing, {amount_mismatch} "
+            "amount mismatches, {not_successful} not successful, "
+            "{duplicate} duplicates, {not_in_report} not in report.".format(
+                throughput=reconciler.throughput, **reconciler.stats))
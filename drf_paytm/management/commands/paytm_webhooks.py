@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Delivers pending webhooks to Webhook Subscriptions, retrying "
+            "failed ones with backoff. Run as many as needed, side by side.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Number of concurrent requests.")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Number of deliveries read at once.")
+        parser.add_argument('--once', action='store_true',
+                            help="Stop once no delivery is due.")
+        parser.add_argument('--idle', type=float, default=1.0,
+                            help="Seconds to wait when no delivery is due.")
+
+    def handle(self, *args, **options):
+        from drf_paytm.webhooks import WebhookDeliverer
+
+        deliverer = WebhookDeliverer(workers=options['workers'],
+                                     batch_size=options['batch_size'])
+        try:
+            stats = deliverer.run(once=options['once'], idle=options['idle'])
+        except KeyboardInterrupt:
+            stats = deliverer.stats
+        finally:
+            deliverer.close()
+        self.stdout.write(
+            "Delivered {delivered} webhooks in {elapsed:.2f}s "
+            "({throughput:.1f}/s), {failed} failed, {dead} dead. Latency: "
+            "p50 {p50:.1f}ms, p90 {p90:.1f}ms, p99 {p99:.1f}ms.".format(
+                throughput=deliverer.throughput, **stats,
+                **deliverer.latency()))
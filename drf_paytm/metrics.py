@@ -0,0 +1,338 @@
+"""
+Instrumentation of payment hot paths.
+
+Timings (histograms, in seconds) and counters are sent to the sink set
+by METRICS_SINK setting, with keyword arguments from
+METRICS_SINK_OPTIONS:
+- drf_paytm.metrics.PrometheusSink: prometheus_client histograms and
+  counters, exposed by your /metrics view
+- drf_paytm.metrics.StatsDSink: StatsD over UDP, tags in DogStatsD format
+- drf_paytm.metrics.LoggingSink: one log record per measurement
+- drf_paytm.metrics.MemorySink: aggregates in memory, for tests and
+  benchmarks
+
+Without METRICS_SINK, timer() provides a shared no-op object and
+increment() returns at once, so instrumentation costs well under a
+microsecond per measurement (see benchmarks/bench_metrics.py).
+
+Metrics:
+- request.checksum: checksum generation of a Transaction Request
+- request.db_write: insert of a Transaction Request
+- response.callback: callbacks with a valid checksum, by status &
+  respcode, unknown values as 'other'
+- response.checksum_verify: checksum verification of a callback
+- response.db_lookup: lookups of a callback, by lookup
+- response.status_call: status verification of a callback
+- gateway.request: HTTP calls to Transaction Status API, by http_status
+- gateway.status: statuses reported by PayTM, by status, respcode & valid
+- gateway.circuit: circuit breaker of the gateway opened or closed, by state
+- gateway.status_cache: status lookups, by result (hit, miss, coalesced)
+- payment_page.render: rendering of checkout page
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from django.core.signals import setting_changed
+
+
+class BaseMetricsSink(object):
+    """
+    Base class for all metrics sinks.
+    """
+
+    def timing(self, name: str, seconds: float, tags: dict):
+        raise NotImplementedError
+
+    def increment(self, name: str, value: int, tags: dict):
+        raise NotImplementedError
+
+
+class LoggingSink(BaseMetricsSink):
+    """
+    Logs every measurement on `logger` at `level`.
+    """
+
+    def __init__(self, logger: str = 'drf_paytm.metrics',
+                 level: str = 'INFO'):
+        self.logger = logging.getLogger(logger)
+        self.level = logging.getLevelName(level)
+
+    def timing(self, name: str, seconds: float, tags: dict):
+        self.logger.log(self.level, "%s %.3fms %s", name, seconds * 1000,
+                        tags)
+
+    def increment(self, name: str, value: int, tags: dict):
+        self.logger.log(self.level, "%s +%d %s", name, value, tags)
+
+
+class StatsDSink(BaseMetricsSink):
+    """
+    Sends timings & counters to a StatsD server over UDP, tags in
+    DogStatsD format. Sending never raises.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8125,
+                 prefix: str = 'drf_paytm'):
+        import socket
+
+        self.address = (host, port)
+        self.prefix = prefix + '.' if prefix else ''
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, name: str, value: str, kind: str, tags: dict):
+        line = '%s%s:%s|%s' % (self.prefix, name, value, kind)
+        if tags:
+            line += '|#' + ','.join('%s:%s' % item for item in tags.items())
+        try:
+            self.socket.sendto(line.encode(), self.address)
+        except OSError:
+            pass
+
+    def timing(self, name: str, seconds: float, tags: dict):
+        self.send(name, '%.3f' % (seconds * 1000), 'ms', tags)
+
+    def increment(self, name: str, value: int, tags: dict):
+        self.send(name, str(value), 'c', tags)
+
+
+# Tags of every metric, labels of Prometheus metrics. Timings can also
+# be tagged with `error`.
+LABELS = {
+    'request.checksum': (),
+    'request.db_write': (),
+    'response.callback': ('status', 'respcode'),
+    'response.checksum_verify': ('valid', ),
+    'response.db_lookup': ('lookup', ),
+    'response.status_call': ('outcome', ),
+    'gateway.request': ('http_status', ),
+    'gateway.status': ('status', 'respcode', 'valid'),
+    'gateway.circuit': ('state', ),
+    'gateway.status_cache': ('result', ),
+    'payment_page.render': (),
+}
+
+
+class PrometheusSink(BaseMetricsSink):
+    """
+    Records timings in histograms & counters of prometheus_client,
+    created on first use with LABELS as labels, sorted tags of first
+    measurement for other names. Metric `gateway.request` is named
+    `drf_paytm_gateway_request_seconds`.
+
+    Parameters
+    ----------
+    registry: CollectorRegistry | default registry of prometheus_client
+    buckets: tuple | histogram buckets in seconds
+    prefix: str | prefix of metric names
+    """
+
+    BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5,
+               10)
+
+    def __init__(self, registry=None, buckets=BUCKETS, prefix='drf_paytm'):
+        import prometheus_client
+
+        self.client = prometheus_client
+        self.registry = registry or prometheus_client.REGISTRY
+        self.buckets = buckets
+        self.prefix = prefix
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def metric(self, name: str, tags: dict, timing: bool):
+        current = self.metrics.get(name)
+        if current is None:
+            with self._lock:
+                current = self.metrics.get(name)
+                if current is None:
+                    labels = LABELS.get(name)
+                    if labels is None:
+                        labels = tuple(sorted(tags))
+                    elif timing:
+                        labels += ('error', )
+                    full_name = '%s_%s' % (self.prefix,
+                                           name.replace('.', '_'))
+                    if timing:
+                        metric = self.client.Histogram(
+                            full_name + '_seconds', name, labels,
+                            registry=self.registry, buckets=self.buckets)
+                    else:
+                        metric = self.client.Counter(
+                            full_name, name, labels, registry=self.registry)
+                    current = self.metrics[name] = (metric, labels)
+        metric, labels = current
+        if not labels:
+            return metric
+        return metric.labels(*(str(tags.get(label, '')) for label in labels))
+
+    def timing(self, name: str, seconds: float, tags: dict):
+        self.metric(name, tags, timing=True).observe(seconds)
+
+    def increment(self, name: str, value: int, tags: dict):
+        self.metric(name, tags, timing=False).inc(value)
+
+
+class MemorySink(BaseMetricsSink):
+    """
+    Aggregates count, total & maximum of timings and counters in memory,
+    per name and tags.
+    """
+
+    def __init__(self):
+        self.timings = collections.defaultdict(
+            lambda: dict(count=0, total=0.0, max=0.0))
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(name: str, tags: dict):
+        return (name, ) + tuple(sorted(tags.items()))
+
+    def timing(self, name: str, seconds: float, tags: dict):
+        with self._lock:
+            timing = self.timings[self.key(name, tags)]
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+
+    def increment(self, name: str, value: int, tags: dict):
+        with self._lock:
+            self.counters[self.key(name, tags)] += value
+
+    def summary(self) -> dict:
+        """
+        Provides {name: {count, total, mean, max}} of timings, seconds,
+        across tags.
+        """
+        summary = {}
+        with self._lock:
+            for key, timing in self.timings.items():
+                current = summary.setdefault(key[0], dict(
+                    count=0, total=0.0, max=0.0))
+                current['count'] += timing['count']
+                current['total'] += timing['total']
+                current['max'] = max(current['max'], timing['max'])
+        for current in summary.values():
+            current['mean'] = current['total'] / current['count']
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+
+
+_sink = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def get_sink():
+    """
+    Provides sink set by METRICS_SINK, created once per process, None if
+    metrics are disabled.
+    """
+    global _sink, _loaded
+
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                from django.utils.module_loading import import_string
+
+                from .conf import paytm_settings
+
+                path = paytm_settings('METRICS_SINK')
+                _sink = path and import_string(path)(
+                    **paytm_settings('METRICS_SINK_OPTIONS'))
+                _loaded = True
+    return _sink
+
+
+def reset_sink(setting=None, **kwargs):
+    """
+    Drops the sink so that METRICS_SINK is read again, whenever settings
+    change in tests.
+    """
+    global _sink, _loaded
+
+    if setting in (None, 'PAYTM_SETTINGS'):
+        with _lock:
+            _sink, _loaded = None, False
+
+
+class Timer(object):
+    """
+    Context manager sending elapsed time on exit. Tags can be added
+    until then, with tag(). An exception adds tag `error`.
+    """
+
+    __slots__ = ('sink', 'name', 'tags', 'start')
+
+    def __init__(self, sink, name: str, tags: dict):
+        self.sink = sink
+        self.name = name
+        self.tags = tags
+
+    def tag(self, **tags):
+        self.tags.update(tags)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.tags['error'] = exc_type.__name__
+        self.sink.timing(self.name, time.perf_counter() - self.start,
+                         self.tags)
+
+
+class NullTimer(object):
+
+    __slots__ = ()
+
+    def tag(self, **tags):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def timer(name: str, **tags):
+    """
+    Times a block of code:
+
+        with metrics.timer('gateway.request') as t:
+            ...
+            t.tag(http_status=200)
+    """
+    sink = _sink if _loaded else get_sink()
+    if sink is None:
+        return NULL_TIMER
+    return Timer(sink, name, tags)
+
+
+def bounded(value, known) -> str:
+    """
+    Provides value as a tag if it is known, 'other' otherwise, so that
+    values sent by clients can not create series without bound.
+    """
+    return value if value in known else 'other'
+
+
+def increment(name: str, value: int = 1, **tags):
+    sink = _sink if _loaded else get_sink()
+    if sink is not None:
+        sink.increment(name, value, tags)
+
+
+setting_changed.connect(reset_sink)
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0002_auto_20190613_1613'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionresponse',
+            name='is_verified',
+            field=models.BooleanField(default=True, help_text='False until status is confirmed by PayTM Transaction Status API when verification is deferred.', verbose_name='Is Verified?'),
+        ),
+        migrations.AlterField(
+            model_name='transactionresponse',
+            name='checksum',
+            field=models.CharField(blank=True, max_length=108, null=True, verbose_name='Checksum Hash'),
+        ),
+    ]
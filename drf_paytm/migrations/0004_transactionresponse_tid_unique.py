@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0003_transactionresponse_is_verified'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactionresponse',
+            name='tid',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Transaction ID'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:51
+
+from django.db import migrations, models
+import drf_paytm.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0004_transactionresponse_tid_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paytmconfiguration',
+            name='mkey',
+            field=models.CharField(db_index=True, max_length=32, validators=[drf_paytm.utils.validate_key], verbose_name='Merchant Key'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionresponse',
+            index=models.Index(fields=['oid', 'status'], name='drf_paytm_response_oid_status'),
+        ),
+        migrations.AddConstraint(
+            model_name='paytmconfiguration',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('is_active',), name='drf_paytm_single_active_config'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0005_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionrequest',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Completed At'),
+        ),
+        migrations.AddField(
+            model_name='transactionrequest',
+            name='latest_response',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='drf_paytm.transactionresponse', verbose_name='Latest Transaction Response'),
+        ),
+        migrations.AddField(
+            model_name='transactionrequest',
+            name='payment_status',
+            field=models.CharField(blank=True, choices=[('TXN_SUCCESS', 'Success'), ('TXN_FAILURE', 'Failed'), ('PENDING', 'Pending')], editable=False, max_length=20, null=True, verbose_name='Payment Status'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0007_backfill_payment_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactionrequest',
+            index=models.Index(fields=['created_by', '-create_date', '-id'], name='drf_paytm_request_owner_date'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionrequest',
+            index=models.Index(fields=['created_by', 'payment_status'], name='drf_paytm_request_owner_status'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionrequest',
+            index=models.Index(fields=['created_by', 'amount'], name='drf_paytm_request_owner_amount'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionresponse',
+            index=models.Index(fields=['t_request', '-id'], name='drf_paytm_response_request_id'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionresponse',
+            index=models.Index(fields=['timestamp'], name='drf_paytm_response_timestamp'),
+        ),
+    ]
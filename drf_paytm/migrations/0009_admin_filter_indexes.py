@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0008_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactionrequest',
+            index=models.Index(fields=['create_date'], name='drf_paytm_request_create_date'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionrequest',
+            index=models.Index(fields=['payment_status', 'create_date'], name='drf_paytm_request_status_date'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionresponse',
+            index=models.Index(fields=['status', 'timestamp'], name='drf_paytm_response_status_time'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:07
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0009_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('payment.success', 'Payment Success'), ('payment.failure', 'Payment Failure')], max_length=20, verbose_name='Event Type')),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Payload')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('published_at', models.DateTimeField(blank=True, null=True, verbose_name='Published At')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Last Error')),
+                ('response', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='drf_paytm.transactionresponse', verbose_name='Transaction Response')),
+            ],
+            options={
+                'verbose_name': 'Payment Event',
+                'verbose_name_plural': 'Payment Events',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='paymentevent',
+            index=models.Index(fields=['published_at', 'id'], name='drf_paytm_event_pending'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentevent',
+            constraint=models.UniqueConstraint(fields=('response', 'event_type'), name='drf_paytm_event_once'),
+        ),
+    ]
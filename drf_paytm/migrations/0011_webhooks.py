@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import drf_paytm.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('drf_paytm', '0010_paymentevent_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookSubscription',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_date', models.DateTimeField(auto_now_add=True, verbose_name='Create Date/Time')),
+                ('update_date', models.DateTimeField(auto_now=True, verbose_name='Date/Time Modified')),
+                ('url', models.URLField(max_length=500, verbose_name='URL')),
+                ('secret', models.CharField(default=drf_paytm.utils.generate_webhook_secret, max_length=32, validators=[drf_paytm.utils.validate_key], verbose_name='Secret')),
+                ('event_types', models.CharField(blank=True, help_text='Comma separated event types to send, all if empty.', max_length=100, verbose_name='Event Types')),
+                ('max_concurrency', models.PositiveSmallIntegerField(default=4, verbose_name='Maximum Concurrent Deliveries')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is Active?')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Webhook Subscription',
+                'verbose_name_plural': 'Webhook Subscriptions',
+            },
+        ),
+        migrations.CreateModel(
+            name='WebhookDelivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('delivered', 'Delivered'), ('dead', 'Dead')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Next Attempt At')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Delivered At')),
+                ('response_code', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Response Code')),
+                ('latency', models.FloatField(blank=True, null=True, verbose_name='Latency (ms)')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Last Error')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='drf_paytm.paymentevent', verbose_name='Payment Event')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='drf_paytm.webhooksubscription', verbose_name='Subscription')),
+            ],
+            options={
+                'verbose_name': 'Webhook Delivery',
+                'verbose_name_plural': 'Webhook Deliveries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='webhookdelivery',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='drf_paytm_delivery_due'),
+        ),
+        migrations.AddConstraint(
+            model_name='webhookdelivery',
+            constraint=models.UniqueConstraint(fields=('subscription', 'event'), name='drf_paytm_delivery_once'),
+        ),
+    ]
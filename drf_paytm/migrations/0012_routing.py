@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0011_webhooks'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='paytmconfiguration',
+            name='drf_paytm_single_active_config',
+        ),
+        migrations.RemoveField(
+            model_name='transactionrequest',
+            name='mkey',
+        ),
+        migrations.AddField(
+            model_name='paytmconfiguration',
+            name='weight',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Share of requests routed to this configuration by weighted round robin.', verbose_name='Weight'),
+        ),
+    ]
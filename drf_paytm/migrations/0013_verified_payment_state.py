@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def refresh_payment_state(apps, schema_editor):
+    """
+    Recomputes payment state of every request from verified responses
+    only, as TransactionRequestQuerySet.refresh_payment_state() does.
+    """
+    from django.db.models import Case, Exists, OuterRef, Subquery, When
+    from django.db.models.functions import Coalesce, Now
+
+    TransactionRequest = apps.get_model('drf_paytm', 'TransactionRequest')
+    TransactionResponse = apps.get_model('drf_paytm', 'TransactionResponse')
+
+    responses = TransactionResponse.objects.filter(
+        oid=OuterRef('oid'), is_verified=True).order_by('-id')
+    succeeded = responses.filter(status='TXN_SUCCESS')
+    TransactionRequest.objects.update(
+        latest_response=Subquery(responses.values('id')[:1]),
+        payment_status=Subquery(responses.values('status')[:1]),
+        completed_at=Case(When(Exists(succeeded), then=Coalesce(
+            Subquery(succeeded.reverse().values('timestamp')[:1]),
+            Now()))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0012_routing'),
+    ]
+
+    operations = [
+        migrations.RunPython(refresh_payment_state,
+                             migrations.RunPython.noop),
+    ]
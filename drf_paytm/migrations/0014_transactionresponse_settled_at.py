@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0013_verified_payment_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionresponse',
+            name='settled_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Start of the last settlement reconciliation that found this response in the report.', null=True, verbose_name='Settled At'),
+        ),
+    ]
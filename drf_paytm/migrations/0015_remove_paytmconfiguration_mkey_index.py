@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:54
+
+from django.db import migrations, models
+import drf_paytm.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0014_transactionresponse_settled_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paytmconfiguration',
+            name='mkey',
+            field=models.CharField(max_length=32, validators=[drf_paytm.utils.validate_key], verbose_name='Merchant Key'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drf_paytm', '0015_remove_paytmconfiguration_mkey_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='webhookdelivery',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='deliveries', to='drf_paytm.paymentevent', verbose_name='Payment Event'),
+        ),
+    ]
@@ -3,10 +3,14 @@ Models for PayTM App:
 1. PayTM Configuration
 2. Transaction Request
 3. Transaction Response
+4. Payment Event
+5. Webhook Subscription
+6. Webhook Delivery
 
 Author: Himanshu Shankar (https://himanshus.com)
 """
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.text import gettext_lazy as _
 
@@ -15,9 +19,8 @@ from drfaddons.models import CreateUpdateModel
 
 class PayTMConfiguration(CreateUpdateModel):
     """
-    Contains PayTM Configurations. Only one object can have is_active
-    set to True that will be used by the system by default.
-    Currently to provision for multiple configuration at the runtime.
+    Contains PayTM Configurations. New Transaction Requests are routed
+    across configurations having is_active set to True, see routing.py.
 
     Author: Himanshu Shankar (https://himanshus.com)
     """
@@ -30,6 +33,10 @@ class PayTMConfiguration(CreateUpdateModel):
                             validators=[validate_key])
     is_active = models.BooleanField(verbose_name=_("Is Active?"),
                                     default=False)
+    weight = models.PositiveSmallIntegerField(
+        verbose_name=_("Weight"), default=1,
+        help_text=_("Share of requests routed to this configuration by "
+                    "weighted round robin."))
     gateway_url = models.URLField(verbose_name=_("Payment Gateway URL"),
                                   default="https://securegw-stage.paytm.in/the"
                                           "ia/processTransaction")
@@ -44,48 +51,53 @@ class PayTMConfiguration(CreateUpdateModel):
     def __str__(self):
         return self.mid
 
-    def clean_fields(self, exclude=None):
+    class Meta:
+        verbose_name = _("PayTM Configuration")
+        verbose_name_plural = _("PayTM Configurations")
+
+
+class TransactionRequestQuerySet(models.QuerySet):
+    """
+    QuerySet for Transaction Request that provides payment summary of
+    every request without firing queries per row.
+    """
+
+    def with_payment_summary(self):
         """
-        Used to validate the value of is_active
-        Parameters
-        ----------
-        exclude: list of fields that is to be excluded while checking
+        Joins created_by, read by cid. Payment summary is stored on
+        every request and needs no join.
 
         Returns
         -------
-        None
+        TransactionRequestQuerySet
+        """
+        return self.select_related('created_by')
 
-        Raises
-        ------
-        ValidationError: for is_active field.
+    def refresh_payment_state(self) -> int:
+        """
+        Recomputes payment_status, latest_response & completed_at of
+        every request from its verified Transaction Responses in one
+        query. Used for responses that are written in bulk, bypassing
+        signals.
 
-        Author: Himanshu Shankar (https://himanshus.com)
+        Returns
+        -------
+        int: number of requests updated
         """
+        from django.db.models import Case, Exists, OuterRef, Subquery, When
+        from django.db.models.functions import Coalesce, Now
 
-        from django.core.exceptions import ValidationError
-
-        if 'is_active' not in exclude:
-            try:
-                pc = PayTMConfiguration.objects.get(is_active=True)
-            except PayTMConfiguration.DoesNotExist:
-                pass
-            except PayTMConfiguration.MultipleObjectsReturned:
-                raise ValidationError({'is_active':
-                                           _("Multiple configuration is "
-                                             "active. Keep only 1 "
-                                             "configuration active at a "
-                                             "time.")})
-            else:
-                if pc.mid is not self.mid:
-                    raise ValidationError({'is_active': _("Another "
-                                                          "configuration is "
-                                                          "active. Deactivate "
-                                                          "it first.")})
-        super(PayTMConfiguration, self).clean_fields(exclude=exclude)
+        from .variables import SUCCESS
 
-    class Meta:
-        verbose_name = _("PayTM Configuration")
-        verbose_name_plural = _("PayTM Configurations")
+        responses = TransactionResponse.objects.filter(
+            oid=OuterRef('oid'), is_verified=True).order_by('-id')
+        succeeded = responses.filter(status=SUCCESS)
+        return self.update(
+            latest_response=Subquery(responses.values('id')[:1]),
+            payment_status=Subquery(responses.values('status')[:1]),
+            completed_at=Case(When(Exists(succeeded), then=Coalesce(
+                Subquery(succeeded.reverse().values('timestamp')[:1]),
+                Now()))))
 
 
 class TransactionRequest(CreateUpdateModel):
@@ -94,8 +106,9 @@ class TransactionRequest(CreateUpdateModel):
 
     Author: Himanshu Shankar (https://himanshus.com)
     """
-    from .utils import validate_key, validate_order_id
+    from .utils import validate_order_id
     from .variables import CHANNEL_CHOICES, MODE_CHOICES, AUTH_MODE_CHOICES
+    from .variables import STATUS_CHOICES
 
     mid = models.CharField(verbose_name=_("Merchant ID"), max_length=20)
     itid = models.CharField(verbose_name=_("Industry Type ID"), max_length=20,
@@ -137,21 +150,35 @@ class TransactionRequest(CreateUpdateModel):
                                  blank=True, max_length=5,
                                  help_text=_("Required If PAYMENT_MODE_ONLY "
                                              "= Yes PAYMENT_TYPE_ID = NB "))
-    mkey = models.CharField(verbose_name=_("Merchant Key"),
-                            validators=[validate_key], max_length=32)
+
+    # Maintained by signals.handlers.payment_state_handler
+    payment_status = models.CharField(verbose_name=_("Payment Status"),
+                                      max_length=20, choices=STATUS_CHOICES,
+                                      null=True, blank=True, editable=False)
+    completed_at = models.DateTimeField(verbose_name=_("Completed At"),
+                                        null=True, blank=True,
+                                        editable=False)
+    latest_response = models.ForeignKey(
+        to='TransactionResponse', on_delete=models.SET_NULL, null=True,
+        blank=True, editable=False, related_name='+',
+        verbose_name=_("Latest Transaction Response"))
+
+    objects = TransactionRequestQuerySet.as_manager()
 
     @property
     def paytm_callback_url(self):
         from django.urls import reverse
 
-        return (PayTMConfiguration.objects.get(mkey=self.mkey).base_url +
-                reverse('drf_paytm:list-add-transaction-response'))
+        from .conf import paytm_settings
+        from .registry import registry
+
+        return (registry.get_by_mid(self.mid).base_url +
+                reverse(paytm_settings('CALLBACK_URL_NAME')))
 
     @property
     def last_payment_status(self):
-        lp = TransactionResponse.objects.filter(oid=self.oid).last()
-        if lp:
-            return lp.get_status_display()
+        if self.payment_status:
+            return self.get_payment_status_display()
         return 'No Payment Transaction'
 
     @property
@@ -172,22 +199,19 @@ class TransactionRequest(CreateUpdateModel):
         transaction has been made successfully by the end user.
         Returns
         -------
-        bool: True if any of TransactionResponse with same OrderID(oid)
-        has status set to TXN_SUCCESS, False otherwise.
+        bool: True if any of verified TransactionResponse with same
+        OrderID(oid) has status set to TXN_SUCCESS, False otherwise.
 
         Author: Himanshu Shankar (https://himanshus.com)
         """
-        from .variables import SUCCESS
-
-        if TransactionResponse.objects.filter(oid=self.oid,
-                                              status=SUCCESS).count() > 0:
-            return True
-        return False
+        return self.completed_at is not None
     completed.short_description = _("Is Completed?")
     is_completed = property(completed)
 
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
+        from . import metrics
+        from .registry import registry
         from .utils import generate_checksum
 
         self.callback_url = self.callback_url + "?OID=" + str(self.oid)
@@ -218,14 +242,16 @@ class TransactionRequest(CreateUpdateModel):
                 parameters['BANK_CODE'] = str(self.bank_code)
 
         # Generate checksum
-        self.checksum = generate_checksum(param_dict=parameters,
-                                          merchant_key=self.mkey)
+        with metrics.timer('request.checksum'):
+            self.checksum = generate_checksum(
+                param_dict=parameters, merchant_key=registry.get_key(self.mid))
 
         # Call super to save object
-        super(TransactionRequest, self).save(force_insert=force_insert,
-                                             force_update=force_update,
-                                             using=using,
-                                             update_fields=update_fields)
+        with metrics.timer('request.db_write'):
+            super(TransactionRequest, self).save(force_insert=force_insert,
+                                                 force_update=force_update,
+                                                 using=using,
+                                                 update_fields=update_fields)
 
     def __str__(self):
         return self.oid
@@ -233,6 +259,20 @@ class TransactionRequest(CreateUpdateModel):
     class Meta:
         verbose_name = _("Transaction Request")
         verbose_name_plural = _("Transaction Requests")
+        indexes = [
+            # Cursor pagination & filters of owner's requests
+            models.Index(fields=['created_by', '-create_date', '-id'],
+                         name='drf_paytm_request_owner_date'),
+            models.Index(fields=['created_by', 'payment_status'],
+                         name='drf_paytm_request_owner_status'),
+            models.Index(fields=['created_by', 'amount'],
+                         name='drf_paytm_request_owner_amount'),
+            # Filters of Django Admin
+            models.Index(fields=['create_date'],
+                         name='drf_paytm_request_create_date'),
+            models.Index(fields=['payment_status', 'create_date'],
+                         name='drf_paytm_request_status_date'),
+        ]
 
 
 class TransactionResponse(models.Model):
@@ -246,7 +286,7 @@ class TransactionResponse(models.Model):
 
     mid = models.CharField(verbose_name=_("Merchant ID"), max_length=20)
     tid = models.CharField(verbose_name=_("Transaction ID"), max_length=64,
-                           null=True, blank=True)
+                           null=True, blank=True, unique=True)
     cid = models.CharField(verbose_name=_("Customer ID"), max_length=64,
                            null=True, blank=True)
     oid = models.CharField(verbose_name=_("Order ID"), max_length=50)
@@ -278,10 +318,18 @@ class TransactionResponse(models.Model):
     card_last_num = models.CharField(verbose_name=_("Last 4 digit of Card"),
                                      max_length=4, null=True, blank=True)
     raw_response = models.TextField(verbose_name=_("Raw Response"))
+    is_verified = models.BooleanField(
+        verbose_name=_("Is Verified?"), default=True,
+        help_text=_("False until status is confirmed by PayTM Transaction "
+                    "Status API when verification is deferred."))
     t_request = models.ForeignKey(to=TransactionRequest,
                                   on_delete=models.PROTECT,
                                   verbose_name=_("Transaction Request"),
                                   null=True, blank=True)
+    settled_at = models.DateTimeField(
+        verbose_name=_("Settled At"), null=True, blank=True, editable=False,
+        help_text=_("Start of the last settlement reconciliation that "
+                    "found this response in the report."))
 
     def __str__(self):
         return self.oid
@@ -289,3 +337,148 @@ class TransactionResponse(models.Model):
     class Meta:
         verbose_name = _("Transaction Response")
         verbose_name_plural = _("Transaction Responses")
+        indexes = [
+            # is_completed & last_payment_status of every request
+            models.Index(fields=['oid', 'status'],
+                         name='drf_paytm_response_oid_status'),
+            # Cursor pagination & filters of owner's responses
+            models.Index(fields=['t_request', '-id'],
+                         name='drf_paytm_response_request_id'),
+            models.Index(fields=['timestamp'],
+                         name='drf_paytm_response_timestamp'),
+            # Status filter of Django Admin
+            models.Index(fields=['status', 'timestamp'],
+                         name='drf_paytm_response_status_time'),
+        ]
+
+
+class PaymentEvent(models.Model):
+    """
+    Outbox of payment events for other services. An event is written in
+    the transaction that saves its Transaction Response and published by
+    paytm_outbox_relay command once that transaction has committed.
+    """
+    from .variables import EVENT_CHOICES
+
+    event_type = models.CharField(verbose_name=_("Event Type"),
+                                  max_length=20, choices=EVENT_CHOICES)
+    response = models.ForeignKey(to=TransactionResponse,
+                                 on_delete=models.CASCADE,
+                                 verbose_name=_("Transaction Response"),
+                                 related_name='events')
+    payload = models.JSONField(verbose_name=_("Payload"),
+                               encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(verbose_name=_("Created At"),
+                                      auto_now_add=True)
+    published_at = models.DateTimeField(verbose_name=_("Published At"),
+                                        null=True, blank=True)
+    attempts = models.PositiveIntegerField(verbose_name=_("Attempts"),
+                                           default=0)
+    last_error = models.TextField(verbose_name=_("Last Error"), blank=True,
+                                  default='')
+
+    def message(self) -> dict:
+        """
+        Provides event as it is published to sinks.
+        """
+        return {'id': self.pk, 'type': self.event_type,
+                'created_at': self.created_at, 'data': self.payload}
+
+    def __str__(self):
+        return '%s %s' % (self.event_type, self.payload.get('oid'))
+
+    class Meta:
+        verbose_name = _("Payment Event")
+        verbose_name_plural = _("Payment Events")
+        constraints = [
+            models.UniqueConstraint(fields=['response', 'event_type'],
+                                    name='drf_paytm_event_once'),
+        ]
+        indexes = [
+            # Relays read unpublished events in order of ID
+            models.Index(fields=['published_at', 'id'],
+                         name='drf_paytm_event_pending'),
+        ]
+
+
+class WebhookSubscription(CreateUpdateModel):
+    """
+    Endpoint of a downstream app that receives payment events. Every
+    event is posted as JSON, signed with `secret` by PayTM checksum
+    algorithm.
+    """
+    from .utils import generate_webhook_secret, validate_key
+
+    url = models.URLField(verbose_name=_("URL"), max_length=500)
+    secret = models.CharField(verbose_name=_("Secret"), max_length=32,
+                              validators=[validate_key],
+                              default=generate_webhook_secret)
+    event_types = models.CharField(
+        verbose_name=_("Event Types"), max_length=100, blank=True,
+        help_text=_("Comma separated event types to send, all if empty."))
+    max_concurrency = models.PositiveSmallIntegerField(
+        verbose_name=_("Maximum Concurrent Deliveries"), default=4)
+    is_active = models.BooleanField(verbose_name=_("Is Active?"),
+                                    default=True)
+
+    def accepts(self, event_type: str) -> bool:
+        return not self.event_types or event_type in [
+            kind.strip() for kind in self.event_types.split(',')]
+
+    def __str__(self):
+        return self.url
+
+    class Meta:
+        verbose_name = _("Webhook Subscription")
+        verbose_name_plural = _("Webhook Subscriptions")
+
+
+class WebhookDelivery(models.Model):
+    """
+    Delivery of a payment event to a Webhook Subscription. Failed
+    deliveries are retried with exponential backoff until they are dead.
+    """
+    from django.utils import timezone
+
+    from .variables import DELIVERY_PENDING, DELIVERY_STATUS_CHOICES
+
+    subscription = models.ForeignKey(to=WebhookSubscription,
+                                     on_delete=models.CASCADE,
+                                     verbose_name=_("Subscription"),
+                                     related_name='deliveries')
+    event = models.ForeignKey(to=PaymentEvent, on_delete=models.PROTECT,
+                              verbose_name=_("Payment Event"),
+                              related_name='deliveries')
+    status = models.CharField(verbose_name=_("Status"), max_length=10,
+                              choices=DELIVERY_STATUS_CHOICES,
+                              default=DELIVERY_PENDING)
+    attempts = models.PositiveIntegerField(verbose_name=_("Attempts"),
+                                           default=0)
+    next_attempt_at = models.DateTimeField(verbose_name=_("Next Attempt At"),
+                                           default=timezone.now)
+    created_at = models.DateTimeField(verbose_name=_("Created At"),
+                                      auto_now_add=True)
+    delivered_at = models.DateTimeField(verbose_name=_("Delivered At"),
+                                        null=True, blank=True)
+    response_code = models.PositiveSmallIntegerField(
+        verbose_name=_("Response Code"), null=True, blank=True)
+    latency = models.FloatField(verbose_name=_("Latency (ms)"), null=True,
+                                blank=True)
+    last_error = models.TextField(verbose_name=_("Last Error"), blank=True,
+                                  default='')
+
+    def __str__(self):
+        return '%s %s' % (self.event_id, self.subscription_id)
+
+    class Meta:
+        verbose_name = _("Webhook Delivery")
+        verbose_name_plural = _("Webhook Deliveries")
+        constraints = [
+            models.UniqueConstraint(fields=['subscription', 'event'],
+                                    name='drf_paytm_delivery_once'),
+        ]
+        indexes = [
+            # Deliverers read pending deliveries that are due
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='drf_paytm_delivery_due'),
+        ]
@@ -0,0 +1,194 @@
+"""
+Transactional outbox of payment events.
+
+With OUTBOX_ENABLED, a PaymentEvent is written in the same transaction
+as every verified successful or failed Transaction Response, so an event
+exists if and only if the response was committed. Relays, run by
+paytm_outbox_relay command, drain the outbox in batches: every batch is
+locked with SELECT ... FOR UPDATE SKIP LOCKED, published to the sink and
+marked as published in one transaction. Hence any number of relays can
+run side by side, each taking different events. Events are published in
+order of ID by each relay, not across relays.
+"""
+
+import logging
+import time
+
+from .conf import paytm_settings
+
+logger = logging.getLogger(__name__)
+
+
+def event_type(response):
+    """
+    Provides type of event a Transaction Response publishes, None if it
+    publishes none.
+    """
+    from .variables import FAILED, PAYMENT_FAILURE, PAYMENT_SUCCESS, SUCCESS
+
+    if not response.is_verified:
+        return None
+    return {SUCCESS: PAYMENT_SUCCESS,
+            FAILED: PAYMENT_FAILURE}.get(response.status)
+
+
+def event_payload(response) -> dict:
+    return {'response_id': response.pk, 't_request_id': response.t_request_id,
+            'mid': response.mid, 'oid': response.oid, 'tid': response.tid,
+            'amount': response.amount, 'currency': response.currency,
+            'status': response.status, 'mode': response.mode,
+            'timestamp': response.timestamp}
+
+
+def record(responses, using: str = None) -> int:
+    """
+    Writes events of Transaction Responses to the outbox, in current
+    transaction. An event is written once per response & type.
+
+    Parameters
+    ----------
+    responses: iterable of saved TransactionResponse
+    using: str | database alias
+
+    Returns
+    -------
+    int: number of events provided to database
+    """
+    from .models import PaymentEvent
+
+    if not paytm_settings('OUTBOX_ENABLED'):
+        return 0
+    events = [PaymentEvent(event_type=kind, response=response,
+                           payload=event_payload(response))
+              for response, kind in ((response, event_type(response))
+                                     for response in responses) if kind]
+    PaymentEvent.objects.using(using).bulk_create(events,
+                                                  ignore_conflicts=True)
+    return len(events)
+
+
+class Relay(object):
+    """
+    Publishes unpublished events to a sink in batches.
+
+    Parameters
+    ----------
+    sink: BaseSink | OUTBOX_SINK if not provided
+    batch_size: int | events published at once
+    max_attempts: int | failed events are skipped after these attempts
+    """
+
+    def __init__(self, sink=None, batch_size: int = None,
+                 max_attempts: int = None):
+        from .sinks import get_sink
+
+        self.sink = sink or get_sink()
+        self.batch_size = batch_size or paytm_settings('OUTBOX_BATCH_SIZE')
+        self.max_attempts = (max_attempts
+                             or paytm_settings('OUTBOX_MAX_ATTEMPTS'))
+        self.stats = dict(batches=0, published=0, failed=0, elapsed=0.0)
+
+    @property
+    def throughput(self) -> float:
+        if not self.stats['elapsed']:
+            return 0.0
+        return self.stats['published'] / self.stats['elapsed']
+
+    def relay_batch(self) -> int:
+        """
+        Publishes next batch of events not locked by another relay.
+
+        Returns
+        -------
+        int: number of events in batch, 0 if there are none left
+        """
+        from django.db import transaction
+        from django.db.models import F
+        from django.utils import timezone
+
+        from .models import PaymentEvent
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            events = list(PaymentEvent.objects.select_for_update(
+                skip_locked=True).filter(
+                published_at__isnull=True,
+                attempts__lt=self.max_attempts).order_by('id')[
+                :self.batch_size])
+            if not events:
+                return 0
+            pks = [event.pk for event in events]
+            try:
+                self.sink.publish([event.message() for event in events])
+            except Exception as e:
+                logger.exception("Could not publish %d payment events.",
+                                 len(events))
+                PaymentEvent.objects.filter(pk__in=pks).update(
+                    attempts=F('attempts') + 1, last_error=str(e)[:1000])
+                self.stats['failed'] += len(events)
+            else:
+                PaymentEvent.objects.filter(pk__in=pks).update(
+                    published_at=timezone.now(),
+                    attempts=F('attempts') + 1)
+                self.stats['published'] += len(events)
+        self.stats['batches'] += 1
+        self.stats['elapsed'] += time.perf_counter() - start
+        return len(events)
+
+    def run(self, once: bool = False, idle: float = 1.0, limit: int = None):
+        """
+        Relays events until outbox is drained if `once`, forever
+        otherwise, sleeping `idle` seconds whenever it is empty.
+
+        Parameters
+        ----------
+        once: bool | stop once no event is left
+        idle: float | seconds to wait for new events
+        limit: int | stop after these many polls of the outbox
+
+        Returns
+        -------
+        dict: stats
+        """
+        polls = 0
+        while limit is None or polls < limit:
+            failed = self.stats['failed']
+            if not self.relay_batch():
+                if once:
+                    break
+                time.sleep(idle)
+            elif self.stats['failed'] > failed:
+                # Give sink time to recover
+                time.sleep(idle)
+            polls += 1
+        return self.stats
+
+    def close(self):
+        self.sink.close()
+
+
+def purge(days: int) -> int:
+    """
+    Deletes events published more than `days` days ago, with their
+    webhook deliveries. Events having a pending or dead delivery are
+    kept, so that no webhook is lost unnoticed.
+
+    Returns
+    -------
+    int: number of events deleted
+    """
+    from datetime import timedelta
+
+    from django.db import transaction
+    from django.utils import timezone
+
+    from .models import PaymentEvent, WebhookDelivery
+    from .variables import DELIVERY_DEAD, DELIVERY_PENDING
+
+    events = PaymentEvent.objects.filter(
+        published_at__lt=timezone.now() - timedelta(days=days)).exclude(
+        deliveries__status__in=(DELIVERY_PENDING, DELIVERY_DEAD))
+    with transaction.atomic():
+        # Deliveries protect their events
+        WebhookDelivery.objects.filter(event__in=events).delete()
+        return events.delete()[0]
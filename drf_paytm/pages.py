@@ -0,0 +1,96 @@
+"""
+Auto-submitting checkout page that posts a Transaction Request to PayTM.
+"""
+
+import functools
+
+from html import escape
+
+HEAD = """<html>
+    <h1>%s<br><br>
+        Merchant Check Out Page<br><br>
+        Please Do Not Refresh The Page
+    </h1></br>
+    <form method="post" action="%s" name="f1">
+        <table border="1">
+        <tbody> """
+
+INPUT = """
+        <input type="hidden" name="%s" value="%s">"""
+
+TAIL = """
+        </tbody>
+        </table>
+        <script type="text/javascript">
+            document.f1.submit();
+        </script>
+    </form>
+</html>"""
+
+
+class PaymentPageRenderer(object):
+    """
+    Renders checkout page of one PayTM Configuration. Head and tail of
+    the page are escaped and encoded once, only the hidden inputs are
+    built per request. Every value is HTML escaped.
+    """
+
+    def __init__(self, company_name: str, gateway_url: str):
+        self.head = (HEAD % (escape(company_name),
+                             escape(gateway_url))).encode()
+        self.tail = TAIL.encode()
+
+    @staticmethod
+    def inputs(param_dict: dict):
+        for key, value in param_dict.items():
+            yield (INPUT % (escape(str(key)), escape(str(value)))).encode()
+
+    def chunks(self, param_dict: dict):
+        """
+        Yields page in chunks, to be used with StreamingHttpResponse.
+        """
+        yield self.head
+        yield from self.inputs(param_dict)
+        yield self.tail
+
+    def render(self, param_dict: dict) -> bytes:
+        """
+        Provides whole page, joined once.
+        """
+        from . import metrics
+
+        with metrics.timer('payment_page.render'):
+            return b''.join(self.chunks(param_dict))
+
+    def response(self, param_dict: dict, stream: bool = False,
+                 status: int = 200):
+        """
+        Provides page as HttpResponse, or StreamingHttpResponse if
+        stream is True, that is never stored by caches.
+        """
+        from django.http import HttpResponse, StreamingHttpResponse
+
+        if stream:
+            response = StreamingHttpResponse(self.chunks(param_dict),
+                                             status=status)
+        else:
+            response = HttpResponse(self.render(param_dict), status=status)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+@functools.lru_cache(maxsize=32)
+def get_renderer(company_name: str, gateway_url: str) -> PaymentPageRenderer:
+    """
+    Provides renderer of a company name & gateway URL, compiled once per
+    process. As cache key is made of both values, a renderer is never
+    served for a configuration that has changed.
+    """
+    return PaymentPageRenderer(company_name, gateway_url)
+
+
+def renderer_for(config) -> PaymentPageRenderer:
+    """
+    Provides renderer of a PayTM Configuration.
+    """
+    return get_renderer(config.company_name, config.gateway_url)
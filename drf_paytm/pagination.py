@@ -0,0 +1,79 @@
+"""
+Keyset (cursor) pagination of listing endpoints. Every page is fetched
+with a single indexed range query, however deep the history is.
+Also provides an estimated count paginator for Django Admin.
+"""
+
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from rest_framework.pagination import CursorPagination
+
+
+class PayTMCursorPagination(CursorPagination):
+    """
+    Cursor pagination with page size read from PAYTM_SETTINGS. Page size
+    can be lowered or raised up to MAX_PAGE_SIZE via `page_size` query
+    parameter.
+    """
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        from .conf import paytm_settings
+
+        self.page_size = paytm_settings('PAGE_SIZE')
+        self.max_page_size = paytm_settings('MAX_PAGE_SIZE')
+
+
+class TransactionRequestPagination(PayTMCursorPagination):
+    # id breaks ties of requests created at same time
+    ordering = ('-create_date', '-id')
+
+
+class TransactionResponsePagination(PayTMCursorPagination):
+    ordering = ('-id', )
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads number of rows of an unfiltered queryset from
+    table statistics of PostgreSQL or MySQL instead of COUNT(*), which
+    scans the whole table. Exact count is used for filtered querysets,
+    for other databases and for tables smaller than `threshold` rows.
+    """
+    threshold = 100000
+
+    def estimate(self):
+        """
+        Provides estimated number of rows of queryset's table, None if
+        it can not be estimated.
+        """
+        from django.db import connections
+
+        queryset = self.object_list
+        if not hasattr(queryset, 'query') or queryset.query.where:
+            return None
+
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        if connection.vendor == 'postgresql':
+            # By OID of the table on search_path, as tables of other
+            # schemas may share its name
+            sql = "SELECT reltuples FROM pg_class WHERE oid = %s::regclass"
+            table = connection.ops.quote_name(table)
+        elif connection.vendor == 'mysql':
+            sql = ("SELECT table_rows FROM information_schema.tables "
+                   "WHERE table_schema = DATABASE() AND table_name = %s")
+        else:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate()
+        if estimate is not None and estimate >= self.threshold:
+            return estimate
+        return super(EstimatedCountPaginator, self).count
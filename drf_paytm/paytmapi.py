@@ -4,38 +4,383 @@ Functions related to PayTM API
 Author: Himanshu Shankar (https://himanshus.com)
 """
 
+import random
+import threading
+import time
+import weakref
 
-def validate_transaction_status(orderid: str, status: str, txnid: str):
+from .conf import paytm_settings
+
+
+class StatusAPIError(Exception):
     """
-    Gets transaction status and provides a True/False output
+    Raised when PayTM Transaction Status API could not be reached or
+    did not respond successfully even after retrying.
+    """
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Provides delay before next retry using exponential backoff with
+    full jitter.
 
     Parameters
     ----------
-    orderid: str | OrderID
+    attempt: int | number of attempts already made, starting from 0
+    base: float | delay of first retry in seconds
+    cap: float | maximum delay in seconds
 
     Returns
     -------
-    bool
+    float: seconds to sleep
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def status_payload(config, orderid: str) -> dict:
     """
-    import requests
+    Prepares data to be posted on PayTM Transaction Status API.
 
-    from .models import PayTMConfiguration
+    Parameters
+    ----------
+    config: PayTMConfiguration
+    orderid: str | OrderID
+
+    Returns
+    -------
+    dict
+    """
     from .utils import generate_checksum
 
-    try:
-        pc: PayTMConfiguration = PayTMConfiguration.objects.get(is_active=True)
-    except PayTMConfiguration.DoesNotExists:
-        raise NotImplementedError("PayTM Configuration not found.")
-    else:
-        data = {'ORDERID': orderid, 'MID': pc.mid}
-        data['CHECKSUMHASH'] = generate_checksum(param_dict=data,
-                                                 merchant_key=pc.mkey)
+    data = {'ORDERID': orderid, 'MID': config.mid}
+    data['CHECKSUMHASH'] = generate_checksum(param_dict=data,
+                                             merchant_key=config.mkey)
+    return data
+
+
+def is_status_valid(result: dict, status: str, txnid: str) -> bool:
+    """
+    Checks status & transaction ID reported by PayTM Transaction Status
+    API against the ones received in callback.
+    """
+    from . import metrics
+
+    valid = result.get("STATUS") == status and result.get("TXNID") == txnid
+    metrics.increment('gateway.status', status=result.get("STATUS"),
+                      respcode=result.get("RESPCODE"), valid=valid)
+    return valid
+
+
+class StatusClient(object):
+    """
+    Client for PayTM Transaction Status API.
+    Keeps a pooled keep-alive session, applies connect & read timeouts
+    and retries failed calls with jittered exponential backoff. Calls
+    fail fast while circuit breaker of the gateway is open, if `breaker`
+    is set (see breaker.py). Statuses are cached briefly and concurrent
+    lookups of an order share one call, if `cache` is set (see
+    statuscache.py).
+    Arguments not provided are read from PAYTM_SETTINGS.
+    """
+
+    def __init__(self, connect_timeout: float = None,
+                 read_timeout: float = None, retries: int = None,
+                 backoff: float = None, backoff_max: float = None,
+                 pool_size: int = None, breaker: bool = None,
+                 cache: bool = None):
+        def setting(value, name):
+            return paytm_settings(name) if value is None else value
+
+        self.connect_timeout = setting(connect_timeout,
+                                       'STATUS_CONNECT_TIMEOUT')
+        self.read_timeout = setting(read_timeout, 'STATUS_READ_TIMEOUT')
+        self.retries = setting(retries, 'STATUS_RETRIES')
+        self.backoff = setting(backoff, 'STATUS_BACKOFF')
+        self.backoff_max = setting(backoff_max, 'STATUS_BACKOFF_MAX')
+        self.pool_size = setting(pool_size, 'STATUS_POOL_SIZE')
+        self.breaker = setting(breaker, 'STATUS_BREAKER_ENABLED')
+        self.cache = None
+        if setting(cache, 'STATUS_CACHE_ENABLED'):
+            from .statuscache import StatusCache
+
+            self.cache = StatusCache()
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size,
+                                          pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def breaker_for(self, url: str):
+        """
+        Provides CircuitBreaker of the gateway, None if disabled.
+        """
+        if not self.breaker:
+            return None
+
+        from .breaker import get_breaker
+
+        return get_breaker(url)
+
+    def fetch(self, url: str, payload: dict) -> dict:
+        """
+        Posts payload on PayTM Transaction Status API.
+
+        Parameters
+        ----------
+        url: str | status_url of PayTMConfiguration
+        payload: dict | data including CHECKSUMHASH
+
+        Returns
+        -------
+        dict: parsed JSON response
+
+        Raises
+        ------
+        StatusAPIError: if no successful response could be received.
+        CircuitOpen: subclass of StatusAPIError, if circuit is open.
+        """
+        import requests
+
+        from . import metrics
+
+        breaker = self.breaker_for(url)
+        probe = breaker.before() if breaker else False
+        # Gateway is up if it answered, even with a client error
+        error, reached = None, False
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(backoff_delay(attempt - 1, self.backoff,
+                                             self.backoff_max))
+                with metrics.timer('gateway.request') as timer:
+                    try:
+                        response = self.session.post(
+                            url=url, json=payload,
+                            timeout=(self.connect_timeout, self.read_timeout))
+                    except requests.RequestException as e:
+                        timer.tag(http_status='error', error=type(e).__name__)
+                        error = e
+                        continue
+                    timer.tag(http_status=response.status_code)
+
+                reached = response.status_code < 500
+                if 199 < response.status_code < 300:
+                    try:
+                        return response.json()
+                    except ValueError as e:
+                        raise StatusAPIError("Invalid response from PayTM: "
+                                             "%s" % e)
+                error = "HTTP %d" % response.status_code
+                if reached:
+                    break
+            raise StatusAPIError("PayTM Status API failed: %s" % error)
+        finally:
+            if breaker:
+                breaker.record(reached, probe)
+
+    def get_status(self, config, orderid: str) -> dict:
+        """
+        Gets transaction status of provided order from PayTM.
+
+        Parameters
+        ----------
+        config: PayTMConfiguration
+        orderid: str | OrderID
 
-        response = requests.post(url=pc.status_url, json=data)
+        Returns
+        -------
+        dict: response of PayTM Transaction Status API
+        """
+        if self.cache is None:
+            return self.fetch(config.status_url,
+                              status_payload(config, orderid))
+        return self.cache.get_or_fetch(config.mid, orderid, lambda: self.fetch(
+            config.status_url, status_payload(config, orderid)))
 
-        if 199 < response.status_code < 300:
-            if (response.json().get("STATUS") == status
-                    and response.json().get("TXNID") == txnid):
-                return True
+    def outdated(self, result: dict, status: str) -> bool:
+        """
+        Checks if a cached non terminal status, such as PENDING, may be
+        outdated by the callback being verified.
+        """
+        from .variables import FAILED, SUCCESS
 
+        return (self.cache is not None and result.get('STATUS') != status
+                and result.get('STATUS') not in (SUCCESS, FAILED))
+
+    def verify(self, config, orderid: str, status: str, txnid: str) -> bool:
+        """
+        Checks that PayTM reports provided status & transaction ID for
+        the order, asking PayTM again if cached status is outdated.
+        """
+        result = self.get_status(config, orderid)
+        if self.outdated(result, status):
+            self.cache.invalidate(config.mid, orderid)
+            result = self.get_status(config, orderid)
+        return is_status_valid(result, status, txnid)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class AsyncStatusClient(StatusClient):
+    """
+    Asynchronous variant of StatusClient for ASGI deployments.
+    Requires httpx to be installed.
+    """
+
+    @property
+    def session(self):
+        if self._session is None:
+            import httpx
+
+            self._session = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout,
+                                      connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size))
+        return self._session
+
+    async def fetch(self, url: str, payload: dict) -> dict:
+        import asyncio
+
+        import httpx
+
+        from . import metrics
+
+        breaker = self.breaker_for(url)
+        probe = breaker.before() if breaker else False
+        error, reached = None, False
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    await asyncio.sleep(backoff_delay(
+                        attempt - 1, self.backoff, self.backoff_max))
+                with metrics.timer('gateway.request') as timer:
+                    try:
+                        response = await self.session.post(url, json=payload)
+                    except httpx.HTTPError as e:
+                        timer.tag(http_status='error', error=type(e).__name__)
+                        error = e
+                        continue
+                    timer.tag(http_status=response.status_code)
+
+                reached = response.status_code < 500
+                if 199 < response.status_code < 300:
+                    try:
+                        return response.json()
+                    except ValueError as e:
+                        raise StatusAPIError("Invalid response from PayTM: "
+                                             "%s" % e)
+                error = "HTTP %d" % response.status_code
+                if reached:
+                    break
+            raise StatusAPIError("PayTM Status API failed: %s" % error)
+        finally:
+            if breaker:
+                breaker.record(reached, probe)
+
+    async def get_status(self, config, orderid: str) -> dict:
+        if self.cache is None:
+            return await self.fetch(config.status_url,
+                                    status_payload(config, orderid))
+        return await self.cache.aget_or_fetch(
+            config.mid, orderid, lambda: self.fetch(
+                config.status_url, status_payload(config, orderid)))
+
+    async def verify(self, config, orderid: str, status: str,
+                     txnid: str) -> bool:
+        result = await self.get_status(config, orderid)
+        if self.outdated(result, status):
+            self.cache.invalidate(config.mid, orderid)
+            result = await self.get_status(config, orderid)
+        return is_status_valid(result, status, txnid)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
+
+
+_status_client = None
+
+
+def get_status_client() -> StatusClient:
+    """
+    Provides StatusClient shared by the process.
+    """
+    global _status_client
+
+    if _status_client is None:
+        _status_client = StatusClient()
+    return _status_client
+
+
+_async_status_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_status_client() -> AsyncStatusClient:
+    """
+    Provides AsyncStatusClient shared by the running event loop, as
+    connections of a client can not be used by other event loops.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    client = _async_status_clients.get(loop)
+    if client is None:
+        client = _async_status_clients[loop] = AsyncStatusClient()
+    return client
+
+
+def validate_transaction_status(orderid: str, status: str, txnid: str,
+                                mid: str = None):
+    """
+    Gets transaction status and provides a True/False output
+
+    Parameters
+    ----------
+    orderid: str | OrderID
+    status: str | status received in callback
+    txnid: str | transaction ID received in callback
+    mid: str | Merchant ID the order was paid to, the only active
+    configuration is used if not provided
+
+    Returns
+    -------
+    bool
+
+    Raises
+    ------
+    PayTMConfiguration.DoesNotExist: if mid has no configuration, or if
+    mid is not provided and no configuration is active.
+    PayTMConfiguration.MultipleObjectsReturned: if mid is not provided
+    and several configurations are active.
+    """
+    from .registry import registry
+
+    if mid is None:
+        # Raises with a message asking for mid if routing is in use
+        pc = registry.get_active()
+    else:
+        pc = registry.get_by_mid(mid)
+    try:
+        return get_status_client().verify(config=pc, orderid=orderid,
+                                          status=status, txnid=txnid)
+    except StatusAPIError:
         return False
@@ -0,0 +1,306 @@
+"""
+Bulk reconciliation of unsettled Transaction Requests with PayTM
+Transaction Status API.
+
+Unsettled requests are streamed from database in chunks, their status
+is fetched concurrently with a bounded worker pool under a rate limit
+and results are written back with bulk queries, one set per chunk.
+"""
+
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+    """
+    Thread safe limiter that spaces calls evenly to not exceed `rate`
+    calls per second. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def pending_requests(min_age: int = 30, days: int = 3):
+    """
+    Provides Transaction Requests that are not completed yet, i.e. do
+    not have a verified successful Transaction Response.
+
+    Parameters
+    ----------
+    min_age: int | only requests created at least these many minutes ago
+    days: int | only requests created within these many days
+
+    Returns
+    -------
+    QuerySet
+    """
+    import datetime
+
+    from django.utils import timezone
+
+    from .models import TransactionRequest
+
+    now = timezone.now()
+    window = (now - datetime.timedelta(days=days),
+              now - datetime.timedelta(minutes=min_age))
+    logger.info("Reconciling requests created from %s to %s.",
+                *(moment.isoformat() for moment in window))
+    return TransactionRequest.objects.filter(
+        completed_at__isnull=True, create_date__gte=window[0],
+        create_date__lte=window[1])
+
+
+def response_fields(result: dict) -> dict:
+    """
+    Maps PayTM keys of a status response to TransactionResponse fields.
+    """
+    from django.conf import settings
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+
+    from .serializers import TransactionResponseSerializer
+
+    fields = {}
+    for key, field in TransactionResponseSerializer._declared_fields.items():
+        if result.get(key) not in (None, ''):
+            fields[field.source] = result[key]
+
+    timestamp = fields.get('timestamp')
+    if timestamp:
+        timestamp = parse_datetime(timestamp)
+        if timestamp and settings.USE_TZ and timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+        fields['timestamp'] = timestamp
+    fields['raw_response'] = json.dumps(result)
+    return fields
+
+
+class Reconciler(object):
+    """
+    Reconciles Transaction Requests with PayTM.
+
+    Parameters
+    ----------
+    workers: int | number of concurrent status calls
+    rate: float | maximum status calls per second, 0 for no limit
+    chunk_size: int | number of requests read & written at once
+    client: StatusClient | client to use, a new one if not provided
+    """
+
+    UPDATE_FIELDS = ('status', 'code', 'message', 'bnkid', 'gateway', 'bank',
+                     'mode', 'timestamp', 'raw_response', 'is_verified')
+    # Fields a Transaction Response can not be saved without
+    REQUIRED_FIELDS = ('mid', 'oid', 'amount', 'status', 'code', 'message')
+
+    def __init__(self, workers: int = 16, rate: float = 0,
+                 chunk_size: int = 500, client=None):
+        from .paytmapi import StatusClient
+
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.limiter = RateLimiter(rate)
+        self.client = client or StatusClient(pool_size=workers)
+        self.stats = dict(checked=0, created=0, updated=0, unchanged=0,
+                          skipped=0, errors=0, elapsed=0.0)
+
+    @property
+    def throughput(self) -> float:
+        if not self.stats['elapsed']:
+            return 0.0
+        return self.stats['checked'] / self.stats['elapsed']
+
+    def fetch(self, row, config):
+        """
+        Fetches status of a (pk, oid, mid) row. Runs on worker threads,
+        hence does not touch database.
+
+        Returns
+        -------
+        tuple: (row, result dict or None on failure)
+        """
+        from .paytmapi import StatusAPIError
+
+        self.limiter.wait()
+        try:
+            return row, self.client.get_status(config, row[1])
+        except StatusAPIError:
+            return row, None
+
+    def fetch_chunk(self, pool, chunk):
+        from .models import PayTMConfiguration
+        from .registry import registry
+
+        futures, results = [], []
+        for row in chunk:
+            try:
+                config = registry.get_by_mid(row[2])
+            except PayTMConfiguration.DoesNotExist:
+                results.append((row, None))
+            else:
+                futures.append(pool.submit(self.fetch, row, config))
+        return results + [future.result() for future in futures]
+
+    def reconcile(self, queryset=None) -> dict:
+        """
+        Reconciles every request of provided queryset, pending requests
+        by default.
+
+        Returns
+        -------
+        dict: stats
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if queryset is None:
+            queryset = pending_requests()
+        rows = queryset.values_list('pk', 'oid', 'mid').iterator(
+            chunk_size=self.chunk_size)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == self.chunk_size:
+                    self.write(self.fetch_chunk(pool, chunk))
+                    chunk = []
+            if chunk:
+                self.write(self.fetch_chunk(pool, chunk))
+        self.stats['elapsed'] = time.perf_counter() - start
+        return self.stats
+
+    def update(self, existing, found: dict) -> tuple:
+        """
+        Updates known responses of a chunk with their (row, fields) in
+        `found`, popped from it. Must be called in a transaction.
+
+        Returns
+        -------
+        tuple: (updated responses, newly paid ones, ones with events)
+        """
+        from .models import TransactionResponse
+        from .variables import SUCCESS
+
+        updates, paid, events = [], [], []
+        for response in existing:
+            row, fields = found.pop(response.tid)
+            if (response.status == fields['status']
+                    and response.is_verified):
+                self.stats['unchanged'] += 1
+                continue
+            newly_paid = (fields['status'] == SUCCESS
+                          and response.status != SUCCESS)
+            if not response.is_verified:
+                # Claimed with a conditional update, as callbacks'
+                # verification task may verify it at the same time
+                claimed = TransactionResponse.objects.filter(
+                    pk=response.pk, is_verified=False).update(
+                    is_verified=True)
+                newly_paid = claimed and fields['status'] == SUCCESS
+                if claimed:
+                    events.append(response)
+            else:
+                events.append(response)
+            for name in self.UPDATE_FIELDS:
+                if name in fields:
+                    setattr(response, name, fields[name])
+            response.is_verified = True
+            updates.append(response)
+            if newly_paid:
+                paid.append(response)
+        TransactionResponse.objects.bulk_update(updates, self.UPDATE_FIELDS)
+        self.stats['updated'] += len(updates)
+        return updates, paid, events
+
+    def write(self, results):
+        """
+        Writes a chunk of (row, result) back to database: responses not
+        known yet are bulk created, known ones are bulk updated, then
+        payment state of their requests is refreshed.
+        payment_done is sent for every newly verified successful payment
+        and payment events are written to the outbox. Results lacking
+        required fields are counted as errors and not written.
+        """
+        from django.db import IntegrityError, transaction
+
+        from .dispatch import schedule
+        from .models import TransactionRequest, TransactionResponse
+        from .outbox import record
+        from .variables import STATUS_CHOICES, SUCCESS
+
+        statuses = dict(STATUS_CHOICES)
+        self.stats['checked'] += len(results)
+
+        found = {}
+        for row, result in results:
+            if result is None:
+                self.stats['errors'] += 1
+            elif not result.get('TXNID') or result.get('STATUS') not in \
+                    statuses:
+                # Order was never attempted on PayTM
+                self.stats['skipped'] += 1
+            else:
+                fields = response_fields(result)
+                missing = [name for name in self.REQUIRED_FIELDS
+                           if name not in fields]
+                if missing:
+                    logger.warning("Status of order %s lacks %s.", row[1],
+                                   ", ".join(missing))
+                    self.stats['errors'] += 1
+                else:
+                    found[result['TXNID']] = (row, fields)
+
+        with transaction.atomic():
+            updates, paid, events = self.update(
+                TransactionResponse.objects.select_for_update().filter(
+                    tid__in=list(found)), found)
+            oids = {row[1] for row, _ in found.values()}
+
+            while True:
+                try:
+                    with transaction.atomic():
+                        TransactionResponse.objects.bulk_create([
+                            TransactionResponse(t_request_id=row[0],
+                                                is_verified=True, **fields)
+                            for row, fields in found.values()])
+                    break
+                except IntegrityError:
+                    # A callback saved some of them meanwhile: update
+                    # those instead and create the others again
+                    raced = list(TransactionResponse.objects
+                                 .select_for_update()
+                                 .filter(tid__in=list(found)))
+                    if not raced:
+                        raise
+                    more = self.update(raced, found)
+                    for done, new in zip((updates, paid, events), more):
+                        done.extend(new)
+            self.stats['created'] += len(found)
+            created = list(TransactionResponse.objects.filter(
+                tid__in=list(found)))
+            paid.extend(response for response in created
+                        if response.status == SUCCESS)
+
+            oids.update(response.oid for response in updates)
+            TransactionRequest.objects.filter(
+                oid__in=oids).refresh_payment_state()
+
+            record(events + created)
+            schedule(paid)
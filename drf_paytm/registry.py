@@ -0,0 +1,133 @@
+"""
+Process local registry of PayTM Configurations.
+
+All configurations are loaded with a single query the first time they
+are required and are then served from memory, indexed by mid.
+Cached entries are dropped whenever a PayTMConfiguration is saved or
+deleted (see signals.handlers). If SHARED_CONFIG_CACHE is set, a version
+key stored in Django's cache lets other workers notice the change too.
+"""
+
+import threading
+import uuid
+
+from .conf import paytm_settings
+
+
+class ConfigurationRegistry(object):
+    """
+    Caches PayTMConfiguration objects for the lifetime of the process.
+    Lookups raise the same DoesNotExist / MultipleObjectsReturned
+    exceptions as PayTMConfiguration.objects.get() would.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (version, by_mid, active) or None when not loaded
+        self._state = None
+
+    @staticmethod
+    def _shared_version():
+        from django.core.cache import cache
+
+        return cache.get(paytm_settings('CONFIG_CACHE_KEY'))
+
+    def _load(self):
+        shared = paytm_settings('SHARED_CONFIG_CACHE')
+        version = self._shared_version() if shared else None
+
+        state = self._state
+        if state is not None and state[0] == version:
+            return state
+
+        with self._lock:
+            state = self._state
+            if state is not None and state[0] == version:
+                return state
+
+            from .models import PayTMConfiguration
+
+            by_mid, active = {}, []
+            for pc in PayTMConfiguration.objects.all():
+                by_mid[pc.mid] = pc
+                if pc.is_active:
+                    active.append(pc)
+
+            state = (version, by_mid, tuple(active))
+            self._state = state
+        return state
+
+    def get_active(self):
+        """
+        Provides the active PayTM Configuration.
+
+        Returns
+        -------
+        PayTMConfiguration
+
+        Raises
+        ------
+        PayTMConfiguration.DoesNotExist: no configuration is active.
+        PayTMConfiguration.MultipleObjectsReturned: more than one
+        configuration is active.
+        """
+        from .models import PayTMConfiguration
+
+        active = self._load()[2]
+        if not active:
+            raise PayTMConfiguration.DoesNotExist(
+                "No active PayTM Configuration found.")
+        if len(active) > 1:
+            raise PayTMConfiguration.MultipleObjectsReturned(
+                "Multiple active PayTM Configurations found, provide mid.")
+        return active[0]
+
+    def get_all_active(self) -> tuple:
+        """
+        Provides all active PayTM Configurations, see routing.py.
+        """
+        return self._load()[2]
+
+    def get_key(self, mid: str) -> str:
+        """
+        Provides Merchant Key of provided Merchant ID. Keys are kept
+        only here, on PayTM Configuration, not on every Transaction
+        Request.
+
+        Raises
+        ------
+        PayTMConfiguration.DoesNotExist
+        """
+        return self.get_by_mid(mid).mkey
+
+    def get_by_mid(self, mid: str):
+        """
+        Provides PayTM Configuration having provided Merchant ID.
+
+        Raises
+        ------
+        PayTMConfiguration.DoesNotExist
+        """
+        from .models import PayTMConfiguration
+
+        try:
+            return self._load()[1][mid]
+        except KeyError:
+            raise PayTMConfiguration.DoesNotExist(
+                "PayTM Configuration with provided mid not found.")
+
+    def invalidate(self, broadcast: bool = True):
+        """
+        Drops cached configurations so that they are loaded again on
+        next lookup. If SHARED_CONFIG_CACHE is set and broadcast is
+        True, bumps the shared version key so other workers reload too.
+        """
+        self._state = None
+        if broadcast and paytm_settings('SHARED_CONFIG_CACHE'):
+            from django.core.cache import cache
+
+            cache.set(paytm_settings('CONFIG_CACHE_KEY'), uuid.uuid4().hex,
+                      timeout=None)
+
+
+registry = ConfigurationRegistry()
@@ -0,0 +1,214 @@
+"""
+Routing of Transaction Requests across merchants.
+
+Every new Transaction Request is assigned an active PayTM Configuration
+by the strategy set in ROUTING_STRATEGY, created with keyword arguments
+from ROUTING_STRATEGY_OPTIONS:
+- drf_paytm.routing.WeightedRoundRobinStrategy: spreads requests across
+  active configurations in proportion to their `weight` (default)
+- drf_paytm.routing.AmountBandStrategy: picks merchant by amount
+- drf_paytm.routing.TenantStrategy: picks merchant by tenant of request
+
+Strategies only route to active configurations. A request that a
+strategy has no merchant for, or whose merchant is not active, is
+routed by weighted round robin. With a single active configuration,
+every request goes to it.
+"""
+
+import threading
+
+from django.core.signals import setting_changed
+
+
+class BaseRoutingStrategy(object):
+    """
+    Base class for all routing strategies.
+    """
+
+    def route(self, configs: tuple, request, attrs: dict):
+        """
+        Picks configuration of a new Transaction Request.
+
+        Parameters
+        ----------
+        configs: tuple | active PayTMConfiguration, at least one
+        request: Request | None if serializer was not given one
+        attrs: dict | validated attributes of Transaction Request
+
+        Returns
+        -------
+        PayTMConfiguration
+        """
+        raise NotImplementedError
+
+
+class WeightedRoundRobinStrategy(BaseRoutingStrategy):
+    """
+    Smooth weighted round robin: out of every `total weight` requests,
+    each configuration gets `weight`, evenly interleaved. Configurations
+    with weight 0 get none unless all weights are 0.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._weights = None
+        self._current = {}
+
+    def route(self, configs: tuple, request, attrs: dict):
+        weights = tuple((config.mid, config.weight) for config in configs)
+        with self._lock:
+            if weights != self._weights:
+                # Configurations changed, start over
+                self._weights = weights
+                self._current = dict.fromkeys(
+                    (mid for mid, _ in weights), 0)
+            total = sum(weight for _, weight in weights)
+            if not total:
+                return configs[0]
+            for mid, weight in weights:
+                self._current[mid] += weight
+            best = max(range(len(configs)),
+                       key=lambda i: self._current[weights[i][0]])
+            self._current[weights[best][0]] -= total
+        return configs[best]
+
+    def pick(self, mid: str, configs: tuple, request, attrs: dict):
+        """
+        Provides active configuration of `mid`, routing by weighted
+        round robin if there is none.
+        """
+        from .models import PayTMConfiguration
+        from .registry import registry
+
+        if mid is not None:
+            try:
+                config = registry.get_by_mid(mid)
+            except PayTMConfiguration.DoesNotExist:
+                pass
+            else:
+                if config.is_active:
+                    return config
+        return WeightedRoundRobinStrategy.route(self, configs, request,
+                                                attrs)
+
+
+class AmountBandStrategy(WeightedRoundRobinStrategy):
+    """
+    Routes requests by amount to the merchant of the first band that
+    the amount does not exceed.
+
+    Parameters
+    ----------
+    bands: list | [(maximum amount, mid), ...] in ascending order of
+    amount, maximum amount None for no limit
+    """
+
+    def __init__(self, bands: list):
+        from decimal import Decimal
+
+        super(AmountBandStrategy, self).__init__()
+        self.bands = [(None if limit is None else Decimal(str(limit)), mid)
+                      for limit, mid in bands]
+
+    def route(self, configs: tuple, request, attrs: dict):
+        amount = attrs.get('amount')
+        mid = None
+        if amount is not None:
+            mid = next((mid for limit, mid in self.bands
+                        if limit is None or amount <= limit), None)
+        return self.pick(mid, configs, request, attrs)
+
+
+class TenantStrategy(WeightedRoundRobinStrategy):
+    """
+    Routes requests by tenant, `request.tenant` as set by tenancy
+    middlewares unless `resolver` is set.
+
+    Parameters
+    ----------
+    tenants: dict | {tenant: mid}, tenant as str
+    resolver: str | dotted path of callable providing tenant of request
+    """
+
+    def __init__(self, tenants: dict, resolver: str = None):
+        from django.utils.module_loading import import_string
+
+        super(TenantStrategy, self).__init__()
+        self.tenants = tenants
+        self.resolver = import_string(resolver) if resolver else None
+
+    def tenant(self, request):
+        if request is None:
+            return None
+        if self.resolver is not None:
+            return self.resolver(request)
+        return getattr(request, 'tenant', None)
+
+    def route(self, configs: tuple, request, attrs: dict):
+        tenant = self.tenant(request)
+        mid = None if tenant is None else self.tenants.get(str(tenant))
+        return self.pick(mid, configs, request, attrs)
+
+
+_strategy = None
+_lock = threading.Lock()
+
+
+def get_strategy() -> BaseRoutingStrategy:
+    """
+    Provides strategy set by ROUTING_STRATEGY, created once per process.
+    """
+    global _strategy
+
+    if _strategy is None:
+        with _lock:
+            if _strategy is None:
+                from django.utils.module_loading import import_string
+
+                from .conf import paytm_settings
+
+                _strategy = import_string(paytm_settings('ROUTING_STRATEGY'))(
+                    **paytm_settings('ROUTING_STRATEGY_OPTIONS'))
+    return _strategy
+
+
+def reset_strategy(setting=None, **kwargs):
+    """
+    Drops the strategy so that ROUTING_STRATEGY is read again, whenever
+    settings change in tests.
+    """
+    global _strategy
+
+    if setting in (None, 'PAYTM_SETTINGS'):
+        with _lock:
+            _strategy = None
+
+
+def route(request=None, attrs: dict = None):
+    """
+    Picks PayTM Configuration of a new Transaction Request.
+
+    Parameters
+    ----------
+    request: Request | request creating Transaction Request
+    attrs: dict | validated attributes of Transaction Request
+
+    Returns
+    -------
+    PayTMConfiguration
+
+    Raises
+    ------
+    PayTMConfiguration.DoesNotExist: no configuration is active.
+    """
+    from .models import PayTMConfiguration
+    from .registry import registry
+
+    configs = registry.get_all_active()
+    if not configs:
+        raise PayTMConfiguration.DoesNotExist(
+            "No active PayTM Configuration found.")
+    return get_strategy().route(configs, request, attrs or {})
+
+
+setting_changed.connect(reset_strategy)
@@ -52,8 +52,8 @@ class TransactionRequestSerializer(serializers.ModelSerializer):
         AUTH_MODE & PAYMENT_TYPE_ID is set if PAYMENT_MODE_ONLY is set.
         BANK_CODE is set if PAYMENT_TYPE_ID is for Net Banking.
 
-        Also adds mid, checksum and mkey to the request for saving in
-        model.
+        Also adds mid of the PayTM Configuration picked by routing
+        strategy to the request for saving in model.
         Parameters
         ----------
         attrs: dict of attributes sent by client.
@@ -66,6 +66,7 @@ class TransactionRequestSerializer(serializers.ModelSerializer):
         """
 
         from .models import PayTMConfiguration
+        from .routing import route
         from .variables import NET_BANKING
 
         from rest_framework.exceptions import APIException
@@ -86,17 +87,12 @@ class TransactionRequestSerializer(serializers.ModelSerializer):
                     _("If Payment Mode Only is  set and Payment Type is  "
                       "Net banking, providing BANK_CODE is compulsory."))
         try:
-            paytm_config = PayTMConfiguration.objects.get(is_active=True)
+            paytm_config = route(self.context.get('request'), attrs)
         except PayTMConfiguration.DoesNotExist:
             raise APIException(detail=_("Server has not configured a PayTM "
                                         "Configuration yet."))
-        except PayTMConfiguration.MultipleObjectsReturned:
-            raise APIException(detail=_("Improper PayTM Configuration found. "
-                                        "Server has multiple active PayTM "
-                                        "configurations."))
         else:
             attrs['mid'] = paytm_config.mid
-            attrs['mkey'] = paytm_config.mkey
         return attrs
 
     class Meta:
@@ -153,7 +149,7 @@ class TransactionResponseSerializer(serializers.ModelSerializer):
     GATEWAYNAME = serializers.CharField(source='gateway', required=False)
     BANKNAME = serializers.CharField(source='bank', required=False)
     PAYMENTMODE = serializers.CharField(source='mode', required=False)
-    CHECKSUMHASH = serializers.CharField(source='checksum', required=False)
+    CHECKSUMHASH = serializers.CharField(source='checksum')
     BIN_NUMBER = serializers.CharField(source='bin_number', required=False)
     CARD_LAST_NUMS = serializers.CharField(source='card_last_num', required=False)
 
@@ -172,37 +168,18 @@ class TransactionResponseSerializer(serializers.ModelSerializer):
         Author: Himanshu Shankar (https://himanshus.com)
         """
 
+        from . import metrics
         from .models import PayTMConfiguration
+        from .registry import registry
 
         try:
-            PayTMConfiguration.objects.get(mid=value)
+            with metrics.timer('response.db_lookup', lookup='config'):
+                self.context['paytm_config'] = registry.get_by_mid(value)
         except PayTMConfiguration.DoesNotExist:
             raise serializers.ValidationError(_("Provided Merchant ID does "
                                                 "not exists in the system."))
         return value
 
-    def validate_TXNID(self, value):
-        """
-        Checks if provided response already exists in the system.
-
-        Parameters
-        ----------
-        value: str | Transaction ID
-
-        Returns
-        -------
-        str: Transaction ID
-
-        Author: Himanshu Shankar (https://himanshus.com)
-        """
-        from .models import TransactionResponse
-
-        if TransactionResponse.objects.filter(tid=value).count() > 0:
-            raise serializers.ValidationError(_("Provided Transaction "
-                                                "Response already exists in "
-                                                "the system."))
-        return value
-
     def validate_ORDERID(self, value):
         """
         Checks if Order ID is present in system.
@@ -218,10 +195,13 @@ class TransactionResponseSerializer(serializers.ModelSerializer):
         Author: Himanshu Shankar (https://himanshus.com)
         """
 
+        from . import metrics
         from .models import TransactionRequest
 
         try:
-            TransactionRequest.objects.get(oid=value)
+            with metrics.timer('response.db_lookup', lookup='request'):
+                self.context['t_request'] = TransactionRequest.objects.get(
+                    oid=value)
         except TransactionRequest.DoesNotExist:
             raise serializers.ValidationError(_("No PayTM Transaction "
                                                 "request with provided order "
@@ -230,8 +210,15 @@ class TransactionResponseSerializer(serializers.ModelSerializer):
 
     def validate(self, attrs):
         """
-        Verifies the checksum hash sent by client.
+        Verifies the checksum hash sent by client, always and before the
+        response can be saved, and transaction status with PayTM, unless
+        defer_verification is set in context or the response has already
+        been received. While circuit of the status
+        API is open, verification is deferred if STATUS_BREAKER_FALLBACK
+        is 'defer' and the response is rejected otherwise.
         Also adds raw_response and t_request to the attributes.
+        PayTM Configuration & Transaction Request fetched by field
+        validators are reused from context.
 
         Parameters
         ----------
@@ -246,36 +233,107 @@ class TransactionResponseSerializer(serializers.ModelSerializer):
 
         import json
 
+        from . import metrics
+        from .breaker import CircuitOpen
+        from .conf import paytm_settings
         from .utils import verify_checksum
-        from .models import PayTMConfiguration, TransactionRequest
-        from .paytmapi import validate_transaction_status
-
-        try:
-            pc = PayTMConfiguration.objects.get(mid=attrs.get('mid'))
-        except PayTMConfiguration.DoesNotExist:
-            raise serializers.ValidationError(_("Provided merchant ID does "
-                                                "not exists in the system."))
-        else:
-            if 'checksum' in attrs.keys():
-                param_dict = dict(self.initial_data)
-                param_dict = {key: value[0] for key, value in param_dict.items()}
-                if not verify_checksum(
-                        param_dict=dict(param_dict),
-                        merchant_key=pc.mkey, checksum=attrs.get('checksum')):
-                    raise serializers.ValidationError(_("Could not verify "
-                                                        "transaction response."))
+        from .models import TransactionResponse
+        from .paytmapi import StatusAPIError, get_status_client
+        from .variables import RESPONSE_CODES, STATUS_CHOICES
+
+        pc = self.context['paytm_config']
+        # Checked before anything is saved, deferred verification included
+        param_dict = dict(self.initial_data)
+        param_dict = {key: value[0] for key, value in param_dict.items()}
+        with metrics.timer('response.checksum_verify') as timer:
+            valid = verify_checksum(
+                param_dict=dict(param_dict),
+                merchant_key=pc.mkey, checksum=attrs['checksum'])
+            timer.tag(valid=valid)
+        if not valid:
+            raise serializers.ValidationError(_("Could not verify "
+                                                "transaction response."))
+        # Tagged only once signed by PayTM, with known values only
+        metrics.increment('response.callback',
+                          status=metrics.bounded(attrs.get('status'),
+                                                 dict(STATUS_CHOICES)),
+                          respcode=metrics.bounded(attrs.get('code'),
+                                                   RESPONSE_CODES))
         attrs['raw_response'] = json.dumps(self.context.get('request').data)
-        attrs['t_request'] = TransactionRequest.objects.get(oid=
-                                                            attrs.get('oid'))
-
-        if not validate_transaction_status(orderid=attrs.get('oid'),
-                                           status=attrs.get("status"),
-                                           txnid=attrs.get("tid", "")):
+        attrs['t_request'] = self.context['t_request']
+
+        if attrs.get('tid'):
+            # PayTM retries callbacks, a known response is not verified again
+            with metrics.timer('response.db_lookup', lookup='duplicate'):
+                self.context['duplicate'] = TransactionResponse.objects.filter(
+                    tid=attrs['tid']).first()
+            if self.context['duplicate'] is not None:
+                return attrs
+
+        if self.context.get('defer_verification'):
+            # Status is verified later by a background task
+            attrs['is_verified'] = False
+            return attrs
+
+        with metrics.timer('response.status_call') as timer:
+            try:
+                verified = get_status_client().verify(
+                    config=pc, orderid=attrs.get('oid'),
+                    status=attrs.get("status"), txnid=attrs.get("tid", ""))
+            except CircuitOpen:
+                verified = None
+            except StatusAPIError:
+                verified = False
+            timer.tag(outcome={True: 'verified', False: 'rejected',
+                               None: 'circuit_open'}[verified])
+        if verified is None and paytm_settings(
+                'STATUS_BREAKER_FALLBACK') == 'defer':
+            # Gateway is down, status is verified later by a background
+            # task or by reconciliation
+            attrs['is_verified'] = False
+            return attrs
+        if not verified:
             raise serializers.ValidationError(_("Could not verify "
                                                 "transaction."))
 
         return attrs
 
+    def create(self, validated_data):
+        """
+        Creates Transaction Response once per Transaction ID. A duplicate
+        callback, including one that loses a race on the unique tid,
+        provides the response that already exists. Payment state of the
+        Transaction Request is updated in the same transaction.
+
+        Parameters
+        ----------
+        validated_data: dict
+
+        Returns
+        -------
+        TransactionResponse
+        """
+        from django.db import IntegrityError, transaction
+
+        from .models import TransactionResponse
+
+        duplicate = self.context.get('duplicate')
+        if duplicate is None:
+            try:
+                with transaction.atomic():
+                    return super(TransactionResponseSerializer,
+                                 self).create(validated_data)
+            except IntegrityError:
+                if not validated_data.get('tid'):
+                    raise
+                duplicate = TransactionResponse.objects.get(
+                    tid=validated_data['tid'])
+                self.context['duplicate'] = duplicate
+
+        if duplicate.t_request_id == validated_data['t_request'].pk:
+            duplicate.t_request = validated_data['t_request']
+        return duplicate
+
     class Meta:
         from .models import TransactionResponse
 
@@ -0,0 +1,298 @@
+"""
+Reconciliation of PayTM settlement (MIS) reports with Transaction
+Responses.
+
+Report is streamed row by row and matched in chunks: Transaction
+Responses of a chunk are fetched with one indexed query per key (tid,
+then oid, then bnkid for rows still unmatched) into in-memory hash
+indexes. Matched responses are marked settled by the run, in one query
+per chunk, so that duplicates are detected by the database. Hence the
+number of queries grows with number of chunks, not with number of rows,
+and memory with chunk size only.
+
+Once the report is read, successful verified responses of its date
+range that were not settled by the run are provided as not in report.
+
+A dry run reports the same mismatches without marking any response as
+settled, keeping IDs of matched responses in memory instead.
+"""
+
+import collections
+import csv
+import time
+
+from decimal import Decimal, InvalidOperation
+
+# Kinds of mismatch
+MISSING = 'missing'
+AMOUNT_MISMATCH = 'amount_mismatch'
+NOT_SUCCESSFUL = 'not_successful'
+DUPLICATE = 'duplicate'
+NOT_IN_REPORT = 'not_in_report'
+
+# Accepted report headers per field, lower cased without spaces and _
+COLUMNS = {
+    'tid': ('txnid', 'transactionid', 'paytmtxnid'),
+    'oid': ('orderid', ),
+    'bnkid': ('banktxnid', 'banktransactionid', 'bankreferenceno'),
+    'amount': ('txnamount', 'amount', 'transactionamount'),
+    'date': ('txndate', 'transactiondate', 'date'),
+}
+
+KEYS = ('tid', 'oid', 'bnkid')
+
+FIELDS = ('id', 'tid', 'oid', 'bnkid', 'amount', 'status', 'settled_at')
+
+Mismatch = collections.namedtuple(
+    'Mismatch', ('kind', 'line', 'tid', 'oid', 'bnkid', 'reported_amount',
+                 'amount', 'response_id'))
+
+
+def normalize(header: str) -> str:
+    return header.strip().lower().replace(' ', '').replace('_', '')
+
+
+def column_map(fieldnames) -> dict:
+    """
+    Maps report headers to fields.
+
+    Raises
+    ------
+    ValueError: if report has no amount or no key column.
+    """
+    columns = {}
+    for header in fieldnames or ():
+        for field, names in COLUMNS.items():
+            if normalize(header) in names and field not in columns:
+                columns[field] = header
+    if 'amount' not in columns or not set(KEYS) & set(columns):
+        raise ValueError("Settlement report must have an amount column and "
+                         "one of transaction, order or bank transaction ID "
+                         "columns.")
+    return columns
+
+
+def parse_amount(value):
+    try:
+        return Decimal(value.replace(',', '').strip())
+    except (AttributeError, InvalidOperation):
+        return None
+
+
+def parse_date(value):
+    """
+    Provides date of a report date or date time, None if invalid.
+    """
+    from django.utils.dateparse import parse_date, parse_datetime
+
+    value = (value or '').strip()
+    try:
+        moment = parse_datetime(value)
+        return moment.date() if moment else parse_date(value)
+    except ValueError:
+        return None
+
+
+class SettlementReconciler(object):
+    """
+    Matches rows of a settlement report with Transaction Responses and
+    provides mismatches.
+
+    Parameters
+    ----------
+    chunk_size: int | number of report rows matched at once
+    date_from: date | first day of report, earliest row date if not set
+    date_to: date | last day of report, latest row date if not set
+    dry_run: bool | only report mismatches, do not mark responses as
+    settled
+    """
+
+    def __init__(self, chunk_size: int = 5000, date_from=None,
+                 date_to=None, dry_run: bool = False):
+        from django.utils import timezone
+
+        self.chunk_size = chunk_size
+        self.date_from = date_from
+        self.date_to = date_to
+        self.dry_run = dry_run
+        self.stats = dict(rows=0, matched=0, queries=0, elapsed=0.0,
+                          **{kind: 0 for kind in (
+                              MISSING, AMOUNT_MISMATCH, NOT_SUCCESSFUL,
+                              DUPLICATE, NOT_IN_REPORT)})
+        # Marks responses settled by this run
+        self.started = timezone.now()
+        # Responses settled by a dry run
+        self.settled = set()
+        self.dates = None
+
+    @property
+    def throughput(self) -> float:
+        if not self.stats['elapsed']:
+            return 0.0
+        return self.stats['rows'] / self.stats['elapsed']
+
+    def read(self, report):
+        """
+        Yields (line, tid, oid, bnkid, amount) of every report row,
+        keeping range of row dates.
+
+        Parameters
+        ----------
+        report: file object of CSV report
+        """
+        reader = csv.DictReader(report)
+        columns = column_map(reader.fieldnames)
+        for row in reader:
+            values = [(row.get(columns[key]) or '').strip() or None
+                      if key in columns else None for key in KEYS]
+            if 'date' in columns:
+                self.extend_dates(parse_date(row.get(columns['date'])))
+            yield (reader.line_num, *values,
+                   parse_amount(row.get(columns['amount'])))
+
+    def extend_dates(self, date):
+        if date is None:
+            return
+        if self.dates is None:
+            self.dates = (date, date)
+        else:
+            self.dates = (min(self.dates[0], date), max(self.dates[1], date))
+
+    def lookup(self, chunk) -> dict:
+        """
+        Fetches Transaction Responses of a chunk of report rows.
+
+        Returns
+        -------
+        dict: {key name: {key value: response values}}
+        """
+        from .models import TransactionResponse
+        from .variables import SUCCESS
+
+        indexes = {key: {} for key in KEYS}
+        responses = TransactionResponse.objects.values_list(*FIELDS)
+        pending = chunk
+        for position, key in enumerate(KEYS, start=1):
+            values = {row[position] for row in pending if row[position]}
+            if not values:
+                continue
+            index = indexes[key]
+            self.stats['queries'] += 1
+            for response in responses.filter(**{key + '__in': values}):
+                current = index.get(response[position])
+                # An order may have many responses, successful one wins
+                if current is None or response[5] == SUCCESS:
+                    index[response[position]] = response
+            pending = [row for row in pending
+                       if not row[position] or row[position] not in index]
+        return indexes
+
+    def match_chunk(self, chunk):
+        from .models import TransactionResponse
+        from .variables import SUCCESS
+
+        indexes = self.lookup(chunk)
+        settled = set()
+        for line, tid, oid, bnkid, amount in chunk:
+            self.stats['rows'] += 1
+            response = (indexes['tid'].get(tid) or indexes['oid'].get(oid)
+                        or indexes['bnkid'].get(bnkid))
+            if response is None:
+                kind = MISSING
+            elif (response[0] in settled or response[0] in self.settled
+                  or response[6] == self.started):
+                # Settled earlier in this chunk, or in an earlier one
+                kind = DUPLICATE
+            else:
+                settled.add(response[0])
+                if amount is None or amount != response[4]:
+                    kind = AMOUNT_MISMATCH
+                elif response[5] != SUCCESS:
+                    kind = NOT_SUCCESSFUL
+                else:
+                    self.stats['matched'] += 1
+                    continue
+            self.stats[kind] += 1
+            yield Mismatch(kind, line, tid, oid, bnkid, amount,
+                           response and response[4],
+                           response and response[0])
+        if self.dry_run:
+            self.settled.update(settled)
+        elif settled:
+            self.stats['queries'] += 1
+            TransactionResponse.objects.filter(pk__in=settled).update(
+                settled_at=self.started)
+
+    def unsettled(self):
+        """
+        Yields successful verified responses of the report's date range
+        that no report row was matched with.
+        """
+        import datetime
+
+        from django.conf import settings
+        from django.utils import timezone
+
+        from .models import TransactionResponse
+        from .variables import SUCCESS
+
+        first, last = self.dates or (None, None)
+        first = self.date_from or first
+        last = self.date_to or last
+        if first is None or last is None:
+            return
+        start, end = (datetime.datetime.combine(day, datetime.time.min)
+                      for day in (first, last + datetime.timedelta(days=1)))
+        if settings.USE_TZ:
+            start, end = timezone.make_aware(start), timezone.make_aware(end)
+
+        self.stats['queries'] += 1
+        responses = TransactionResponse.objects.filter(
+            status=SUCCESS, is_verified=True, timestamp__gte=start,
+            timestamp__lt=end).exclude(settled_at=self.started).values_list(
+            *FIELDS).order_by('timestamp', 'id')
+        for response in responses.iterator():
+            if response[0] in self.settled:
+                continue
+            self.stats[NOT_IN_REPORT] += 1
+            yield Mismatch(NOT_IN_REPORT, None, response[1], response[2],
+                           response[3], None, response[4], response[0])
+
+    def reconcile(self, report):
+        """
+        Yields mismatch of every report row that could not be settled,
+        then successful responses missing from the report. Stats are
+        complete once generator is exhausted.
+
+        Parameters
+        ----------
+        report: file object of CSV report
+        """
+        start = time.perf_counter()
+        chunk = []
+        for row in self.read(report):
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                yield from self.match_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self.match_chunk(chunk)
+        yield from self.unsettled()
+        self.stats['elapsed'] = time.perf_counter() - start
+
+
+def write_mismatches(mismatches, output) -> int:
+    """
+    Writes mismatches as CSV.
+
+    Returns
+    -------
+    int: number of mismatches written
+    """
+    writer = csv.writer(output)
+    writer.writerow(Mismatch._fields)
+    count = 0
+    for mismatch in mismatches:
+        writer.writerow(mismatch)
+        count += 1
+    return count
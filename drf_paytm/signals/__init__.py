@@ -1,4 +1,23 @@
 import django.dispatch
 
 
-payment_done = django.dispatch.Signal(providing_args=['instance'])
+class PaymentDoneSignal(django.dispatch.Signal):
+    """
+    Signal providing its receivers, so that drf_paytm.dispatch can call,
+    time & retry each of them on its own.
+    """
+
+    def live_receivers(self, sender) -> list:
+        """
+        Provides receivers connected for `sender` or for any sender, in
+        order of connection.
+        """
+        receivers = self._live_receivers(sender)
+        # Django 5.0+ provides sync & async receivers separately
+        if isinstance(receivers, tuple):
+            receivers = list(receivers[0]) + list(receivers[1])
+        return list(receivers)
+
+
+# Sent with `instance`, the Transaction Response of a verified payment
+payment_done = PaymentDoneSignal()
@@ -1,9 +1,45 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
 from django.dispatch import receiver
 
-from drf_paytm.models import TransactionResponse
-from drf_paytm.signals import payment_done
+from drf_paytm.models import PayTMConfiguration, TransactionResponse
+
+
+@receiver(signal=post_save, sender=TransactionResponse)
+def payment_state_handler(instance: TransactionResponse, **kwargs):
+    """
+    Updates payment state stored on Transaction Request of the response,
+    in the transaction that saves the response. Only verified responses
+    count, so that an unconfirmed status is never reported. A response
+    never replaces a newer one as latest response, and completed_at is
+    set once, by the first verified successful response.
+
+    Parameters
+    ----------
+    instance: TransactionResponse
+    kwargs: dict
+
+    Returns
+    -------
+    """
+
+    from django.db.models import Q
+    from django.utils import timezone
+
+    from drf_paytm.models import TransactionRequest
+    from drf_paytm.variables import SUCCESS
+
+    if not instance.is_verified:
+        # Handled again once PayTM confirms the status
+        return
+
+    requests = TransactionRequest.objects.filter(oid=instance.oid)
+    requests.filter(Q(latest_response__isnull=True)
+                    | Q(latest_response__lte=instance.pk)).update(
+        latest_response=instance, payment_status=instance.status)
+    if instance.status == SUCCESS and instance.is_verified:
+        requests.filter(completed_at__isnull=True).update(
+            completed_at=instance.timestamp or timezone.now())
 
 
 @receiver(signal=post_save, sender=TransactionResponse)
@@ -12,6 +48,9 @@ def transaction_response_handler(instance: TransactionResponse,
     """
     Checks if payment has been completed successfully and hence, generates
     signal that developer is supposed to receive and do the needful.
+    Signal is generated once, when a verified response is created or
+    when an unverified response is marked as verified, after the
+    transaction commits (see drf_paytm.dispatch).
 
     Parameters
     ----------
@@ -22,6 +61,58 @@ def transaction_response_handler(instance: TransactionResponse,
     -------
     """
 
+    from drf_paytm.dispatch import schedule
     from drf_paytm.variables import SUCCESS
-    if instance.status == SUCCESS:
-        payment_done.send(sender=sender, instance=instance)
+
+    verified_now = (kwargs.get('created')
+                    or 'is_verified' in (kwargs.get('update_fields') or ()))
+    if instance.status == SUCCESS and instance.is_verified and verified_now:
+        schedule([instance], using=kwargs.get('using'))
+
+
+@receiver(signal=post_save, sender=TransactionResponse)
+def payment_event_handler(instance: TransactionResponse, **kwargs):
+    """
+    Writes payment event of a response to the outbox, in the transaction
+    that saves the response, when a verified response is created or an
+    unverified response is marked as verified.
+
+    Parameters
+    ----------
+    instance: TransactionResponse
+    kwargs: dict
+
+    Returns
+    -------
+    """
+
+    from drf_paytm.outbox import record
+
+    if kwargs.get('created') or 'is_verified' in (
+            kwargs.get('update_fields') or ()):
+        record([instance], using=kwargs.get('using'))
+
+
+@receiver(signal=post_save, sender=PayTMConfiguration)
+@receiver(signal=post_delete, sender=PayTMConfiguration)
+def configuration_handler(instance: PayTMConfiguration, sender, **kwargs):
+    """
+    Drops cached PayTM Configurations whenever a configuration is saved
+    or deleted. Cache is dropped again once the transaction commits so
+    that no other thread keeps a copy read before the commit.
+
+    Parameters
+    ----------
+    instance: PayTMConfiguration
+    kwargs: dict
+
+    Returns
+    -------
+    """
+
+    from django.db import transaction
+
+    from drf_paytm.registry import registry
+
+    registry.invalidate()
+    transaction.on_commit(registry.invalidate)
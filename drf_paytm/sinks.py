@@ -0,0 +1,187 @@
+"""
+Sinks payment events of the outbox are published to. A sink receives a
+batch of events and either publishes all of them or raises, in which
+case the whole batch is retried by the relay. Events may hence be
+published more than once: consumers should deduplicate them by ID.
+
+Sink is chosen via OUTBOX_SINK setting, with keyword arguments from
+OUTBOX_SINK_OPTIONS, or is a list of sinks every batch is published to:
+- drf_paytm.sinks.WebhookSink: posts batch as JSON to an URL
+- drf_paytm.sinks.FileSink: appends events as NDJSON to a local file
+- drf_paytm.sinks.QueueSink: puts events on an in-process queue, a
+  stand-in for a message broker in development & tests
+- drf_paytm.webhooks.SubscriptionSink: creates webhook deliveries
+"""
+
+import json
+import queue
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class SinkError(Exception):
+    """
+    Raised when a sink could not publish a batch.
+    """
+    pass
+
+
+class BaseSink(object):
+    """
+    Base class for all sinks.
+    """
+
+    def publish(self, events: list):
+        """
+        Publishes a batch of events.
+
+        Parameters
+        ----------
+        events: list | dict of every event, see PaymentEvent.message()
+
+        Raises
+        ------
+        SinkError: if batch could not be published.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WebhookSink(BaseSink):
+    """
+    Posts every batch as {"events": [...]} to `url` over a keep-alive
+    session. Any response other than 2xx fails the batch.
+    """
+
+    def __init__(self, url: str, timeout: float = 10, headers: dict = None):
+        import requests
+
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+
+    def publish(self, events: list):
+        import requests
+
+        body = json.dumps({'events': events}, cls=DjangoJSONEncoder)
+        try:
+            response = self.session.post(
+                self.url, data=body, timeout=self.timeout,
+                headers={'Content-Type': 'application/json'})
+        except requests.RequestException as e:
+            raise SinkError("Webhook failed: %s" % e)
+        if not 199 < response.status_code < 300:
+            raise SinkError("Webhook failed: HTTP %d" % response.status_code)
+
+    def close(self):
+        self.session.close()
+
+
+class FileSink(BaseSink):
+    """
+    Appends events, one JSON object per line, to file at `path` and
+    flushes it after every batch.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self.file = None
+
+    def publish(self, events: list):
+        import os
+
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        encode = DjangoJSONEncoder(separators=(',', ':')).encode
+        try:
+            self.file.write(''.join(encode(event) + '\n'
+                                    for event in events))
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+        except OSError as e:
+            raise SinkError("Could not write events: %s" % e)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class FanOutSink(BaseSink):
+    """
+    Publishes every batch to each of `sinks` in turn. A batch failing on
+    any of them is retried on all of them, so each must tolerate events
+    published more than once.
+    """
+
+    def __init__(self, sinks: list):
+        self.sinks = list(sinks)
+
+    def publish(self, events: list):
+        for sink in self.sinks:
+            sink.publish(events)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+_queues = {}
+_lock = threading.Lock()
+
+
+def get_queue(name: str = 'default') -> queue.Queue:
+    """
+    Provides in-process queue QueueSink of that name publishes to.
+    """
+    with _lock:
+        return _queues.setdefault(name, queue.Queue())
+
+
+class QueueSink(BaseSink):
+    """
+    Puts every event on in-process queue `name`, see get_queue().
+    """
+
+    def __init__(self, name: str = 'default'):
+        self.queue = get_queue(name)
+
+    def publish(self, events: list):
+        for event in events:
+            self.queue.put(event)
+
+
+def get_sink(path=None, **options) -> BaseSink:
+    """
+    Creates sink from its dotted path, OUTBOX_SINK setting if not
+    provided, with OUTBOX_SINK_OPTIONS overridden by `options`.
+
+    A list provides a FanOutSink instead. Each of its items is a dotted
+    path or a (dotted path, keyword arguments) pair, OUTBOX_SINK_OPTIONS
+    do not apply to them.
+
+    Raises
+    ------
+    ImproperlyConfigured: if no sink is configured.
+    """
+    from django.core.exceptions import ImproperlyConfigured
+    from django.utils.module_loading import import_string
+
+    from .conf import paytm_settings
+
+    path = path or paytm_settings('OUTBOX_SINK')
+    if not path:
+        raise ImproperlyConfigured("Set OUTBOX_SINK in PAYTM_SETTINGS to "
+                                   "publish payment events.")
+    if isinstance(path, (list, tuple)):
+        return FanOutSink([
+            import_string(item)() if isinstance(item, str)
+            else import_string(item[0])(**item[1]) for item in path])
+    return import_string(path)(**dict(paytm_settings('OUTBOX_SINK_OPTIONS'),
+                                      **options))
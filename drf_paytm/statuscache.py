@@ -0,0 +1,183 @@
+"""
+Short lived cache of PayTM Transaction Status API responses.
+
+PayTM retries callbacks and verification may run again in background,
+so the status of an order is often asked for several times within
+seconds. Responses are cached in Django's cache by (mid, orderid):
+terminal statuses (TXN_SUCCESS, TXN_FAILURE) for
+STATUS_CACHE_TERMINAL_TTL seconds, others such as PENDING only for
+STATUS_CACHE_TTL seconds as they are about to change. A callback that
+does not match a cached non terminal status is verified with PayTM
+again rather than rejected.
+
+Lookups of an order that is being fetched already are coalesced: they
+wait for the call in flight and share its response, or its error,
+instead of calling PayTM again. Coalescing is per process, the cache
+is shared by processes if Django's cache is.
+"""
+
+import threading
+
+from .conf import paytm_settings
+
+
+class Flight(object):
+    """
+    Status call in flight, awaited by coalesced lookups.
+    """
+
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self) -> dict:
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class StatusCache(object):
+    """
+    Caches responses of Transaction Status API and coalesces concurrent
+    calls for the same order. Arguments not provided are read from
+    PAYTM_SETTINGS.
+
+    Parameters
+    ----------
+    ttl: float | seconds to cache non terminal statuses for
+    terminal_ttl: float | seconds to cache TXN_SUCCESS & TXN_FAILURE for
+    """
+
+    def __init__(self, ttl: float = None, terminal_ttl: float = None):
+        def setting(value, name):
+            return paytm_settings(name) if value is None else value
+
+        self.ttl = setting(ttl, 'STATUS_CACHE_TTL')
+        self.terminal_ttl = setting(terminal_ttl, 'STATUS_CACHE_TERMINAL_TTL')
+        self.prefix = paytm_settings('STATUS_CACHE_KEY')
+        self._flights = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        from django.core.cache import cache
+
+        return cache
+
+    def key(self, mid: str, orderid: str) -> str:
+        return '%s:%s:%s' % (self.prefix, mid, orderid)
+
+    def timeout(self, result: dict) -> float:
+        from .variables import FAILED, SUCCESS
+
+        if result.get('STATUS') in (SUCCESS, FAILED):
+            return self.terminal_ttl
+        return self.ttl
+
+    def lookup(self, key: str):
+        from . import metrics
+
+        result = self.cache.get(key)
+        if result is not None:
+            metrics.increment('gateway.status_cache', result='hit')
+        return result
+
+    def store(self, key: str, result: dict):
+        from . import metrics
+
+        metrics.increment('gateway.status_cache', result='miss')
+        self.cache.set(key, result, timeout=self.timeout(result))
+
+    def get_or_fetch(self, mid: str, orderid: str, fetch) -> dict:
+        """
+        Provides cached status of an order, calling `fetch()` only if
+        it is neither cached nor being fetched by another thread.
+
+        Parameters
+        ----------
+        mid: str | Merchant ID
+        orderid: str | OrderID
+        fetch: callable | provides response of Transaction Status API
+
+        Returns
+        -------
+        dict: response of Transaction Status API
+
+        Raises
+        ------
+        StatusAPIError: raised by fetch(), to coalesced lookups as well.
+        """
+        from . import metrics
+
+        key = self.key(mid, orderid)
+        result = self.lookup(key)
+        if result is not None:
+            return result
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            metrics.increment('gateway.status_cache', result='coalesced')
+            return flight.wait()
+
+        try:
+            flight.result = fetch()
+            self.store(key, flight.result)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+
+    async def aget_or_fetch(self, mid: str, orderid: str, fetch) -> dict:
+        """
+        Asynchronous variant of get_or_fetch, coalescing lookups of the
+        running event loop. `fetch()` provides an awaitable.
+        """
+        import asyncio
+
+        from . import metrics
+
+        key = self.key(mid, orderid)
+        result = self.lookup(key)
+        if result is not None:
+            return result
+
+        future = self._futures.get(key)
+        if future is not None:
+            metrics.increment('gateway.status_cache', result='coalesced')
+            # A cancelled lookup must not cancel the shared call
+            return await asyncio.shield(future)
+
+        future = self._futures[key] = asyncio.get_running_loop(
+        ).create_future()
+        try:
+            result = await fetch()
+            self.store(key, result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Not logged as never retrieved if nobody else awaits it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._futures[key]
+
+    def invalidate(self, mid: str, orderid: str):
+        self.cache.delete(self.key(mid, orderid))
@@ -0,0 +1,102 @@
+"""
+Tasks of PayTM app that are run by background executors.
+"""
+
+
+def run_task(task: str, *args):
+    """
+    Imports task from its dotted path and runs it.
+    """
+    from django.utils.module_loading import import_string
+
+    return import_string(task)(*args)
+
+
+def run_task_in_thread(task: str, *args):
+    """
+    Runs task in a worker thread, closing stale database connections
+    of the thread before and after the task as Django does per request.
+    """
+    from django.db import close_old_connections
+
+    close_old_connections()
+    try:
+        return run_task(task, *args)
+    finally:
+        close_old_connections()
+
+
+try:
+    from celery import shared_task
+except ImportError:
+    pass
+else:
+    run_task_celery = shared_task(name='drf_paytm.run_task')(run_task)
+
+
+def verify_transaction_response(response_id: int) -> bool:
+    """
+    Verifies an unverified Transaction Response with PayTM Transaction
+    Status API. Marking it as verified fires payment_done if payment was
+    successful.
+
+    Parameters
+    ----------
+    response_id: int | primary key of TransactionResponse
+
+    Returns
+    -------
+    bool: True if response is verified
+    """
+    from django.db import transaction
+
+    from .models import TransactionResponse
+    from .paytmapi import validate_transaction_status
+
+    response = TransactionResponse.objects.get(pk=response_id)
+    if response.is_verified:
+        return True
+
+    if not validate_transaction_status(orderid=response.oid,
+                                       status=response.status,
+                                       txnid=response.tid or "",
+                                       mid=response.mid):
+        return False
+
+    with transaction.atomic():
+        # Reconciliation or another delivery of this task may verify the
+        # response meanwhile, only the one flipping the flag saves it so
+        # that payment_done & payment events are sent once.
+        if TransactionResponse.objects.filter(
+                pk=response_id, is_verified=False).update(is_verified=True):
+            response.is_verified = True
+            response.save(update_fields=['is_verified'])
+    return True
+
+
+def deliver_payment_done(response_ids: list):
+    """
+    Sends payment_done for a batch of Transaction Responses.
+
+    Parameters
+    ----------
+    response_ids: list | primary keys of TransactionResponse
+    """
+    from .dispatch import deliver
+
+    deliver(response_ids)
+
+
+def retry_payment_done(receiver: str, response_id: int, attempt: int):
+    """
+    Calls again a receiver of payment_done that failed.
+
+    Parameters
+    ----------
+    receiver: str | key of receiver, see dispatch.receiver_key()
+    response_id: int | primary key of TransactionResponse
+    attempt: int | number of retries already made
+    """
+    from .dispatch import retry
+
+    return retry(receiver, response_id, attempt)
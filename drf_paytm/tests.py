@@ -1,3 +1,1929 @@
-from django.test import TestCase
+import json
+import threading
 
-# Create your tests here.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib.util import find_spec
+from urllib.parse import urlencode
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from .models import PayTMConfiguration, TransactionRequest
+from .models import TransactionResponse
+from .registry import registry
+
+
+MERCHANT_KEY = "kbzk1DSbJiV_O3p5"
+
+
+class StubStatusServer(ThreadingHTTPServer):
+    """
+    Local stand-in for PayTM Transaction Status API, and for webhook
+    endpoints. Replies with queued (status code, body) tuples, falling
+    back to `responder(payload)` if set or to `default`, and records
+    posted payloads, their headers & raw bodies.
+    """
+
+    def __init__(self, default=(200, {}), responder=None):
+        self.default = default
+        self.responder = responder
+        self.replies = []
+        self.payloads = []
+        self.requests = []
+        self.delay = 0
+        super(StubStatusServer, self).__init__(('127.0.0.1', 0),
+                                               StubStatusHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/status' % self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StubStatusHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        import time
+
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        payload = json.loads(body)
+        self.server.payloads.append(payload)
+        self.server.requests.append((self.headers, body.decode()))
+        time.sleep(self.server.delay)
+        if self.server.replies:
+            code, body = self.server.replies.pop(0)
+        elif self.server.responder:
+            code, body = self.server.responder(payload)
+        else:
+            code, body = self.server.default
+        body = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PayTMTestCase(TestCase):
+    """
+    Provides a user, an authenticated API client and an active PayTM
+    Configuration to every test.
+    """
+
+    def setUp(self):
+        # Test transactions are rolled back without post_delete signal.
+        registry.invalidate()
+        self.user = get_user_model().objects.create_user(
+            username='customer', password='password')
+        self.config = PayTMConfiguration.objects.create(
+            mid='MERCHANT0001', mkey=MERCHANT_KEY, is_active=True,
+            company_name='Company', created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def seed_requests(self, count, prefix='SEED', responses=True):
+        """
+        Bulk creates Transaction Requests, each with a failed and a
+        successful Transaction Response unless responses is False,
+        bypassing checksum generation.
+        """
+        from .variables import FAILED, SUCCESS
+
+        TransactionRequest.objects.bulk_create([
+            TransactionRequest(
+                mid=self.config.mid, oid='%s%d' % (prefix, i),
+                amount='100.00', checksum='-', created_by=self.user,
+                callback_url='https://example.com/done/')
+            for i in range(count)])
+        requests = list(TransactionRequest.objects.filter(
+            oid__startswith=prefix).order_by('pk'))
+        if not responses:
+            return requests
+        TransactionResponse.objects.bulk_create([
+            TransactionResponse(mid=self.config.mid, oid=request.oid,
+                                tid='%s%s' % (status, request.oid),
+                                amount='100.00', status=status, code='01',
+                                message='-', checksum='-',
+                                raw_response='{}')
+            for request in requests for status in (FAILED, SUCCESS)])
+        TransactionRequest.objects.filter(
+            oid__startswith=prefix).refresh_payment_state()
+        return requests
+
+    def commit(self, func, *args, **kwargs):
+        """
+        Calls func and runs on_commit callbacks it registers, including
+        those registered by the callbacks, as if test transaction
+        committed.
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            result = func(*args, **kwargs)
+        while callbacks:
+            with self.captureOnCommitCallbacks() as added:
+                for callback in callbacks:
+                    callback()
+            callbacks = added
+        return result
+
+    def create_request(self, oid, amount='100.00'):
+        return self.client.post(
+            reverse('drf_paytm:list-add-transaction-request'),
+            {'oid': oid, 'amount': amount,
+             'callback_url': 'https://example.com/done/'}, format='json')
+
+
+class ConfigurationRegistryTest(PayTMTestCase):
+
+    def test_configuration_loaded_once(self):
+        with self.assertNumQueries(1):
+            for _ in range(10):
+                self.assertEqual(registry.get_active(), self.config)
+                self.assertEqual(registry.get_by_mid(self.config.mid),
+                                 self.config)
+                self.assertEqual(registry.get_key(self.config.mid),
+                                 MERCHANT_KEY)
+
+    def test_status_of_unknown_merchant(self):
+        from .models import PayTMConfiguration
+        from .paytmapi import validate_transaction_status
+
+        with self.assertRaises(PayTMConfiguration.DoesNotExist):
+            validate_transaction_status(orderid='ORDER1', status='-',
+                                        txnid='TXN1', mid='UNKNOWN')
+
+        other = PayTMConfiguration.objects.create(
+            mid='MERCHANT0002', mkey=MERCHANT_KEY, is_active=True,
+            created_by=self.user)
+        with self.assertRaises(PayTMConfiguration.MultipleObjectsReturned):
+            validate_transaction_status('ORDER1', '-', 'TXN1')
+        other.delete()
+
+    def test_invalidated_on_save_and_delete(self):
+        registry.get_active()
+        self.config.company_name = 'Other Company'
+        self.config.save()
+        self.assertEqual(registry.get_active().company_name, 'Other Company')
+
+        self.config.delete()
+        with self.assertRaises(PayTMConfiguration.DoesNotExist):
+            registry.get_active()
+
+    def test_query_count_flat_across_requests(self):
+        from .serializers import (TransactionRequestSerializer,
+                                  TransactionResponseSerializer)
+        from .utils import generate_payment_page
+
+        registry.get_active()
+        # Only the uniqueness check of oid is left, one per request.
+        with self.assertNumQueries(10):
+            for i in range(10):
+                serializer = TransactionRequestSerializer(data={
+                    'oid': 'ORDER%d' % i, 'amount': '100.00',
+                    'callback_url': 'https://example.com/done/'})
+                self.assertTrue(serializer.is_valid(), serializer.errors)
+                TransactionResponseSerializer().validate_MID(self.config.mid)
+                generate_payment_page({'MID': self.config.mid})
+
+
+def tenant_of(request):
+    return request.user.username
+
+
+class RoutingTest(PayTMTestCase):
+
+    def setUp(self):
+        super(RoutingTest, self).setUp()
+        self.other = PayTMConfiguration.objects.create(
+            mid='MERCHANT0002', mkey='kbzk1DSbJiV_O3p6', is_active=True,
+            weight=2, company_name='Other', created_by=self.user)
+
+    def routed(self, *amounts):
+        mids = []
+        for amount in amounts:
+            response = self.create_request(
+                oid='ROUTE%d' % TransactionRequest.objects.count(),
+                amount=amount)
+            self.assertEqual(response.status_code, 201, response.data)
+            mids.append(response.data['MID'])
+        return mids
+
+    def test_weighted_round_robin(self):
+        from .utils import verify_checksum
+
+        mids = self.routed(*['100.00'] * 6)
+        self.assertEqual(mids, ['MERCHANT0002', 'MERCHANT0001',
+                                'MERCHANT0002'] * 2)
+        # Requests are signed with key of their merchant
+        response = self.create_request(oid='SIGNED')
+        params = {key: str(value) for key, value in response.data.items()
+                  if key.isupper() and value is not None}
+        params['CALLBACK_URL'] = response.data['paytm_callback_url']
+        self.assertTrue(verify_checksum(params, registry.get_key(
+            params['MID']), params['CHECKSUMHASH']))
+
+        self.other.is_active = False
+        self.other.save()
+        self.assertEqual(set(self.routed('1.00', '2.00')), {'MERCHANT0001'})
+
+    @override_settings(PAYTM_SETTINGS={
+        'ROUTING_STRATEGY': 'drf_paytm.routing.AmountBandStrategy',
+        'ROUTING_STRATEGY_OPTIONS': {'bands': [
+            (500, 'MERCHANT0001'), (None, 'MERCHANT0002')]}})
+    def test_amount_bands(self):
+        self.assertEqual(self.routed('100.00', '500.00', '500.01'),
+                         ['MERCHANT0001', 'MERCHANT0001', 'MERCHANT0002'])
+
+    @override_settings(PAYTM_SETTINGS={
+        'ROUTING_STRATEGY': 'drf_paytm.routing.TenantStrategy',
+        'ROUTING_STRATEGY_OPTIONS': {
+            'tenants': {'customer': 'MERCHANT0001'},
+            'resolver': 'drf_paytm.tests.tenant_of'}})
+    def test_tenants(self):
+        self.assertEqual(set(self.routed('100.00', '100.00', '100.00')),
+                         {'MERCHANT0001'})
+
+        # Inactive merchants are never routed to
+        self.config.is_active = False
+        self.config.save()
+        self.assertEqual(set(self.routed('100.00')), {'MERCHANT0002'})
+
+        self.other.is_active = False
+        self.other.save()
+        response = self.create_request(oid='NOWHERE')
+        self.assertEqual(response.status_code, 500)
+
+
+class TransactionRequestListTest(PayTMTestCase):
+
+    def list_requests(self, url=None, **params):
+        response = self.client.get(
+            url or reverse('drf_paytm:list-add-transaction-request'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_query_count_independent_of_rows(self):
+        self.seed_requests(1, prefix='FIRST')
+        registry.get_active()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.list_requests()), 1)
+
+        self.seed_requests(20)
+        with self.assertNumQueries(1):
+            data = self.list_requests()
+        self.assertEqual(len(data), 21)
+        self.assertTrue(all(row['is_completed'] for row in data))
+        self.assertEqual({row['last_payment_status'] for row in data},
+                         {'Success'})
+
+    def test_cursor_pagination(self):
+        self.seed_requests(7)
+        registry.get_active()
+        url, oids = reverse('drf_paytm:list-add-transaction-request'), []
+        url += '?page_size=3'
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            oids.extend(row['ORDER_ID'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(oids, ['SEED%d' % i for i in range(6, -1, -1)])
+
+    def test_filters(self):
+        from .variables import FAILED
+
+        self.seed_requests(3)
+        self.seed_requests(2, prefix='OPEN', responses=False)
+        TransactionRequest.objects.filter(oid='SEED0').update(amount=5)
+
+        self.assertEqual(len(self.list_requests(completed='false')), 2)
+        self.assertEqual(len(self.list_requests(status='TXN_SUCCESS')), 3)
+        self.assertEqual(len(self.list_requests(status=FAILED)), 0)
+        self.assertEqual([row['ORDER_ID'] for row in self.list_requests(
+            max_amount='10')], ['SEED0'])
+
+    def test_response_listing(self):
+        from .variables import FAILED, SUCCESS
+
+        requests = self.seed_requests(2)
+        TransactionResponse.objects.filter(oid=requests[0].oid).update(
+            t_request=requests[0])
+        other = get_user_model().objects.create_user(username='other')
+        TransactionRequest.objects.filter(pk=requests[1].pk).update(
+            created_by=other)
+        TransactionResponse.objects.filter(oid=requests[1].oid).update(
+            t_request=requests[1])
+
+        url = reverse('drf_paytm:list-transaction-response')
+        rows = self.list_requests(url)
+        self.assertEqual([row['ORDERID'] for row in rows], ['SEED0'] * 2)
+        self.assertEqual([row['STATUS'] for row in rows], [SUCCESS, FAILED])
+        self.assertEqual(len(self.list_requests(url, status=SUCCESS)), 1)
+
+    def test_payment_state_matches_refresh(self):
+        from .variables import FAILED, PENDING, SUCCESS
+
+        request = self.seed_requests(1, prefix='STATE', responses=False)[0]
+        self.assertFalse(request.is_completed)
+
+        for tid, status, verified in (('S1', PENDING, True),
+                                      ('S2', SUCCESS, False),
+                                      ('S3', FAILED, True),
+                                      ('S4', SUCCESS, False)):
+            TransactionResponse.objects.create(
+                mid=self.config.mid, oid=request.oid, tid=tid, amount='1.00',
+                status=status, code='01', message='-', raw_response='{}',
+                is_verified=verified, t_request=request)
+            if tid == 'S2':
+                # An unverified success is not reported until confirmed
+                request.refresh_from_db()
+                self.assertEqual(request.last_payment_status, 'Pending')
+        request.refresh_from_db()
+        self.assertEqual(request.last_payment_status, 'Failed')
+        self.assertEqual(request.latest_response.tid, 'S3')
+        self.assertIsNone(request.completed_at)
+
+        # Verifying an older response does not make it the latest one
+        late = TransactionResponse.objects.get(tid='S2')
+        late.is_verified = True
+        late.save(update_fields=['is_verified'])
+        request.refresh_from_db()
+        self.assertTrue(request.is_completed)
+        self.assertEqual(request.latest_response.tid, 'S3')
+
+        state = (request.payment_status, request.latest_response_id)
+        TransactionRequest.objects.filter(pk=request.pk).update(
+            payment_status=None, latest_response=None, completed_at=None)
+        TransactionRequest.objects.filter(
+            pk=request.pk).refresh_payment_state()
+        request.refresh_from_db()
+        self.assertEqual((request.payment_status,
+                          request.latest_response_id), state)
+        self.assertTrue(request.is_completed)
+
+    def test_retrieve_is_single_query(self):
+        request = self.seed_requests(1, prefix='ONE')[0]
+        registry.get_active()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse(
+                'drf_paytm:retrieve-transaction-request',
+                kwargs={'oid': request.oid}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_completed'])
+
+
+class StatusClientTest(TestCase):
+
+    def setUp(self):
+        self.server = StubStatusServer(default=(200, {
+            'STATUS': 'TXN_SUCCESS', 'TXNID': 'TXN1', 'ORDERID': 'ORDER1'}))
+        self.addCleanup(self.server.stop)
+        self.payload = {'ORDERID': 'ORDER1', 'MID': 'MERCHANT0001',
+                        'CHECKSUMHASH': 'checksum'}
+
+    def get_client(self, **kwargs):
+        from .paytmapi import StatusClient
+
+        kwargs.setdefault('backoff', 0)
+        client = StatusClient(**kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_fetch(self):
+        client = self.get_client()
+        for _ in range(3):
+            result = client.fetch(self.server.url, self.payload)
+            self.assertEqual(result['STATUS'], 'TXN_SUCCESS')
+        self.assertEqual(self.server.payloads, [self.payload] * 3)
+
+    def test_retries_server_errors(self):
+        self.server.replies = [(500, {}), (503, {})]
+        result = self.get_client(retries=2).fetch(self.server.url,
+                                                  self.payload)
+        self.assertEqual(result['TXNID'], 'TXN1')
+        self.assertEqual(len(self.server.payloads), 3)
+
+    def test_gives_up(self):
+        from .paytmapi import StatusAPIError
+
+        self.server.replies = [(500, {}), (500, {})]
+        with self.assertRaises(StatusAPIError):
+            self.get_client(retries=1).fetch(self.server.url, self.payload)
+
+        self.server.replies = [(400, {})]
+        with self.assertRaises(StatusAPIError):
+            self.get_client(retries=3).fetch(self.server.url, self.payload)
+        self.assertEqual(len(self.server.payloads), 3)
+
+    def test_read_timeout(self):
+        from .paytmapi import StatusAPIError
+
+        self.server.delay = 0.5
+        with self.assertRaises(StatusAPIError):
+            self.get_client(read_timeout=0.1, retries=0).fetch(
+                self.server.url, self.payload)
+
+    @skipUnless(find_spec('httpx'), "httpx is not installed")
+    def test_async_fetch(self):
+        import asyncio
+
+        from .paytmapi import AsyncStatusClient
+
+        async def fetch_all():
+            client = AsyncStatusClient(backoff=0)
+            try:
+                return await asyncio.gather(*[
+                    client.fetch(self.server.url, self.payload)
+                    for _ in range(5)])
+            finally:
+                await client.close()
+
+        self.server.replies = [(502, {})]
+        results = asyncio.run(fetch_all())
+        self.assertEqual([r['STATUS'] for r in results], ['TXN_SUCCESS'] * 5)
+        self.assertEqual(len(self.server.payloads), 6)
+
+
+@override_settings(PAYTM_SETTINGS={'STATUS_BREAKER_MIN_CALLS': 2,
+                                   'STATUS_BREAKER_FAILURE_RATE': 0.6})
+class CircuitBreakerTest(TestCase):
+
+    def setUp(self):
+        from .breaker import get_breaker
+
+        self.server = StubStatusServer(default=(200, {
+            'STATUS': 'TXN_SUCCESS', 'TXNID': 'TXN1', 'ORDERID': 'ORDER1'}))
+        self.addCleanup(self.server.stop)
+        self.payload = {'ORDERID': 'ORDER1', 'MID': 'MERCHANT0001',
+                        'CHECKSUMHASH': 'checksum'}
+        self.breaker = get_breaker(self.server.url)
+        self.addCleanup(self.breaker.reset)
+
+    def get_client(self):
+        from .paytmapi import StatusClient
+
+        client = StatusClient(retries=0, breaker=True)
+        self.addCleanup(client.close)
+        return client
+
+    def test_opens_on_failures(self):
+        from .breaker import OPEN, CircuitOpen
+        from .paytmapi import StatusAPIError
+
+        client = self.get_client()
+        self.server.replies = [(400, {}), (500, {})]
+        for _ in range(2):
+            with self.assertRaises(StatusAPIError):
+                client.fetch(self.server.url, self.payload)
+        # A client error means the gateway is up
+        self.assertEqual(self.breaker.counts(), (2, 1))
+
+        self.server.replies = [(502, {})]
+        with self.assertLogs('drf_paytm.breaker', 'WARNING'), \
+                self.assertRaises(StatusAPIError):
+            client.fetch(self.server.url, self.payload)
+        self.assertEqual(self.breaker.state(), OPEN)
+        with self.assertRaises(CircuitOpen):
+            client.fetch(self.server.url, self.payload)
+        self.assertEqual(len(self.server.payloads), 3)
+
+    def test_half_open_probe(self):
+        import time
+
+        from .breaker import CLOSED, HALF_OPEN, OPEN, CircuitOpen
+        from .paytmapi import StatusAPIError
+
+        client = self.get_client()
+        with self.assertLogs('drf_paytm.breaker'):
+            self.breaker.open(now=time.time() - self.breaker.reset_timeout)
+        self.assertEqual(self.breaker.state(), HALF_OPEN)
+
+        # Only one probe is let through at a time
+        probe = self.breaker.before()
+        self.assertTrue(probe)
+        with self.assertRaises(CircuitOpen):
+            client.fetch(self.server.url, self.payload)
+        with self.assertLogs('drf_paytm.breaker'):
+            self.breaker.record(False, probe)
+        self.assertEqual(self.breaker.state(), OPEN)
+
+        self.server.replies = [(500, {})]
+        with self.assertLogs('drf_paytm.breaker') as logs:
+            self.breaker.open(now=time.time() - self.breaker.reset_timeout)
+            with self.assertRaises(StatusAPIError):
+                client.fetch(self.server.url, self.payload)
+            self.assertEqual(self.breaker.state(), OPEN)
+
+            self.breaker.open(now=time.time() - self.breaker.reset_timeout)
+            client.fetch(self.server.url, self.payload)
+        self.assertIn('closed', logs.output[-1])
+        self.assertEqual(self.breaker.state(), CLOSED)
+        self.assertEqual(self.breaker.counts(), (0, 0))
+
+
+class StatusCacheTest(TestCase):
+
+    def setUp(self):
+        from .paytmapi import StatusClient
+
+        self.server = StubStatusServer(default=(200, {
+            'STATUS': 'TXN_SUCCESS', 'TXNID': 'TXN1', 'ORDERID': 'ORDER1'}))
+        self.addCleanup(self.server.stop)
+        self.config = PayTMConfiguration(mid='MERCHANT0001',
+                                         mkey=MERCHANT_KEY,
+                                         status_url=self.server.url)
+        self.client = StatusClient(retries=0, cache=True)
+        self.addCleanup(self.client.close)
+        self.addCleanup(self.client.cache.invalidate, self.config.mid,
+                        'ORDER1')
+
+    def test_coalesces_lookups(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.server.delay = 0.2
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda _: self.client.get_status(self.config, 'ORDER1'),
+                range(8)))
+        self.assertEqual([r['TXNID'] for r in results], ['TXN1'] * 8)
+        self.assertEqual(len(self.server.payloads), 1)
+
+        self.client.verify(self.config, 'ORDER1', 'TXN_SUCCESS', 'TXN1')
+        self.assertEqual(len(self.server.payloads), 1)
+
+    def test_ttl_by_status(self):
+        from .paytmapi import StatusAPIError
+
+        cache = self.client.cache
+        self.assertEqual(cache.timeout({'STATUS': 'PENDING'}), cache.ttl)
+        self.assertEqual(cache.timeout({'STATUS': 'TXN_FAILURE'}),
+                         cache.terminal_ttl)
+        self.assertLess(cache.ttl, cache.terminal_ttl)
+
+        # Failures are not cached
+        self.server.replies = [(500, {})]
+        with self.assertRaises(StatusAPIError):
+            self.client.get_status(self.config, 'ORDER1')
+        self.client.get_status(self.config, 'ORDER1')
+        self.assertEqual(len(self.server.payloads), 2)
+
+    def test_outdated_pending(self):
+        pending = (200, {'STATUS': 'PENDING', 'TXNID': 'TXN1',
+                         'ORDERID': 'ORDER1'})
+        self.server.replies = [pending]
+        self.assertEqual(self.client.get_status(self.config, 'ORDER1')[
+            'STATUS'], 'PENDING')
+        # Callback of the completed payment is checked again with PayTM
+        self.assertTrue(self.client.verify(self.config, 'ORDER1',
+                                           'TXN_SUCCESS', 'TXN1'))
+        self.assertEqual(len(self.server.payloads), 2)
+        # Terminal statuses are not asked for again
+        self.assertFalse(self.client.verify(self.config, 'ORDER1',
+                                            'TXN_FAILURE', 'TXN1'))
+        self.assertEqual(len(self.server.payloads), 2)
+
+    @skipUnless(find_spec('httpx'), "httpx is not installed")
+    def test_async_outdated_pending(self):
+        import asyncio
+
+        from .paytmapi import AsyncStatusClient
+
+        async def verify():
+            client = AsyncStatusClient(retries=0, cache=True)
+            try:
+                await client.get_status(self.config, 'ORDER1')
+                return await client.verify(self.config, 'ORDER1',
+                                           'TXN_SUCCESS', 'TXN1')
+            finally:
+                await client.close()
+
+        self.server.replies = [(200, {'STATUS': 'PENDING', 'TXNID': 'TXN1',
+                                      'ORDERID': 'ORDER1'})]
+        self.assertTrue(asyncio.run(verify()))
+        self.assertEqual(len(self.server.payloads), 2)
+
+    @skipUnless(find_spec('httpx'), "httpx is not installed")
+    def test_async_coalesces_lookups(self):
+        import asyncio
+
+        from .paytmapi import AsyncStatusClient
+
+        async def get_all():
+            client = AsyncStatusClient(retries=0, cache=True)
+            try:
+                return await asyncio.gather(*[
+                    client.get_status(self.config, 'ORDER1')
+                    for _ in range(5)])
+            finally:
+                await client.close()
+
+        self.server.delay = 0.1
+        results = asyncio.run(get_all())
+        self.assertEqual([r['TXNID'] for r in results], ['TXN1'] * 5)
+        self.assertEqual(len(self.server.payloads), 1)
+
+
+class DeferredVerificationTest(PayTMTestCase):
+
+    callback_view = 'drf_paytm:list-add-transaction-response'
+
+    def setUp(self):
+        from .signals import payment_done
+
+        super(DeferredVerificationTest, self).setUp()
+        self.request = self.seed_requests(1, prefix='DEFER')[0]
+        self.paid = []
+        payment_done.connect(self.on_payment_done)
+        self.addCleanup(payment_done.disconnect, self.on_payment_done)
+
+    def on_payment_done(self, instance, **kwargs):
+        self.paid.append(instance.pk)
+
+    def post_callback(self, **data):
+        """
+        Posts a callback, signed unless CHECKSUMHASH is provided. A
+        CHECKSUMHASH of None leaves it out.
+        """
+        from .utils import generate_checksum
+        from .variables import SUCCESS
+
+        callback = {'MID': self.config.mid, 'TXNID': 'DEFERRED1',
+                    'ORDERID': self.request.oid, 'BANKTXNID': '',
+                    'TXNAMOUNT': '100.00', 'STATUS': SUCCESS,
+                    'RESPCODE': '01', 'RESPMSG': 'Txn Success'}
+        callback.update(data)
+        if 'CHECKSUMHASH' not in callback:
+            callback['CHECKSUMHASH'] = generate_checksum(callback,
+                                                         MERCHANT_KEY)
+        elif callback['CHECKSUMHASH'] is None:
+            del callback['CHECKSUMHASH']
+        return self.client.post(
+            reverse(self.callback_view),
+            urlencode(callback),
+            content_type='application/x-www-form-urlencoded')
+
+    @override_settings(PAYTM_SETTINGS={'DEFER_STATUS_VERIFICATION': True})
+    def test_rejects_unsigned_callback(self):
+        for checksum in (None, 'forged'):
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.post_callback(CHECKSUMHASH=checksum)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(callbacks, [])
+        self.assertFalse(TransactionResponse.objects.filter(
+            tid='DEFERRED1').exists())
+
+    @override_settings(PAYTM_SETTINGS={'DEFER_STATUS_VERIFICATION': True})
+    def test_redirects_before_verification(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.post_callback()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(callbacks), 1)
+
+        instance = TransactionResponse.objects.get(tid='DEFERRED1')
+        self.assertFalse(instance.is_verified)
+        self.assertEqual(self.paid, [])
+
+        instance.is_verified = True
+        self.commit(instance.save, update_fields=['is_verified'])
+        self.commit(instance.save)
+        self.assertEqual(self.paid, [instance.pk])
+
+
+    def test_verified_once(self):
+        from unittest import mock
+
+        from .tasks import verify_transaction_response
+        from .variables import SUCCESS
+
+        instance = self.commit(
+            TransactionResponse.objects.create, mid=self.config.mid,
+            oid=self.request.oid, tid='RACE1', amount='100.00',
+            status=SUCCESS, code='01', message='-', checksum='-',
+            raw_response='{}', is_verified=False)
+
+        def verified_meanwhile(**kwargs):
+            # As reconciliation or another task delivery would
+            TransactionResponse.objects.filter(pk=instance.pk).update(
+                is_verified=True)
+            return True
+
+        with mock.patch('drf_paytm.paytmapi.validate_transaction_status',
+                        side_effect=verified_meanwhile):
+            self.assertTrue(self.commit(verify_transaction_response,
+                                        instance.pk))
+        self.assertEqual(self.paid, [])
+
+        TransactionResponse.objects.filter(pk=instance.pk).update(
+            is_verified=False)
+        with mock.patch('drf_paytm.paytmapi.validate_transaction_status',
+                        return_value=True):
+            for _ in range(2):
+                self.commit(verify_transaction_response, instance.pk)
+        self.assertEqual(self.paid, [instance.pk])
+
+
+@override_settings(PAYTM_SETTINGS={
+    'DISPATCH_RETRIES': 2, 'DISPATCH_BACKOFF': 0,
+    'BACKGROUND_EXECUTOR': 'drf_paytm.executors.SyncExecutor'})
+class DispatchTest(DeferredVerificationTest):
+
+    def setUp(self):
+        from . import executors
+
+        super(DispatchTest, self).setUp()
+        executors._executor = None
+        self.addCleanup(setattr, executors, '_executor', None)
+
+    def create_response(self, tid):
+        from .variables import SUCCESS
+
+        return TransactionResponse.objects.create(
+            mid=self.config.mid, oid=self.request.oid, tid=tid,
+            amount='100.00', status=SUCCESS, code='01', message='-',
+            checksum='-', raw_response='{}', is_verified=True)
+
+    def test_sent_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            instance = self.create_response('DISPATCH1')
+        self.assertEqual(self.paid, [])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.paid, [instance.pk])
+
+    def test_retries_failing_receiver(self):
+        from .dispatch import receiver_name, receiver_stats, stats
+        from .signals import payment_done
+
+        calls = []
+
+        def flaky(instance, **kwargs):
+            calls.append(instance.pk)
+            if len(calls) < 3:
+                raise RuntimeError("Receiver is down.")
+
+        payment_done.connect(flaky)
+        self.addCleanup(payment_done.disconnect, flaky)
+        stats.reset()
+        with self.assertLogs('drf_paytm.dispatch', 'ERROR') as logs:
+            instance = self.commit(self.create_response, 'DISPATCH1')
+        self.assertEqual(len(logs.output), 2)
+
+        # Only failing receiver is called again
+        self.assertEqual(calls, [instance.pk] * 3)
+        self.assertEqual(self.paid, [instance.pk])
+        timings = receiver_stats()
+        self.assertEqual(timings[receiver_name(flaky)]['errors'], 2)
+        self.assertEqual(
+            timings[receiver_name(self.on_payment_done)]['calls'], 1)
+
+    def test_retries_in_background(self):
+        from unittest import mock
+
+        from . import executors
+        from .dispatch import receiver_name
+        from .signals import payment_done
+
+        def failing(instance, **kwargs):
+            raise RuntimeError("Receiver is down.")
+
+        payment_done.connect(failing)
+        self.addCleanup(payment_done.disconnect, failing)
+        executor = mock.Mock()
+        with mock.patch.object(executors, '_executor', executor), \
+                mock.patch('time.sleep') as sleep, \
+                self.assertLogs('drf_paytm.dispatch', 'ERROR'):
+            instance = self.commit(self.create_response, 'DISPATCH1')
+
+        sleep.assert_not_called()
+        executor.submit.assert_called_once_with(
+            'drf_paytm.tasks.retry_payment_done', receiver_name(failing),
+            instance.pk, 0)
+        self.assertEqual(self.paid, [instance.pk])
+
+    def test_retries_same_named_receiver(self):
+        from .signals import payment_done
+
+        class Hook(object):
+            def __init__(self, failures):
+                self.failures, self.calls = failures, 0
+
+            def on_paid(self, **kwargs):
+                self.calls += 1
+                if self.calls <= self.failures:
+                    raise RuntimeError("Receiver is down.")
+
+        hooks = [Hook(0), Hook(1)]
+        for hook in hooks:
+            payment_done.connect(hook.on_paid)
+            self.addCleanup(payment_done.disconnect, hook.on_paid)
+        with self.assertLogs('drf_paytm.dispatch', 'ERROR'):
+            self.commit(self.create_response, 'DISPATCH1')
+        self.assertEqual([hook.calls for hook in hooks], [1, 2])
+
+    def test_receivers_of_signal(self):
+        from .dispatch import live_receivers
+        from .signals import payment_done
+
+        def receiver(**kwargs):
+            pass
+
+        payment_done.connect(receiver, sender=TransactionResponse)
+        self.assertIn(receiver, live_receivers(TransactionResponse))
+        self.assertNotIn(receiver, live_receivers(object))
+        payment_done.disconnect(receiver, sender=TransactionResponse)
+        self.assertNotIn(receiver, live_receivers(TransactionResponse))
+
+    @override_settings(PAYTM_SETTINGS={
+        'PAYMENT_DONE_DISPATCH': 'executor', 'DISPATCH_BATCH_SIZE': 2,
+        'BACKGROUND_EXECUTOR': 'drf_paytm.executors.SyncExecutor'})
+    def test_executor_batches(self):
+        from unittest import mock
+
+        from . import dispatch
+
+        batcher = dispatch.Batcher(batch_size=2, linger=0)
+        # Batches are flushed below instead of by the thread
+        batcher._thread = True
+
+        with mock.patch.object(dispatch, '_batcher', batcher), \
+                mock.patch.object(dispatch, 'deliver',
+                                  wraps=dispatch.deliver) as deliver:
+            pks = [self.commit(self.create_response, 'DISPATCH%d' % i).pk
+                   for i in range(3)]
+            self.assertEqual(self.paid, [])
+            batcher.flush()
+
+        self.assertEqual([call.args[0] for call in deliver.call_args_list],
+                         [pks[:2], pks[2:]])
+        self.assertEqual(self.paid, pks)
+
+
+@override_settings(PAYTM_SETTINGS={'OUTBOX_ENABLED': True})
+class OutboxTest(PayTMTestCase):
+
+    def create_response(self, tid, status, is_verified=True):
+        return TransactionResponse.objects.create(
+            mid=self.config.mid, oid='OUTBOX', tid=tid, amount='100.00',
+            status=status, code='01', message='-', checksum='-',
+            raw_response='{}', is_verified=is_verified)
+
+    def test_written_with_response(self):
+        from django.db import transaction
+
+        from .models import PaymentEvent
+        from .variables import FAILED, PAYMENT_FAILURE, PAYMENT_SUCCESS
+        from .variables import PENDING, SUCCESS
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.create_response('ROLLBACK', SUCCESS)
+            raise RuntimeError
+        self.assertFalse(PaymentEvent.objects.exists())
+
+        success = self.create_response('SUCCESS', SUCCESS, is_verified=False)
+        self.create_response('PENDING', PENDING)
+        failure = self.create_response('FAILURE', FAILED)
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+        success.is_verified = True
+        success.save(update_fields=['is_verified'])
+        success.save(update_fields=['is_verified'])
+        self.assertEqual(sorted(PaymentEvent.objects.values_list(
+            'response', 'event_type')), [(success.pk, PAYMENT_SUCCESS),
+                                         (failure.pk, PAYMENT_FAILURE)])
+
+    def test_relay(self):
+        from .models import PaymentEvent
+        from .outbox import Relay
+        from .sinks import BaseSink, QueueSink, SinkError
+        from .variables import SUCCESS
+
+        class DownSink(BaseSink):
+            def publish(self, events):
+                raise SinkError("Sink is down.")
+
+        pks = [self.create_response('TXN%d' % i, SUCCESS).pk
+               for i in range(5)]
+        with self.assertLogs('drf_paytm.outbox', 'ERROR'):
+            stats = Relay(sink=DownSink(), batch_size=2).run(limit=1)
+        self.assertEqual(stats['failed'], 2)
+        self.assertEqual(PaymentEvent.objects.filter(
+            attempts=1, last_error="Sink is down.").count(), 2)
+
+        sink = QueueSink(name='outbox_test')
+        relay = Relay(sink=sink, batch_size=2)
+        # Per batch: lock & read, mark as published, all in a savepoint
+        # under test transaction, and a last read of the drained outbox
+        with self.assertNumQueries(3 * 4 + 3):
+            stats = relay.run(once=True)
+        self.assertEqual((stats['published'], stats['batches']), (5, 3))
+        messages = [sink.queue.get_nowait() for _ in range(5)]
+        self.assertEqual([message['data']['response_id']
+                          for message in messages], pks)
+        self.assertFalse(PaymentEvent.objects.filter(
+            published_at__isnull=True).exists())
+
+    def test_relay_command(self):
+        import os
+        import tempfile
+
+        from decimal import Decimal
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from .variables import PAYMENT_SUCCESS, SUCCESS
+
+        path = os.path.join(tempfile.mkdtemp(), 'events.ndjson')
+        self.addCleanup(os.remove, path)
+        self.create_response('TXN1', SUCCESS)
+        with self.settings(PAYTM_SETTINGS={
+                'OUTBOX_SINK': 'drf_paytm.sinks.FileSink',
+                'OUTBOX_SINK_OPTIONS': {'path': path}}):
+            call_command('paytm_outbox_relay', '--once', stdout=StringIO())
+        with open(path) as events:
+            lines = [json.loads(line) for line in events]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]['type'], PAYMENT_SUCCESS)
+        self.assertEqual(Decimal(lines[0]['data']['amount']), 100)
+
+
+    def test_fan_out(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from .models import WebhookDelivery, WebhookSubscription
+        from .sinks import FanOutSink, get_queue, get_sink
+        from .variables import PAYMENT_SUCCESS, SUCCESS
+
+        WebhookSubscription.objects.create(url='https://example.com/hook/',
+                                           created_by=self.user)
+        self.create_response('TXN1', SUCCESS)
+        with self.settings(PAYTM_SETTINGS={'OUTBOX_SINK': [
+                ('drf_paytm.sinks.QueueSink', {'name': 'fan_out_test'}),
+                'drf_paytm.webhooks.SubscriptionSink']}):
+            sink = get_sink()
+            call_command('paytm_outbox_relay', '--once', stdout=StringIO())
+        self.assertIsInstance(sink, FanOutSink)
+        self.assertEqual(get_queue('fan_out_test').get_nowait()['type'],
+                         PAYMENT_SUCCESS)
+        self.assertEqual(WebhookDelivery.objects.count(), 1)
+
+@override_settings(PAYTM_SETTINGS={'OUTBOX_ENABLED': True})
+class WebhookTest(PayTMTestCase):
+
+    create_response = OutboxTest.create_response
+
+    def setUp(self):
+        super(WebhookTest, self).setUp()
+        self.server = StubStatusServer()
+        self.addCleanup(self.server.stop)
+
+    def subscribe(self, **fields):
+        from .models import WebhookSubscription
+
+        return WebhookSubscription.objects.create(
+            url=self.server.url, created_by=self.user, **fields)
+
+    def deliver(self, count, **kwargs):
+        from .outbox import Relay
+        from .variables import SUCCESS
+        from .webhooks import SubscriptionSink, WebhookDeliverer
+
+        for i in range(count):
+            self.create_response('TXN%d' % i, SUCCESS)
+        Relay(sink=SubscriptionSink()).run(once=True)
+        deliverer = WebhookDeliverer(workers=4, backoff=0, **kwargs)
+        self.addCleanup(deliverer.close)
+        return deliverer, deliverer.run(once=True)
+
+    def test_signed_delivery(self):
+        from .models import WebhookDelivery
+        from .variables import DELIVERY_DONE, PAYMENT_SUCCESS
+        from .webhooks import CHECKSUM_HEADER, verify_signature
+
+        subscription = self.subscribe()
+        self.subscribe(event_types='payment.failure')
+        self.subscribe(is_active=False)
+
+        deliverer, stats = self.deliver(1)
+        self.assertEqual(stats['delivered'], 1)
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual(delivery.status, DELIVERY_DONE)
+        self.assertIsNotNone(delivery.latency)
+        self.assertGreater(deliverer.latency()['p99'], 0)
+
+        headers, body = self.server.requests[0]
+        self.assertTrue(verify_signature(body, subscription.secret,
+                                         headers[CHECKSUM_HEADER]))
+        self.assertFalse(verify_signature(body.replace('TXN0', 'TXN1'),
+                                          subscription.secret,
+                                          headers[CHECKSUM_HEADER]))
+        self.assertEqual(headers['X-PayTM-Event'], PAYMENT_SUCCESS)
+        self.assertEqual(headers['X-PayTM-Delivery'], str(delivery.pk))
+        self.assertEqual(self.server.payloads[0]['data']['tid'], 'TXN0')
+
+    def test_retry_and_dead_letter(self):
+        from .models import WebhookDelivery
+        from .variables import DELIVERY_DEAD, DELIVERY_DONE
+        from .webhooks import retry
+
+        self.subscribe()
+        self.server.default = (503, {})
+        with self.assertLogs('drf_paytm.webhooks', 'ERROR'):
+            _, stats = self.deliver(1, max_attempts=2)
+        self.assertEqual((stats['failed'], stats['dead']), (1, 1))
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual((delivery.status, delivery.attempts,
+                          delivery.response_code, delivery.last_error),
+                         (DELIVERY_DEAD, 2, 503, 'HTTP 503'))
+
+        self.server.default = (200, {})
+        self.assertEqual(retry(WebhookDelivery.objects.all()), 1)
+        _, stats = self.deliver(0)
+        self.assertEqual(stats['delivered'], 1)
+        self.assertEqual(WebhookDelivery.objects.get().status, DELIVERY_DONE)
+
+    def test_purge_keeps_undelivered(self):
+        import datetime
+
+        from django.utils import timezone
+
+        from .models import PaymentEvent, WebhookDelivery
+        from .outbox import purge
+        from .webhooks import retry
+
+        self.subscribe()
+        old = timezone.now() - datetime.timedelta(days=10)
+        self.server.default = (503, {})
+        with self.assertLogs('drf_paytm.webhooks', 'ERROR'):
+            self.deliver(1, max_attempts=1)
+        PaymentEvent.objects.update(published_at=old)
+        # Dead, then pending again
+        for _ in range(2):
+            self.assertEqual(purge(days=7), 0)
+            self.assertEqual(WebhookDelivery.objects.count(), 1)
+            retry(WebhookDelivery.objects.all())
+
+        self.server.default = (200, {})
+        self.deliver(0)
+        self.assertEqual(purge(days=7), 1)
+        self.assertFalse(WebhookDelivery.objects.exists())
+
+    def test_claimed_while_posting(self):
+        from unittest import mock
+
+        from .models import WebhookDelivery
+        from .webhooks import WebhookDeliverer
+
+        self.subscribe()
+        claimed = []
+        lanes = WebhookDeliverer.lanes
+        other = WebhookDeliverer(workers=1)
+        self.addCleanup(other.close)
+
+        def posting(deliveries):
+            # Right before posting: due to no other deliverer until the
+            # lease expires
+            claimed.append(other.due())
+            return lanes(deliveries)
+
+        with mock.patch.object(WebhookDeliverer, 'lanes',
+                               staticmethod(posting)):
+            _, stats = self.deliver(2, lease=60)
+        self.assertEqual(stats['delivered'], 2)
+        self.assertEqual(claimed, [[]])
+        self.assertEqual(WebhookDelivery.objects.filter(
+            delivered_at__isnull=False).count(), 2)
+
+    def test_concurrency_cap(self):
+        import time
+
+        self.subscribe(max_concurrency=1)
+        self.server.delay = 0.05
+        start = time.perf_counter()
+        _, stats = self.deliver(4)
+        self.assertEqual(stats['delivered'], 4)
+        # 4 workers, yet one request at a time to the endpoint
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+
+
+@override_settings(PAYTM_SETTINGS={'STATUS_RETRIES': 0})
+class ReconcileCommandTest(PayTMTestCase):
+
+    def respond(self, payload):
+        from .variables import PENDING, SUCCESS
+
+        number = int(payload['ORDERID'][len('RECON'):])
+        if number == 0:
+            return 500, {}
+        if number == 1:
+            return 200, {'STATUS': 'TXN_FAILURE', 'RESPCODE': '334',
+                         'RESPMSG': 'Invalid Order Id.'}
+        return 200, {'MID': self.config.mid, 'ORDERID': payload['ORDERID'],
+                     'TXNID': 'T' + payload['ORDERID'], 'TXNAMOUNT': '100.00',
+                     'STATUS': SUCCESS if number % 2 == 0 else PENDING,
+                     'RESPCODE': '01', 'RESPMSG': '-', 'BANKTXNID': '',
+                     'TXNDATE': '2019-06-13 16:43:12.0'}
+
+    def test_reconcile(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from .signals import payment_done
+        from .variables import PENDING, SUCCESS
+
+        server = StubStatusServer(responder=self.respond)
+        self.addCleanup(server.stop)
+        self.config.status_url = server.url
+        self.config.save()
+
+        requests = self.seed_requests(8, prefix='RECON', responses=False)
+        self.seed_requests(2, prefix='PAID')
+        TransactionResponse.objects.create(
+            mid=self.config.mid, oid='RECON2', tid='TRECON2', amount='100.00',
+            status=PENDING, code='400', message='-', raw_response='{}',
+            is_verified=False, t_request=requests[2])
+
+        paid = []
+        receiver = lambda instance, **kwargs: paid.append(instance.oid)
+        payment_done.connect(receiver)
+        self.addCleanup(payment_done.disconnect, receiver)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('paytm_reconcile', '--min-age', '0', '--rate', '0',
+                         '--workers', '4', '--chunk-size', '3', stdout=out)
+
+        self.assertIn('within the last 3 days, at least 0 minutes',
+                      out.getvalue())
+        self.assertIn('Checked 8 requests', out.getvalue())
+        self.assertIn('5 created, 1 updated', out.getvalue())
+        self.assertIn('1 skipped, 1 errors', out.getvalue())
+        self.assertEqual(len(server.payloads), 8)
+        self.assertEqual(sorted(paid), ['RECON2', 'RECON4', 'RECON6'])
+
+        updated = TransactionResponse.objects.get(tid='TRECON2')
+        self.assertEqual((updated.status, updated.is_verified),
+                         (SUCCESS, True))
+        created = TransactionResponse.objects.get(tid='TRECON3')
+        self.assertEqual((created.status, created.t_request_id),
+                         (PENDING, requests[3].pk))
+
+    def test_incomplete_result(self):
+        from unittest import mock
+
+        from .reconcile import Reconciler
+        from .variables import SUCCESS
+
+        self.seed_requests(2, prefix='PART', responses=False)
+        result = {'MID': self.config.mid, 'TXNAMOUNT': '100.00',
+                  'STATUS': SUCCESS, 'RESPCODE': '01', 'RESPMSG': '-'}
+        rows = list(TransactionRequest.objects.filter(
+            oid__startswith='PART').order_by('oid').values_list(
+            'pk', 'oid', 'mid'))
+        results = [(row, dict(result, ORDERID=row[1], TXNID='T' + row[1]))
+                   for row in rows]
+        del results[0][1]['TXNAMOUNT']
+
+        reconciler = Reconciler(client=mock.Mock())
+        with self.assertLogs('drf_paytm.reconcile', 'WARNING') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            reconciler.write(results)
+
+        self.assertIn('PART0 lacks amount', logs.output[0])
+        self.assertEqual((reconciler.stats['created'],
+                          reconciler.stats['errors']), (1, 1))
+        self.assertEqual(list(TransactionResponse.objects.filter(
+            oid__startswith='PART').values_list('oid', flat=True)),
+            ['PART1'])
+
+    def test_callback_races_create(self):
+        from unittest import mock
+
+        from .reconcile import Reconciler
+        from .signals import payment_done
+        from .variables import PENDING, SUCCESS
+
+        requests = self.seed_requests(3, prefix='RACE', responses=False)
+        result = {'MID': self.config.mid, 'TXNAMOUNT': '100.00',
+                  'STATUS': SUCCESS, 'RESPCODE': '01', 'RESPMSG': '-'}
+        results = [(row, dict(result, ORDERID=row[1], TXNID='T' + row[1]))
+                   for row in TransactionRequest.objects.filter(
+                       oid__startswith='RACE').values_list('pk', 'oid', 'mid')]
+
+        paid = []
+        receiver = lambda instance, **kwargs: paid.append(instance.oid)
+        payment_done.connect(receiver)
+        self.addCleanup(payment_done.disconnect, receiver)
+
+        reconciler = Reconciler(client=mock.Mock())
+        update = reconciler.update
+
+        def callback_meanwhile(existing, found):
+            # Saved by a callback once known responses were read
+            done = update(existing, found)
+            if not TransactionResponse.objects.filter(tid='TRACE1').exists():
+                TransactionResponse.objects.create(
+                    mid=self.config.mid, oid='RACE1', tid='TRACE1',
+                    amount='100.00', status=PENDING, code='400', message='-',
+                    raw_response='{}', is_verified=False,
+                    t_request=requests[1])
+            return done
+
+        with mock.patch.object(reconciler, 'update', callback_meanwhile), \
+                self.captureOnCommitCallbacks(execute=True):
+            reconciler.write(results)
+
+        self.assertEqual((reconciler.stats['created'],
+                          reconciler.stats['updated']), (2, 1))
+        self.assertEqual(sorted(paid), ['RACE0', 'RACE1', 'RACE2'])
+        self.assertTrue(TransactionResponse.objects.get(
+            tid='TRACE1').is_verified)
+
+
+class ExportTest(PayTMTestCase):
+
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        self.seed_requests(3)
+        self.user.is_staff = True
+        self.user.save()
+
+    def test_formats(self):
+        import csv
+
+        from .export import FIELDS, export
+
+        # Rows are read in one query, without model instances
+        with self.assertNumQueries(1):
+            lines = ''.join(export(fmt='csv', chunk_size=2))
+        table = list(csv.reader(lines.splitlines()))
+        self.assertEqual(tuple(table[0]), FIELDS)
+        self.assertEqual(len(table), 7)
+        self.assertEqual(table[1][FIELDS.index('amount')], '100.000')
+
+        lines = ''.join(export(fmt='ndjson')).splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(json.loads(lines[0])['oid'], 'SEED0')
+
+        with self.assertRaises(ValueError):
+            export(fmt='xml')
+
+    def test_formula_escaped(self):
+        import csv
+
+        from .export import FIELDS, export
+
+        TransactionResponse.objects.filter(oid='SEED0').update(
+            message='=HYPERLINK("https://example.com")', bank='-1+2')
+        table = list(csv.reader(''.join(export(fmt='csv')).splitlines()))
+        row = dict(zip(FIELDS, table[1]))
+        self.assertEqual(row['message'], '\'=HYPERLINK("https://example.com")')
+        self.assertEqual(row['bank'], "'-1+2")
+        self.assertEqual(row['amount'], '100.000')
+
+        # Only CSV is escaped
+        row = json.loads(''.join(export(fmt='ndjson')).splitlines()[0])
+        self.assertEqual(row['message'], '=HYPERLINK("https://example.com")')
+
+    def test_view(self):
+        from .variables import SUCCESS
+
+        url = reverse('drf_paytm:export-transaction-response')
+        response = self.client.get(url, {'type': 'ndjson',
+                                         'status': SUCCESS})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(
+            response.streaming_content).splitlines()]
+        self.assertEqual({row['status'] for row in rows}, {SUCCESS})
+        self.assertEqual(len(rows), 3)
+
+        self.assertEqual(self.client.get(url, {'type': 'xml'}).status_code,
+                         400)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_command_and_admin_action(self):
+        import os
+        import tempfile
+
+        from django.core.management import call_command
+
+        path = os.path.join(tempfile.mkdtemp(), 'export.csv')
+        self.addCleanup(os.remove, path)
+        call_command('paytm_export', '--output', path,
+                     '--status', 'TXN_FAILURE')
+        with open(path) as export:
+            self.assertEqual(len(export.readlines()), 4)
+
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('admin:drf_paytm_transactionresponse_changelist'),
+            {'action': 'export_csv', '_selected_action': list(
+                TransactionResponse.objects.values_list('pk', flat=True)[:2])})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(
+            response.streaming_content).splitlines()), 3)
+
+
+class SettlementTest(PayTMTestCase):
+
+    REPORT = (
+        "Order_ID,Transaction ID,Bank Transaction ID,Amount\n"
+        "SEED0,TXN_SUCCESSSEED0,,100.00\n"  # by tid
+        "SEED1,,,100\n"  # by oid, successful response wins
+        ",,BANK2,100.00\n"  # by bank transaction ID
+        "SEED3,TXN_SUCCESSSEED3,,99.00\n"  # amount mismatch
+        "SEED9,TXN9,,100.00\n"  # missing
+        "SEED0,TXN_SUCCESSSEED0,,100.00\n"  # duplicate
+        ",TXN_FAILURESEED4,,100.00\n"  # not successful
+    )
+
+    def setUp(self):
+        super(SettlementTest, self).setUp()
+        self.seed_requests(5)
+        TransactionResponse.objects.filter(tid='TXN_SUCCESSSEED2').update(
+            bnkid='BANK2')
+
+    def test_reconcile(self):
+        from io import StringIO
+
+        from . import settlement
+
+        reconciler = settlement.SettlementReconciler(chunk_size=3)
+        # At most one query per key & chunk, keys left unmatched only,
+        # and one marking settled responses of every chunk
+        with self.assertNumQueries(9):
+            mismatches = list(reconciler.reconcile(StringIO(self.REPORT)))
+        self.assertEqual([(m.kind, m.line) for m in mismatches], [
+            (settlement.AMOUNT_MISMATCH, 5), (settlement.MISSING, 6),
+            (settlement.DUPLICATE, 7), (settlement.NOT_SUCCESSFUL, 8)])
+        self.assertEqual(mismatches[0].amount, 100)
+        self.assertEqual(reconciler.stats['matched'], 3)
+        self.assertEqual(reconciler.stats['rows'], 7)
+
+        with self.assertRaises(ValueError):
+            list(reconciler.reconcile(StringIO("Order_ID,Status\n")))
+
+    def test_not_in_report(self):
+        import datetime
+        from io import StringIO
+
+        from django.utils import timezone
+
+        from . import settlement
+
+        day = timezone.make_aware(datetime.datetime(2019, 6, 13, 16, 43))
+        TransactionResponse.objects.update(timestamp=day)
+        TransactionResponse.objects.filter(tid='TXN_SUCCESSSEED4').update(
+            is_verified=False)
+        TransactionResponse.objects.filter(tid='TXN_SUCCESSSEED3').update(
+            timestamp=day + datetime.timedelta(days=1))
+        report = ("Order_ID,Transaction ID,Amount,TXNDATE\n"
+                  "SEED0,TXN_SUCCESSSEED0,100.00,2019-06-13 10:00:00.0\n"
+                  "SEED1,TXN_SUCCESSSEED1,100.00,2019-06-13 11:00:00.0\n")
+
+        reconciler = settlement.SettlementReconciler()
+        mismatches = list(reconciler.reconcile(StringIO(report)))
+        # Unverified, failed & next day's responses are not expected
+        self.assertEqual([(m.kind, m.tid) for m in mismatches], [
+            (settlement.NOT_IN_REPORT, 'TXN_SUCCESSSEED2')])
+        self.assertEqual(TransactionResponse.objects.filter(
+            settled_at=reconciler.started).count(), 2)
+
+        reconciler = settlement.SettlementReconciler(
+            date_to=datetime.date(2019, 6, 14))
+        mismatches = list(reconciler.reconcile(StringIO(report)))
+        self.assertEqual([m.tid for m in mismatches],
+                         ['TXN_SUCCESSSEED2', 'TXN_SUCCESSSEED3'])
+
+    def test_command(self):
+        import os
+        import tempfile
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        path = os.path.join(tempfile.mkdtemp(), 'report.csv')
+        self.addCleanup(os.remove, path)
+        with open(path, 'w') as report:
+            report.write(self.REPORT)
+        out, err = StringIO(), StringIO()
+        call_command('paytm_settlement', path, stdout=out, stderr=err)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+        self.assertIn('Matched 3 of 7 rows', err.getvalue())
+
+        TransactionResponse.objects.update(settled_at=None)
+        dry = StringIO()
+        call_command('paytm_settlement', path, '--dry-run', '--chunk-size',
+                     '3', stdout=dry, stderr=StringIO())
+        self.assertEqual(dry.getvalue(), out.getvalue())
+        self.assertFalse(TransactionResponse.objects.filter(
+            settled_at__isnull=False).exists())
+
+
+class AdminTest(PayTMTestCase):
+
+    def setUp(self):
+        super(AdminTest, self).setUp()
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+    def changelist_queries(self, model):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse(
+                'admin:drf_paytm_%s_changelist' % model))
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_changelist_queries_independent_of_rows(self):
+        self.seed_requests(1, prefix='FIRST')
+        TransactionResponse.objects.update(
+            t_request=TransactionRequest.objects.get())
+        queries = {model: self.changelist_queries(model)
+                   for model in ('transactionrequest', 'transactionresponse')}
+
+        self.seed_requests(20)
+        for request in TransactionRequest.objects.all():
+            TransactionResponse.objects.filter(oid=request.oid).update(
+                t_request=request)
+        for model, count in queries.items():
+            self.assertEqual(self.changelist_queries(model), count)
+
+    def test_estimated_count(self):
+        from .pagination import EstimatedCountPaginator
+
+        self.seed_requests(3)
+        paginator = EstimatedCountPaginator(
+            TransactionResponse.objects.order_by('pk'), 2)
+        # SQLite keeps no statistics, rows are counted
+        self.assertIsNone(paginator.estimate())
+        self.assertEqual(paginator.count, 6)
+        self.assertIsNone(EstimatedCountPaginator(
+            TransactionResponse.objects.filter(status='PENDING').order_by(
+                'pk'), 2).estimate())
+
+
+class ChecksumTest(TestCase):
+
+    PARAMS = {'MID': 'MERCHANT0001', 'ORDER_ID': 'ORDER1',
+              'TXN_AMOUNT': '100.00'}
+
+    def test_known_checksum(self):
+        from .utils import generate_checksum
+
+        self.assertEqual(
+            generate_checksum(self.PARAMS, MERCHANT_KEY, salt='a1B2'),
+            'qtJB3gl1tWWCI72bVhNyIsJ23bPPYXOsBJXYwWDrx6GKP2fbMQT5CC6jaUJS8uH'
+            'zNKve3HqV+xJRj3ULWP/hU67qzaP8AVpG8iMfEevVGAM=')
+
+    def test_verify(self):
+        from .utils import generate_checksum, verify_checksum
+
+        checksum = generate_checksum(self.PARAMS, MERCHANT_KEY)
+        self.assertTrue(verify_checksum(dict(self.PARAMS, CHECKSUMHASH='-'),
+                                        MERCHANT_KEY, checksum))
+        self.assertFalse(verify_checksum(dict(self.PARAMS, ORDER_ID='ORDER2'),
+                                         MERCHANT_KEY, checksum))
+        self.assertFalse(verify_checksum(dict(self.PARAMS),
+                                         MERCHANT_KEY[::-1], checksum))
+        for invalid in ('', 'abc', checksum[:-8] + '=' * 8):
+            self.assertFalse(verify_checksum(dict(self.PARAMS), MERCHANT_KEY,
+                                             invalid))
+
+    def test_backends(self):
+        from .crypto import AVAILABLE_BACKENDS
+        from .utils import ChecksumEngine, generate_checksum
+
+        self.assertTrue(AVAILABLE_BACKENDS)
+        expected = generate_checksum(self.PARAMS, MERCHANT_KEY, salt='a1B2')
+        for backend in AVAILABLE_BACKENDS:
+            engine = ChecksumEngine(MERCHANT_KEY, backend=backend)
+            for _ in range(2):
+                checksum = engine.generate(self.PARAMS, salt='a1B2')
+                self.assertEqual(checksum, expected, backend.name)
+                self.assertTrue(engine.verify(self.PARAMS, checksum))
+
+    def test_concurrent_generation(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        from .utils import generate_checksum
+
+        salts = ['%04d' % i for i in range(200)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            checksums = list(pool.map(
+                lambda salt: generate_checksum(self.PARAMS, MERCHANT_KEY,
+                                               salt=salt), salts))
+        self.assertEqual(checksums, [generate_checksum(
+            self.PARAMS, MERCHANT_KEY, salt=salt) for salt in salts])
+
+
+@override_settings(PAYTM_SETTINGS={'STATUS_RETRIES': 0})
+class TransactionFlowTest(DeferredVerificationTest):
+
+    def setUp(self):
+        from . import paytmapi
+
+        super(TransactionFlowTest, self).setUp()
+        self.server = StubStatusServer(default=(200, {
+            'STATUS': 'TXN_SUCCESS', 'TXNID': 'DEFERRED1'}))
+        self.addCleanup(self.server.stop)
+        self.config.status_url = self.server.url
+        self.config.save()
+        paytmapi._status_client = None
+
+    def signed_callback(self, **data):
+        from .utils import generate_checksum
+        from .variables import SUCCESS
+
+        callback = {'MID': self.config.mid, 'TXNID': 'DEFERRED1',
+                    'ORDERID': self.request.oid, 'BANKTXNID': '',
+                    'TXNAMOUNT': '100.00', 'STATUS': SUCCESS,
+                    'RESPCODE': '01', 'RESPMSG': 'Txn Success'}
+        callback.update(data)
+        callback['CHECKSUMHASH'] = generate_checksum(callback, MERCHANT_KEY)
+        return callback
+
+    def test_request_checksum(self):
+        from .utils import verify_checksum
+
+        response = self.create_request(oid='FLOW1')
+        self.assertEqual(response.status_code, 201, response.data)
+        params = {key: str(value) for key, value in response.data.items()
+                  if key.isupper() and value is not None}
+        params['CALLBACK_URL'] = response.data['paytm_callback_url']
+        self.assertTrue(verify_checksum(params, MERCHANT_KEY,
+                                        params['CHECKSUMHASH']))
+
+    @override_settings(PAYTM_SETTINGS={
+        'STATUS_RETRIES': 0, 'METRICS_SINK': 'drf_paytm.metrics.MemorySink'})
+    def test_metrics(self):
+        from . import metrics
+        from .variables import SUCCESS
+
+        forged = dict(self.signed_callback(), RESPCODE='x' * 20)
+        self.assertEqual(self.post_callback(**forged).status_code, 400)
+        response = self.post_callback(**self.signed_callback())
+        self.assertEqual(response.status_code, 302)
+        sink = metrics.get_sink()
+        self.assertEqual([key for key in sink.counters
+                          if key[0] == 'response.callback'], [(
+            'response.callback', ('respcode', '01'), ('status', SUCCESS))])
+        self.assertEqual(sink.counters[(
+            'response.callback', ('respcode', '01'), ('status', SUCCESS))], 1)
+        self.assertEqual(sink.counters[(
+            'gateway.status', ('respcode', None), ('status', SUCCESS),
+            ('valid', True))], 1)
+        self.assertEqual(sink.timings[('gateway.request',
+                                       ('http_status', 200))]['count'], 1)
+        self.assertEqual(sink.timings[('response.checksum_verify',
+                                       ('valid', True))]['count'], 1)
+        self.assertEqual(
+            {key[1][1] for key in sink.timings
+             if key[0] == 'response.db_lookup'},
+            {'config', 'request', 'duplicate'})
+
+    def test_verified_callback(self):
+        response = self.commit(self.post_callback, **self.signed_callback())
+        self.assertEqual(response.status_code, 302)
+        instance = TransactionResponse.objects.get(tid='DEFERRED1')
+        self.assertTrue(instance.is_verified)
+        self.assertEqual(self.paid, [instance.pk])
+        self.assertEqual(self.server.payloads[0]['ORDERID'], self.request.oid)
+
+    def test_tampered_callback(self):
+        callback = self.signed_callback()
+        callback['TXNAMOUNT'] = '1.00'
+        response = self.post_callback(**callback)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.server.payloads, [])
+
+    def test_circuit_open(self):
+        from . import paytmapi
+        from .breaker import get_breaker
+
+        breaker = get_breaker(self.server.url)
+        with self.assertLogs('drf_paytm.breaker', 'WARNING'):
+            breaker.open()
+        self.addCleanup(breaker.reset)
+        for fallback, code in (('reject', 400), ('defer', 302)):
+            with self.settings(PAYTM_SETTINGS={
+                    'STATUS_BREAKER_ENABLED': True,
+                    'STATUS_BREAKER_FALLBACK': fallback}):
+                paytmapi._status_client = None
+                response = self.post_callback(**self.signed_callback())
+            self.assertEqual(response.status_code, code)
+        paytmapi._status_client = None
+        instance = TransactionResponse.objects.get(tid='DEFERRED1')
+        self.assertFalse(instance.is_verified)
+        self.assertEqual(self.server.payloads, [])
+        self.assertEqual(self.paid, [])
+
+    @override_settings(PAYTM_SETTINGS={
+        'DEFER_STATUS_VERIFICATION': True, 'STATUS_RETRIES': 0,
+        'BACKGROUND_EXECUTOR': 'drf_paytm.executors.SyncExecutor'})
+    def test_deferred_verification(self):
+        from . import executors
+
+        executors._executor = None
+        self.addCleanup(setattr, executors, '_executor', None)
+        response = self.commit(self.post_callback, **self.signed_callback())
+        self.assertEqual(response.status_code, 302)
+        instance = TransactionResponse.objects.get(tid='DEFERRED1')
+        self.assertTrue(instance.is_verified)
+        self.assertEqual(self.paid, [instance.pk])
+
+    def test_duplicate_callback(self):
+        callback = self.signed_callback()
+        self.commit(self.post_callback, **callback)
+        # Request & duplicate lookup, no status call for a known response
+        with self.assertNumQueries(2):
+            response = self.post_callback(**callback)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], self.request.callback_url)
+        self.assertEqual(TransactionResponse.objects.filter(
+            tid='DEFERRED1').count(), 1)
+        self.assertEqual(len(self.server.payloads), 1)
+        self.assertEqual(len(self.paid), 1)
+
+    def test_concurrent_duplicate(self):
+        from django.http import QueryDict
+
+        from rest_framework.test import APIRequestFactory
+
+        from .serializers import TransactionResponseSerializer
+
+        callback = self.signed_callback()
+        data = QueryDict(urlencode(callback))
+        request = APIRequestFactory().post('/', callback)
+        request.data = data
+        serializer = TransactionResponseSerializer(
+            data=data, context={'request': request})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        # Another callback is saved between validation & save
+        self.commit(self.post_callback, **callback)
+        instance = self.commit(serializer.save)
+        self.assertEqual(instance.pk, TransactionResponse.objects.get(
+            tid='DEFERRED1').pk)
+        self.assertEqual(len(self.paid), 1)
+
+
+def tagged_exception_handler(exc, context):
+    from rest_framework.views import exception_handler
+
+    response = exception_handler(exc, context)
+    response.data['handler'] = 'tagged'
+    return response
+
+
+class AsyncViewTest(TransactionFlowTest):
+
+    callback_view = 'drf_paytm:async-add-transaction-response'
+
+    def test_duplicate_callback(self):
+        callback = self.signed_callback()
+        self.commit(self.post_callback, **callback)
+        response = self.commit(self.post_callback, **callback)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(self.server.payloads), 1)
+        self.assertEqual(len(self.paid), 1)
+
+    def test_unverified_status(self):
+        self.server.replies.append((200, {'STATUS': 'PENDING'}))
+        response = self.post_callback(**self.signed_callback())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.json())
+        self.assertFalse(TransactionResponse.objects.filter(
+            tid='DEFERRED1').exists())
+
+    def test_retrieve(self):
+        self.post_callback(**self.signed_callback())
+        url = reverse('drf_paytm:async-retrieve-transaction-request',
+                      kwargs={'oid': self.request.oid})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['last_payment_status'],
+                         'Success')
+        self.assertEqual(self.client.get(url.replace(
+            self.request.oid, 'UNKNOWN')).status_code, 404)
+        self.assertEqual(self.client.put(url).status_code, 405)
+
+        self.client.force_authenticate(user=None)
+        self.assertIn(self.client.get(url).status_code, (401, 403))
+
+    def test_permissions(self):
+        other = get_user_model().objects.create_user(
+            username='other', password='password')
+        retrieve = ('retrieve-transaction-request', 'get',
+                    {'oid': self.request.oid}, None)
+        pay_now = ('pay-now', 'post', {}, {
+            'oid': 'ASYNC2', 'amount': '10.00',
+            'callback_url': 'https://example.com/done/'})
+        for user, routes in ((None, (retrieve, pay_now)),
+                             (other, (retrieve, ))):
+            self.client.force_authenticate(user=user)
+            for name, method, kwargs, data in routes:
+                responses = [getattr(self.client, method)(
+                    reverse('drf_paytm:' + prefix + name, kwargs=kwargs),
+                    data, format='json') for prefix in ('', 'async-')]
+                self.assertEqual(*[response.status_code
+                                   for response in responses])
+                self.assertEqual(*[response.json()
+                                   for response in responses])
+        self.assertFalse(TransactionRequest.objects.filter(
+            oid='ASYNC2').exists())
+
+    def test_throttles(self):
+        from unittest import mock
+
+        from django.core.cache import cache
+
+        from rest_framework.throttling import UserRateThrottle
+
+        from .async_views import AsyncRetrieveTransactionRequestView
+
+        class OnePerMinute(UserRateThrottle):
+            rate = '1/min'
+
+        self.addCleanup(cache.clear)
+        url = reverse('drf_paytm:async-retrieve-transaction-request',
+                      kwargs={'oid': self.request.oid})
+        with mock.patch.object(AsyncRetrieveTransactionRequestView,
+                               'throttle_classes', (OnePerMinute, )):
+            self.assertEqual(self.client.get(url).status_code, 200)
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(REST_FRAMEWORK={
+        'EXCEPTION_HANDLER': 'drf_paytm.tests.tagged_exception_handler'})
+    def test_exception_handler(self):
+        response = self.client.get(reverse(
+            'drf_paytm:async-retrieve-transaction-request',
+            kwargs={'oid': 'UNKNOWN'}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['handler'], 'tagged')
+
+    def test_pay_now(self):
+        response = self.client.post(
+            reverse('drf_paytm:async-pay-now'),
+            {'oid': 'ASYNC1', 'amount': '10.00',
+             'callback_url': 'https://example.com/done/'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(b'name="ORDER_ID" value="ASYNC1"', response.content)
+        self.assertTrue(TransactionRequest.objects.filter(
+            oid='ASYNC1', created_by=self.user).exists())
+
+
+class BatchChecksumTest(TestCase):
+
+    def setUp(self):
+        self.params = [{'MID': 'MERCHANT0001', 'ORDER_ID': 'ORDER%d' % i,
+                        'TXN_AMOUNT': '%d.00' % i} for i in range(50)]
+        self.params.append({'ORDER_ID': 'OTHER', 'MID': 'MERCHANT0001'})
+        self.params.append({'MID': 'MERCHANT0001', 'ORDER_ID': 'SIGNED',
+                            'CHECKSUMHASH': 'previous'})
+        self.salts = ['%04d' % i for i in range(len(self.params))]
+
+    def test_parity(self):
+        from .utils import generate_checksum, generate_checksums
+        from .utils import verify_checksum, verify_checksums
+
+        scalar = [generate_checksum(dict(params), MERCHANT_KEY, salt=salt)
+                  for params, salt in zip(self.params, self.salts)]
+        for processes in (None, 2):
+            checksums = generate_checksums(self.params, MERCHANT_KEY,
+                                           salts=self.salts,
+                                           processes=processes,
+                                           chunk_size=16)
+            self.assertEqual(checksums, scalar)
+
+            items = list(zip(self.params, checksums))
+            items.append((dict(self.params[0], TXN_AMOUNT='1'), checksums[0]))
+            self.assertEqual(
+                verify_checksums(items, MERCHANT_KEY, processes=processes,
+                                 chunk_size=16),
+                [verify_checksum(dict(params), MERCHANT_KEY, checksum)
+                 for params, checksum in items])
+
+    def test_random_salts(self):
+        from .utils import generate_checksums, verify_checksums
+
+        # Signed as sent, without any checksum
+        params = [params for params in self.params
+                  if 'CHECKSUMHASH' not in params]
+        checksums = generate_checksums(params, MERCHANT_KEY)
+        self.assertEqual(len(set(checksums)), len(params))
+        self.assertTrue(all(verify_checksums(
+            [(dict(params, CHECKSUMHASH=checksum), checksum)
+             for params, checksum in zip(params, checksums)],
+            MERCHANT_KEY)))
+
+
+class MetricsTest(PayTMTestCase):
+
+    def test_disabled(self):
+        from . import metrics
+
+        self.assertIsNone(metrics.get_sink())
+        with metrics.timer('request.checksum') as timer:
+            timer.tag(valid=True)
+        self.assertIs(timer, metrics.NULL_TIMER)
+
+    @override_settings(PAYTM_SETTINGS={
+        'METRICS_SINK': 'drf_paytm.metrics.MemorySink'})
+    def test_request_and_page(self):
+        from . import metrics
+
+        self.client.post(reverse('drf_paytm:pay-now'), {
+            'oid': 'METRICS1', 'amount': '100.00',
+            'callback_url': 'https://example.com/done/'}, format='json')
+        summary = metrics.get_sink().summary()
+        for name in ('request.checksum', 'request.db_write',
+                     'payment_page.render'):
+            self.assertEqual(summary[name]['count'], 1, name)
+
+        with self.assertRaises(ValueError), metrics.timer('custom'):
+            raise ValueError
+        self.assertIn(('custom', ('error', 'ValueError')),
+                      metrics.get_sink().timings)
+
+    def test_statsd(self):
+        import socket
+
+        from .metrics import StatsDSink
+
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(server.close)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        sink = StatsDSink(port=server.getsockname()[1])
+        sink.timing('gateway.request', 0.0125, {'http_status': 200})
+        sink.increment('response.callback', 1, {})
+        self.assertEqual(server.recv(1024), b'drf_paytm.gateway.request:'
+                                            b'12.500|ms|#http_status:200')
+        self.assertEqual(server.recv(1024), b'drf_paytm.response.callback:1|c')
+
+
+class PaymentPageTest(PayTMTestCase):
+
+    def pay_now(self, oid):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        registry.get_active()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('drf_paytm:pay-now'), {
+                'oid': oid, 'amount': '100.00',
+                'callback_url': 'https://example.com/done/'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        tables = (PayTMConfiguration._meta.db_table,
+                  TransactionResponse._meta.db_table)
+        self.assertFalse([q['sql'] for q in queries.captured_queries
+                          if any(table in q['sql'] for table in tables)])
+        return response
+
+    def test_page(self):
+        self.config.company_name = '<Company & Co>'
+        self.config.save()
+        content = self.pay_now('NOW1').content.decode()
+        self.assertIn('&lt;Company &amp; Co&gt;', content)
+        self.assertIn('action="%s"' % self.config.gateway_url, content)
+        self.assertIn('<input type="hidden" name="ORDER_ID" value="NOW1">',
+                      content)
+        self.assertNotIn('paytm_callback_url', content)
+
+    @override_settings(PAYTM_SETTINGS={'STREAM_PAYMENT_PAGE': True})
+    def test_streamed_page(self):
+        from .utils import generate_payment_page
+
+        response = self.pay_now('NOW2')
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.endswith('</html>'))
+        self.assertEqual(generate_payment_page({'MID': self.config.mid,
+                                                'X': '"><script>'}).count(
+            '&quot;&gt;&lt;script&gt;'), 1)
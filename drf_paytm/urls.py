@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 app_name = "drf_paytm"
 
@@ -12,6 +12,20 @@ urlpatterns = [
          name="retrieve-transaction-request"),
     path('response/', views.AddTransactionResponseView.as_view(),
          name="list-add-transaction-response"),
+    path('responses/', views.ListTransactionResponseView.as_view(),
+         name="list-transaction-response"),
+    path('responses/export/', views.ExportTransactionResponseView.as_view(),
+         name="export-transaction-response"),
     path('now/', views.PayNowTransaction.as_view(),
-         name="pay-now")
+         name="pay-now"),
+
+    # Async variants for ASGI deployments
+    path('async/order/<oid>/',
+         async_views.AsyncRetrieveTransactionRequestView.as_view(),
+         name="async-retrieve-transaction-request"),
+    path('async/response/',
+         async_views.AsyncAddTransactionResponseView.as_view(),
+         name="async-add-transaction-response"),
+    path('async/now/', async_views.AsyncPayNowTransaction.as_view(),
+         name="async-pay-now"),
 ]
@@ -1,14 +1,17 @@
 import base64
-import string
-import random
+import binascii
+import functools
 import hashlib
-
-from Crypto.Cipher import AES
+import hmac
+import secrets
+import string
 
 from django.core.validators import RegexValidator
 
+from .crypto import BLOCK_SIZE
+
 IV = "@@@@&&&&####$$$$"
-BLOCK_SIZE = 16
+SALT_CHARS = string.ascii_uppercase + string.digits + string.ascii_lowercase
 
 
 validate_order_id = RegexValidator(r'^[\w.-@]+$')
@@ -40,31 +43,18 @@ def generate_parameters(attributes, cust_id):
 
 
 def generate_payment_page(param_dict):
-    from .models import PayTMConfiguration
-
-    pc = PayTMConfiguration.objects.get(mid=param_dict.get('MID'))
-
-    html_code = """<html>
-    <h1>%s<br><br>
-        Merchant Check Out Page<br><br> 
-        Please Do Not Refresh The Page
-    </h1></br>
-    <form method="post" action="%s" name="f1">
-        <table border="1">
-        <tbody> """ % (pc.company_name, pc.gateway_url)
-
-    for key, value in param_dict.items():
-        html_code += """
-        <input type="hidden" name="%s" value="%s">""" % (key, value)
-    html_code += """
-        </tbody>
-        </table>
-        <script type="text/javascript">
-            document.f1.submit();
-        </script>
-    </form>
-</html>"""
-    return html_code
+    from .pages import renderer_for
+    from .registry import registry
+
+    pc = registry.get_by_mid(param_dict.get('MID'))
+    return renderer_for(pc).render(param_dict).decode()
+
+
+def generate_webhook_secret():
+    """
+    Provides a random key of 32 characters to sign webhooks with.
+    """
+    return __id_generator__(32)
 
 
 def validate_key(value):
@@ -74,17 +64,114 @@ def validate_key(value):
         raise ValidationError(_("Merchant key must be of length 16, 24 or 32"))
 
 
-def generate_checksum(param_dict, merchant_key, salt=None):
-    params_string = __get_param_string__(param_dict)
-    salt = salt if salt else __id_generator__(4)
-    final_string = '%s|%s' % (params_string, salt)
+class ChecksumEngine(object):
+    """
+    Generates and verifies PayTM checksums for one merchant key.
+
+    AES-CBC is delegated to a crypto backend (see crypto module) that
+    keeps the key schedule and cipher contexts of the key. Padding works
+    on bytes, salt is drawn from `secrets` and verification compares the
+    decrypted hash in constant time instead of encrypting it again.
+    Use get_checksum_engine() to share engines per merchant key.
+    """
+
+    def __init__(self, merchant_key, backend=None):
+        from .crypto import get_backend_class
+
+        if isinstance(merchant_key, str):
+            merchant_key = merchant_key.encode()
+        backend = backend or get_backend_class()
+        self.cipher = backend(merchant_key, IV.encode())
+
+    @staticmethod
+    def pad(data: bytes) -> bytes:
+        length = BLOCK_SIZE - len(data) % BLOCK_SIZE
+        return data + bytes((length, )) * length
+
+    @staticmethod
+    def hash(params_string: str, salt: str) -> bytes:
+        """
+        Provides SHA256 hex digest of `params_string|salt` followed by salt.
+        """
+        final_string = '%s|%s' % (params_string, salt)
+        return (hashlib.sha256(final_string.encode()).hexdigest()
+                + salt).encode()
+
+    def encrypt(self, data: bytes) -> str:
+        """
+        Pads, encrypts with AES-CBC and base64 encodes data.
+        """
+        return self.encrypt_many((data, ))[0]
+
+    def encrypt_many(self, messages) -> list:
+        """
+        Pads, encrypts and base64 encodes many messages at once.
+        """
+        return [base64.b64encode(message).decode("UTF-8") for message in
+                self.cipher.encrypt_many([self.pad(data)
+                                          for data in messages])]
+
+    def decrypt(self, checksum: str) -> bytes:
+        """
+        Decodes and decrypts checksum. Padding is not removed.
+
+        Raises
+        ------
+        ValueError: if checksum is not a valid encrypted message.
+        """
+        return self.cipher.decrypt(base64.b64decode(checksum))
+
+    def generate_by_str(self, param_str: str, salt: str = None) -> str:
+        salt = salt if salt else __id_generator__(4)
+        return self.encrypt(self.hash(param_str, salt))
+
+    def generate(self, param_dict: dict, salt: str = None) -> str:
+        return self.generate_by_str(__get_param_string__(param_dict), salt)
+
+    def verify_by_str(self, param_str: str, checksum: str) -> bool:
+        try:
+            decrypted = self.decrypt(checksum)
+        except (ValueError, binascii.Error):
+            return False
+        length = decrypted[-1]
+        if not 0 < length <= BLOCK_SIZE:
+            return False
+        salt = decrypted[:-length][-4:].decode('latin-1')
+        expected = self.pad(self.hash(param_str, salt))
+        return hmac.compare_digest(expected, decrypted)
+
+    def verify(self, param_dict: dict, checksum: str) -> bool:
+        return self.verify_by_str(__get_param_string__(param_dict), checksum)
+
+    def generate_many(self, param_strs, salts=None) -> list:
+        """
+        Generates checksums of many parameter strings at once.
+        """
+        import itertools
+
+        salts = salts if salts is not None else itertools.repeat(None)
+        return self.encrypt_many(
+            self.hash(param_str, salt if salt else __id_generator__(4))
+            for param_str, salt in zip(param_strs, salts))
+
+    def verify_many(self, items) -> list:
+        """
+        Verifies many (param_str, checksum) pairs.
+        """
+        return [self.verify_by_str(param_str, checksum)
+                for param_str, checksum in items]
+
+
+@functools.lru_cache(maxsize=64)
+def get_checksum_engine(merchant_key) -> ChecksumEngine:
+    """
+    Provides ChecksumEngine of merchant key, created once per process.
+    """
+    return ChecksumEngine(merchant_key)
 
-    hasher = hashlib.sha256(final_string.encode())
-    hash_string = hasher.hexdigest()
 
-    hash_string += salt
-
-    return __encode__(hash_string, IV, merchant_key)
+def generate_checksum(param_dict, merchant_key, salt=None):
+    return get_checksum_engine(merchant_key).generate(param_dict, salt=salt)
 
 
 def generate_refund_checksum(param_dict, merchant_key, salt=None):
@@ -92,29 +179,12 @@ def generate_refund_checksum(param_dict, merchant_key, salt=None):
         if "|" in param_dict[i]:
             param_dict = {}
             exit()
-    params_string = __get_param_string__(param_dict)
-    salt = salt if salt else __id_generator__(4)
-    final_string = '%s|%s' % (params_string, salt)
-
-    hasher = hashlib.sha256(final_string.encode())
-    hash_string = hasher.hexdigest()
-
-    hash_string += salt
-
-    return __encode__(hash_string, IV, merchant_key)
+    return get_checksum_engine(merchant_key).generate(param_dict, salt=salt)
 
 
 def generate_checksum_by_str(param_str, merchant_key, salt=None):
-    params_string = param_str
-    salt = salt if salt else __id_generator__(4)
-    final_string = '%s|%s' % (params_string, salt)
-
-    hasher = hashlib.sha256(final_string.encode())
-    hash_string = hasher.hexdigest()
-
-    hash_string += salt
-
-    return __encode__(hash_string, IV, merchant_key)
+    return get_checksum_engine(merchant_key).generate_by_str(param_str,
+                                                             salt=salt)
 
 
 def verify_checksum(param_dict, merchant_key, checksum):
@@ -122,71 +192,123 @@ def verify_checksum(param_dict, merchant_key, checksum):
     if 'CHECKSUMHASH' in param_dict:
         param_dict.pop('CHECKSUMHASH')
 
-    # Get salt
-    paytm_hash = __decode__(checksum, IV, merchant_key)
-    salt = paytm_hash[-4:]
-    calculated_checksum = generate_checksum(param_dict, merchant_key,
-                                            salt=salt)
-    return calculated_checksum == checksum
+    return get_checksum_engine(merchant_key).verify(param_dict, checksum)
 
 
 def verify_checksum_by_str(param_str, merchant_key, checksum):
-    # Remove checksum
-    #if 'CHECKSUMHASH' in param_dict:
-        #param_dict.pop('CHECKSUMHASH')
-
-    # Get salt
-    paytm_hash = __decode__(checksum, IV, merchant_key)
-    salt = paytm_hash[-4:]
-    calculated_checksum = generate_checksum_by_str(param_str, merchant_key,
-                                                   salt=salt)
-    return calculated_checksum == checksum
-
-
-def __id_generator__(size=6, chars=(string.ascii_uppercase + string.digits +
-                                    string.ascii_lowercase)):
-    return ''.join(random.choice(chars) for _ in range(size))
-
-
-def __get_param_string__(params):
+    return get_checksum_engine(merchant_key).verify_by_str(param_str,
+                                                           checksum)
+
+
+def __param_strings__(param_dicts, exclude=()):
+    """
+    Yields parameter string of every dict, ignoring keys in `exclude`.
+    Keys are sorted once per distinct set of keys instead of once per
+    dict.
+    """
+    sorted_keys = {}
+    for params in param_dicts:
+        order = tuple(params)
+        keys = sorted_keys.get(order)
+        if keys is None:
+            keys = sorted_keys[order] = [key for key in sorted(order)
+                                         if key not in exclude]
+        yield __get_param_string__(params, keys=keys)
+
+
+def __generate_chunk__(args):
+    merchant_key, param_strs, salts = args
+    return get_checksum_engine(merchant_key).generate_many(param_strs, salts)
+
+
+def __verify_chunk__(args):
+    merchant_key, items = args
+    return get_checksum_engine(merchant_key).verify_many(items)
+
+
+def generate_checksums(param_dicts, merchant_key, salts=None,
+                       processes=None, chunk_size=1000):
+    """
+    Generates checksums of many parameter dicts at once. Output is the
+    same as calling generate_checksum on every dict.
+
+    Parameters
+    ----------
+    param_dicts: iterable of dict
+    merchant_key: str
+    salts: iterable of str | salt of every dict, random if not provided
+    processes: int | spread chunks over these many processes
+    chunk_size: int | dicts per chunk sent to a process
+
+    Returns
+    -------
+    list: checksums in the order of param_dicts
+    """
+    param_strs = list(__param_strings__(param_dicts))
+    salts = list(salts) if salts is not None else [None] * len(param_strs)
+    if not processes:
+        return get_checksum_engine(merchant_key).generate_many(param_strs,
+                                                               salts)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks = [(merchant_key, param_strs[i:i + chunk_size],
+              salts[i:i + chunk_size])
+             for i in range(0, len(param_strs), chunk_size)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return [checksum for chunk in pool.map(__generate_chunk__, tasks)
+                for checksum in chunk]
+
+
+def verify_checksums(items, merchant_key, processes=None, chunk_size=1000):
+    """
+    Verifies many checksums at once. Output is the same as calling
+    verify_checksum on every item. Dicts are not modified.
+
+    Parameters
+    ----------
+    items: iterable of (param_dict, checksum)
+    merchant_key: str
+    processes: int | spread chunks over these many processes
+    chunk_size: int | items per chunk sent to a process
+
+    Returns
+    -------
+    list: bool for every item, in order
+    """
+    items = list(items)
+    # Checksum is removed before verifying, as verify_checksum does
+    pairs = list(zip(__param_strings__((params for params, _ in items),
+                                       exclude=('CHECKSUMHASH',)),
+                     (checksum for _, checksum in items)))
+    if not processes:
+        return get_checksum_engine(merchant_key).verify_many(pairs)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks = [(merchant_key, pairs[i:i + chunk_size])
+             for i in range(0, len(pairs), chunk_size)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return [result for chunk in pool.map(__verify_chunk__, tasks)
+                for result in chunk]
+
+
+def __id_generator__(size=6, chars=SALT_CHARS):
+    # One call to the OS random source, split into `size` characters
+    number = secrets.randbelow(len(chars) ** size)
+    salt = []
+    for _ in range(size):
+        number, index = divmod(number, len(chars))
+        salt.append(chars[index])
+    return ''.join(salt)
+
+
+def __get_param_string__(params, keys=None):
     params_string = []
-    for key in sorted(params.keys()):
+    for key in (sorted(params.keys()) if keys is None else keys):
         if "REFUND" in params[key] or "|" in params[key]:
             respons_dict = {}
             exit()
         value = params[key]
         params_string.append('' if value == 'null' else str(value))
     return '|'.join(params_string)
-
-
-def __pad__(s):
-    return s + (BLOCK_SIZE - len(s) % BLOCK_SIZE) * chr(BLOCK_SIZE - len(s)
-                                                        % BLOCK_SIZE)
-
-
-def __unpad__(s):
-    return s[0:-ord(s[-1])]
-
-
-def __encode__(to_encode, iv, key):
-    # Pad
-    to_encode = __pad__(to_encode)
-    # Encrypt
-    c = AES.new(key, AES.MODE_CBC, iv)
-    to_encode = c.encrypt(to_encode)
-    # Encode
-    to_encode = base64.b64encode(to_encode)
-    return to_encode.decode("UTF-8")
-
-
-def __decode__(to_decode, iv, key):
-    # Decode
-    to_decode = base64.b64decode(to_decode)
-    # Decrypt
-    c = AES.new(key, AES.MODE_CBC, iv)
-    to_decode = c.decrypt(to_decode)
-    if type(to_decode) == bytes:
-        # convert bytes array to str.
-        to_decode = to_decode.decode()
-    # remove pad
-    return __unpad__(to_decode)
@@ -9,6 +9,9 @@ STATUS_CHOICES = (
     (FAILED, 'Failed'),
     (PENDING, 'Pending'),
 )
+# Response codes of PayTM callbacks & Transaction Status API
+RESPONSE_CODES = ('01', '141', '227', '235', '295', '330', '334', '400',
+                  '401', '402', '501', '810')
 CREDIT_CARD = "CC"
 DEBIT_CARD = "DC"
 NET_BANKING = "NB"
@@ -35,3 +38,19 @@ AUTH_MODE_CHOICES = (
     (CARD, _("Credit/Debit Card")),
     (WALLET_NETBANKING, _("Wallet/Net Banking"))
 )
+
+PAYMENT_SUCCESS = 'payment.success'
+PAYMENT_FAILURE = 'payment.failure'
+EVENT_CHOICES = (
+    (PAYMENT_SUCCESS, _("Payment Success")),
+    (PAYMENT_FAILURE, _("Payment Failure")),
+)
+
+DELIVERY_PENDING = 'pending'
+DELIVERY_DONE = 'delivered'
+DELIVERY_DEAD = 'dead'
+DELIVERY_STATUS_CHOICES = (
+    (DELIVERY_PENDING, _("Pending")),
+    (DELIVERY_DONE, _("Delivered")),
+    (DELIVERY_DEAD, _("Dead")),
+)
@@ -10,7 +10,8 @@ Author: Himanshu Shankar (https://himanshus.com)
 
 from drfaddons.generics import OwnerListCreateAPIView, OwnerRetrieveAPIView
 
-from rest_framework.generics import CreateAPIView
+from rest_framework.generics import CreateAPIView, GenericAPIView
+from rest_framework.generics import ListAPIView
 
 
 class ListAddTransactionRequestView(OwnerListCreateAPIView):
@@ -23,11 +24,15 @@ class ListAddTransactionRequestView(OwnerListCreateAPIView):
 
     Author: Himanshu Shankar (https://himanshus.com)
     """
+    from .filters import TransactionRequestFilter
+    from .pagination import TransactionRequestPagination
     from .serializers import TransactionRequestSerializer
     from .models import TransactionRequest
 
     serializer_class = TransactionRequestSerializer
-    queryset = TransactionRequest.objects.all()
+    queryset = TransactionRequest.objects.with_payment_summary()
+    pagination_class = TransactionRequestPagination
+    filterset_class = TransactionRequestFilter
 
 
 class RetrieveTransactionRequestView(OwnerRetrieveAPIView):
@@ -44,10 +49,66 @@ class RetrieveTransactionRequestView(OwnerRetrieveAPIView):
     from .models import TransactionRequest
 
     serializer_class = TransactionRequestSerializer
-    queryset = TransactionRequest.objects.all()
+    queryset = TransactionRequest.objects.with_payment_summary()
     lookup_field = 'oid'
 
 
+class ListTransactionResponseView(ListAPIView):
+    """
+    GET: Provides a cursor paginated list of Transaction Responses of
+    Transaction Requests created by logged in user.
+    """
+    from django_filters.rest_framework import DjangoFilterBackend
+
+    from rest_framework.permissions import IsAuthenticated
+
+    from .filters import TransactionResponseFilter
+    from .pagination import TransactionResponsePagination
+    from .serializers import TransactionResponseSerializer
+    from .models import TransactionResponse
+
+    permission_classes = (IsAuthenticated, )
+    serializer_class = TransactionResponseSerializer
+    queryset = TransactionResponse.objects.all()
+    pagination_class = TransactionResponsePagination
+    filter_backends = (DjangoFilterBackend, )
+    filterset_class = TransactionResponseFilter
+
+    def get_queryset(self):
+        return self.queryset.filter(t_request__created_by=self.request.user)
+
+
+class ExportTransactionResponseView(GenericAPIView):
+    """
+    GET: Streams all Transaction Responses as CSV, or as NDJSON with
+    `?type=ndjson`. Accepts filters of responses/. Only for admins.
+    """
+    from django_filters.rest_framework import DjangoFilterBackend
+
+    from rest_framework.permissions import IsAdminUser
+
+    from .filters import TransactionResponseFilter
+    from .models import TransactionResponse
+
+    permission_classes = (IsAdminUser, )
+    queryset = TransactionResponse.objects.all()
+    filter_backends = (DjangoFilterBackend, )
+    filterset_class = TransactionResponseFilter
+
+    def get(self, request, *args, **kwargs):
+        from rest_framework.exceptions import ValidationError
+
+        from .export import CONTENT_TYPES, streaming_response
+
+        # `format` is reserved by DRF for renderer selection
+        fmt = request.query_params.get('type', 'csv')
+        if fmt not in CONTENT_TYPES:
+            raise ValidationError({'type': "Must be one of: %s." % ', '.join(
+                CONTENT_TYPES)})
+        return streaming_response(self.filter_queryset(self.get_queryset()),
+                                  fmt=fmt)
+
+
 class AddTransactionResponseView(CreateAPIView):
     """
     GET: Provides a list of all Transaction Response created by logged
@@ -68,6 +129,36 @@ class AddTransactionResponseView(CreateAPIView):
     serializer_class = TransactionResponseSerializer
     queryset = TransactionResponse.objects.all()
 
+    def get_serializer_context(self):
+        from .conf import paytm_settings
+
+        context = super(AddTransactionResponseView,
+                        self).get_serializer_context()
+        context['defer_verification'] = paytm_settings(
+            'DEFER_STATUS_VERIFICATION')
+        return context
+
+    @staticmethod
+    def save_response(serializer, **kwargs):
+        """
+        Saves the response and, if it is unverified, schedules its
+        verification once the transaction is committed. A duplicate
+        callback provides the existing response and schedules nothing.
+        """
+        from django.db import transaction
+
+        from .executors import get_executor
+
+        instance = serializer.save(**kwargs)
+        if not instance.is_verified and not serializer.context.get(
+                'duplicate'):
+            transaction.on_commit(lambda: get_executor().submit(
+                'drf_paytm.tasks.verify_transaction_response', instance.pk))
+        return instance
+
+    def perform_create(self, serializer):
+        self.save_response(serializer)
+
     def create(self, request, *args, **kwargs):
         from django.http import HttpResponseRedirect
 
@@ -95,18 +186,12 @@ class PayNowTransaction(ListAddTransactionRequestView):
                         TemplateHTMLRenderer)
     parser_classes = (JSONParser, FormParser)
 
-    def create(self, request, *args, **kwargs):
-        from django.http.response import HttpResponse
-
-        from rest_framework import status
-
-        from .utils import generate_payment_page
-
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        data = serializer.data
-
+    @staticmethod
+    def page_data(data: dict) -> dict:
+        """
+        Removes fields of serialized Transaction Request that are not to
+        be posted to PayTM.
+        """
         if 'is_completed' in data:
             del data['is_completed']
         if 'id' in data:
@@ -121,6 +206,20 @@ class PayNowTransaction(ListAddTransactionRequestView):
 
         if 'serializer' in data:
             del data['serializer']
+        return data
+
+    def create(self, request, *args, **kwargs):
+        from rest_framework import status
+
+        from .conf import paytm_settings
+        from .pages import renderer_for
+        from .registry import registry
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        data = self.page_data(serializer.data)
 
-        return HttpResponse(generate_payment_page(param_dict=data),
-                            status=status.HTTP_201_CREATED)
+        return renderer_for(registry.get_by_mid(data['MID'])).response(
+            data, stream=paytm_settings('STREAM_PAYMENT_PAGE'),
+            status=status.HTTP_201_CREATED)
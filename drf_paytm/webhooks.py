@@ -0,0 +1,340 @@
+"""
+Outbound webhooks of payment events to Webhook Subscriptions.
+
+Events reach subscriptions through the outbox: with OUTBOX_SINK set to
+drf_paytm.webhooks.SubscriptionSink, the relay fans every event out into
+a Webhook Delivery per matching subscription, in the transaction that
+marks the event as published. paytm_webhooks command then runs a
+WebhookDeliverer that posts due deliveries concurrently over a pooled
+keep-alive session, at most `max_concurrency` at once per subscription.
+Deliveries are claimed for WEBHOOK_LEASE seconds before being posted,
+with no transaction open while posting: those of a deliverer that dies
+meanwhile are posted again once the lease expires.
+Failed deliveries are retried with jittered exponential backoff and are
+dead-lettered after WEBHOOK_MAX_ATTEMPTS attempts.
+
+Every request carries the event as JSON body and headers:
+- X-PayTM-Checksum: checksum of the body by PayTM checksum algorithm,
+  with secret of the subscription as key, see verify_signature()
+- X-PayTM-Event: type of event
+- X-PayTM-Delivery: ID of the delivery, same across retries
+"""
+
+import collections
+import json
+import logging
+import time
+
+from .conf import paytm_settings
+from .sinks import BaseSink
+
+logger = logging.getLogger(__name__)
+
+CHECKSUM_HEADER = 'X-PayTM-Checksum'
+
+
+def sign(body: str, secret: str) -> str:
+    from .utils import generate_checksum_by_str
+
+    return generate_checksum_by_str(body, secret)
+
+
+def verify_signature(body: str, secret: str, checksum: str) -> bool:
+    """
+    Checks X-PayTM-Checksum header of a webhook, to be used by receiving
+    apps.
+
+    Parameters
+    ----------
+    body: str | raw request body
+    secret: str | secret of Webhook Subscription
+    checksum: str | value of X-PayTM-Checksum header
+    """
+    from .utils import verify_checksum_by_str
+
+    return verify_checksum_by_str(body, secret, checksum)
+
+
+class SubscriptionSink(BaseSink):
+    """
+    Outbox sink that creates a Webhook Delivery of every event for every
+    active subscription accepting its type.
+    """
+
+    def publish(self, events: list):
+        from .models import WebhookDelivery, WebhookSubscription
+
+        subscriptions = list(WebhookSubscription.objects.filter(
+            is_active=True))
+        WebhookDelivery.objects.bulk_create([
+            WebhookDelivery(subscription=subscription, event_id=event['id'])
+            for event in events for subscription in subscriptions
+            if subscription.accepts(event['type'])], ignore_conflicts=True)
+
+
+class WebhookDeliverer(object):
+    """
+    Posts due Webhook Deliveries in batches. Every batch is claimed in a
+    short transaction, locked with SELECT ... FOR UPDATE SKIP LOCKED and
+    postponed by `lease` seconds, so several deliverers can run side by
+    side. Arguments not provided are read from PAYTM_SETTINGS.
+
+    Parameters
+    ----------
+    workers: int | concurrent requests, also size of connection pool
+    batch_size: int | deliveries read at once
+    timeout: float | seconds to wait for an endpoint
+    max_attempts: int | deliveries are dead after these many attempts
+    backoff: float | delay of first retry in seconds
+    backoff_max: float | maximum delay between retries in seconds
+    lease: float | seconds a claimed batch is hidden from other
+    deliverers, should exceed time taken to post it
+    """
+
+    def __init__(self, workers: int = None, batch_size: int = None,
+                 timeout: float = None, max_attempts: int = None,
+                 backoff: float = None, backoff_max: float = None,
+                 lease: float = None):
+        from concurrent.futures import ThreadPoolExecutor
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        def setting(value, name):
+            return paytm_settings(name) if value is None else value
+
+        self.workers = setting(workers, 'WEBHOOK_WORKERS')
+        self.batch_size = setting(batch_size, 'WEBHOOK_BATCH_SIZE')
+        self.timeout = setting(timeout, 'WEBHOOK_TIMEOUT')
+        self.max_attempts = setting(max_attempts, 'WEBHOOK_MAX_ATTEMPTS')
+        self.backoff = setting(backoff, 'WEBHOOK_BACKOFF')
+        self.backoff_max = setting(backoff_max, 'WEBHOOK_BACKOFF_MAX')
+        self.lease = setting(lease, 'WEBHOOK_LEASE')
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers,
+                              pool_maxsize=self.workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers,
+                                       thread_name_prefix='drf_paytm_webhook')
+        self.latencies = collections.deque(maxlen=10000)
+        self.stats = dict(batches=0, delivered=0, failed=0, dead=0,
+                          elapsed=0.0)
+
+    @property
+    def throughput(self) -> float:
+        if not self.stats['elapsed']:
+            return 0.0
+        return self.stats['delivered'] / self.stats['elapsed']
+
+    def latency(self) -> dict:
+        """
+        Provides p50, p90 & p99 latency, in milliseconds, of the last
+        10000 requests.
+        """
+        import statistics
+
+        if len(self.latencies) < 2:
+            latency = self.latencies[0] if self.latencies else 0.0
+            return dict(p50=latency, p90=latency, p99=latency)
+        quantiles = statistics.quantiles(self.latencies, n=100)
+        return dict(p50=quantiles[49], p90=quantiles[89], p99=quantiles[98])
+
+    @staticmethod
+    def lanes(deliveries) -> list:
+        """
+        Splits deliveries into lanes posted one after another, at most
+        `max_concurrency` lanes per subscription, so that worker threads
+        never wait for each other.
+        """
+        groups = collections.defaultdict(list)
+        for delivery in deliveries:
+            groups[delivery.subscription_id].append(delivery)
+        lanes = []
+        for group in groups.values():
+            cap = max(group[0].subscription.max_concurrency, 1)
+            lanes.extend(group[i::cap] for i in range(min(cap, len(group))))
+        return lanes
+
+    def send(self, delivery):
+        """
+        Posts a delivery to its endpoint. Runs in a worker thread and
+        does not touch database.
+
+        Returns
+        -------
+        tuple: (response code or None, error or '', latency in ms)
+        """
+        import requests
+
+        from django.core.serializers.json import DjangoJSONEncoder
+
+        subscription, event = delivery.subscription, delivery.event
+        body = json.dumps(event.message(), cls=DjangoJSONEncoder,
+                          separators=(',', ':'))
+        headers = {'Content-Type': 'application/json',
+                   CHECKSUM_HEADER: sign(body, subscription.secret),
+                   'X-PayTM-Event': event.event_type,
+                   'X-PayTM-Delivery': str(delivery.pk)}
+        start = time.perf_counter()
+        try:
+            response = self.session.post(subscription.url, data=body,
+                                         headers=headers,
+                                         timeout=self.timeout)
+        except requests.RequestException as e:
+            return None, str(e), (time.perf_counter() - start) * 1000
+        latency = (time.perf_counter() - start) * 1000
+        if 199 < response.status_code < 300:
+            return response.status_code, '', latency
+        return response.status_code, 'HTTP %d' % response.status_code, latency
+
+    def send_lane(self, lane) -> list:
+        return [self.send(delivery) for delivery in lane]
+
+    def due(self) -> list:
+        """
+        Locks next batch of due deliveries, with their subscription &
+        event. Must be called in a transaction.
+        """
+        from django.utils import timezone
+
+        from .models import PaymentEvent, WebhookDelivery
+        from .models import WebhookSubscription
+        from .variables import DELIVERY_PENDING
+
+        # Subquery rather than join, so that only deliveries are locked.
+        # Deliveries of inactive subscriptions wait until reactivated.
+        active = WebhookSubscription.objects.filter(
+            is_active=True).values('pk')
+        deliveries = list(WebhookDelivery.objects.select_for_update(
+            skip_locked=True).filter(
+            status=DELIVERY_PENDING, subscription__in=active,
+            next_attempt_at__lte=timezone.now()).order_by(
+            'next_attempt_at', 'id')[:self.batch_size])
+        if not deliveries:
+            return []
+        subscriptions = WebhookSubscription.objects.in_bulk(
+            {delivery.subscription_id for delivery in deliveries})
+        events = PaymentEvent.objects.in_bulk(
+            {delivery.event_id for delivery in deliveries})
+        for delivery in deliveries:
+            delivery.subscription = subscriptions[delivery.subscription_id]
+            delivery.event = events[delivery.event_id]
+        return deliveries
+
+    def record(self, delivery, result, now):
+        from datetime import timedelta
+
+        from .paytmapi import backoff_delay
+        from .variables import DELIVERY_DEAD, DELIVERY_DONE
+
+        code, error, latency = result
+        self.latencies.append(latency)
+        delivery.attempts += 1
+        delivery.response_code = code
+        delivery.latency = latency
+        delivery.last_error = error[:1000]
+        if not error:
+            delivery.status = DELIVERY_DONE
+            delivery.delivered_at = now
+            self.stats['delivered'] += 1
+        elif delivery.attempts >= self.max_attempts:
+            delivery.status = DELIVERY_DEAD
+            self.stats['dead'] += 1
+            logger.error("Webhook delivery %s to %s is dead: %s",
+                         delivery.pk, delivery.subscription.url, error)
+        else:
+            delivery.next_attempt_at = now + timedelta(seconds=backoff_delay(
+                delivery.attempts - 1, self.backoff, self.backoff_max))
+            self.stats['failed'] += 1
+
+    def deliver_batch(self) -> int:
+        """
+        Posts next batch of due deliveries and saves their results.
+
+        Returns
+        -------
+        int: number of deliveries in batch, 0 if none is due
+        """
+        from datetime import timedelta
+
+        from django.db import transaction
+        from django.utils import timezone
+
+        from .models import WebhookDelivery
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            deliveries = self.due()
+            if not deliveries:
+                return 0
+            # Claimed until the lease expires, locks are released on commit
+            WebhookDelivery.objects.filter(
+                pk__in=[delivery.pk for delivery in deliveries]).update(
+                next_attempt_at=timezone.now() + timedelta(
+                    seconds=self.lease))
+
+        # No transaction is open while endpoints are posted
+        lanes = self.lanes(deliveries)
+        now = timezone.now()
+        for lane, results in zip(lanes, self.pool.map(self.send_lane, lanes)):
+            for delivery, result in zip(lane, results):
+                self.record(delivery, result, now)
+
+        with transaction.atomic():
+            WebhookDelivery.objects.bulk_update(deliveries, (
+                'status', 'attempts', 'next_attempt_at', 'delivered_at',
+                'response_code', 'latency', 'last_error'))
+        self.stats['batches'] += 1
+        self.stats['elapsed'] += time.perf_counter() - start
+        return len(deliveries)
+
+    def run(self, once: bool = False, idle: float = 1.0, limit: int = None):
+        """
+        Delivers until nothing is due if `once`, forever otherwise,
+        sleeping `idle` seconds whenever nothing is due.
+
+        Parameters
+        ----------
+        once: bool | stop once nothing is due
+        idle: float | seconds to wait for due deliveries
+        limit: int | stop after these many polls
+
+        Returns
+        -------
+        dict: stats
+        """
+        polls = 0
+        while limit is None or polls < limit:
+            if not self.deliver_batch():
+                if once:
+                    break
+                time.sleep(idle)
+            polls += 1
+        return self.stats
+
+    def close(self):
+        self.pool.shutdown()
+        self.session.close()
+
+
+def retry(deliveries) -> int:
+    """
+    Sends dead or pending deliveries again right away, with attempts
+    reset.
+
+    Parameters
+    ----------
+    deliveries: QuerySet of WebhookDelivery
+
+    Returns
+    -------
+    int: number of deliveries requeued
+    """
+    from django.utils import timezone
+
+    from .variables import DELIVERY_DONE, DELIVERY_PENDING
+
+    return deliveries.exclude(status=DELIVERY_DONE).update(
+        status=DELIVERY_PENDING, attempts=0, next_attempt_at=timezone.now())